@@ -6,6 +6,76 @@ import matplotlib.patches as patches
 import random
 import string
 
+# Palette of "Spec" colors used in the tool (Reds, Pinks, Browns)
+SPEC_COLORS = [
+    'FF3737', 'FF8888', 'FFAAAA', 'DDAA99', 'CC8877',
+    'E58E73', 'FF6666', 'CD5C5C', 'F08080', 'FA8072'
+]
+
+# (default, sigma, min, max) per parameter, same numbers as generate_random_params.
+# p1's default is replaced by the length-correlated mean at sampling time.
+PARAM_SPECS = {
+    'p0': (140, 35, 60, 280),    # Length (mm)
+    'p1': (120, 25, 60, 200),    # Circumference (mm)
+    'p2': (10, 15, -30, 45),     # Shaft Curve (deg)
+    'p3': (10, 10, -20, 40),     # Shaft Angle (deg)
+    'p4': (0, 5, -15, 15),       # Glans Angle (deg)
+    'p5': (100, 10, 85, 140),    # Shaft Expansion (%)
+    'p6': (100, 10, 80, 130),    # Glans Expansion (%)
+}
+
+
+def make_title(name, p0, p1):
+    prefix = "ULTIMATE" if p0 > 180 else "NEO" if p0 < 100 else "THE"
+    suffix = "DESTROYER" if p1 > 150 else "LANCE" if p0 > 160 else "CANNON"
+    return f"{prefix} {name} {suffix}"
+
+
+class ParamBatch:
+    """
+    Columnar result of InkeiAnalyzer.generate_random_params_batch.
+    Numeric columns are NumPy arrays; names, titles and descriptions are only
+    turned into strings when a row is accessed.
+    """
+    def __init__(self, columns, color_idx, name_codes, ability):
+        self.columns = columns          # {'p0'..'p6': int64 arrays}
+        self.color_idx = color_idx      # index into SPEC_COLORS
+        self.name_codes = name_codes    # (N, 3) letter offsets 0..25
+        self.ability = ability          # 10..99
+
+    def __len__(self):
+        return len(self.color_idx)
+
+    def __getitem__(self, key):
+        return self.columns[key]
+
+    @property
+    def colors(self):
+        return np.asarray(SPEC_COLORS)[self.color_idx]
+
+    def name(self, i):
+        return bytes(self.name_codes[i] + ord('A')).decode('ascii')
+
+    def title(self, i):
+        return make_title(self.name(i), self.columns['p0'][i], self.columns['p1'][i])
+
+    def row(self, i):
+        """Same dict layout as generate_random_params()."""
+        name = self.name(i)
+        out = {k: int(v[i]) for k, v in self.columns.items()}
+        out.update({
+            'color': SPEC_COLORS[self.color_idx[i]],
+            'name': name,
+            'title': make_title(name, out['p0'], out['p1']),
+            'desc': f"Ability : {int(self.ability[i])}%"
+        })
+        return out
+
+    def rows(self):
+        for i in range(len(self)):
+            yield self.row(i)
+
+
 class InkeiAnalyzer:
     def __init__(self):
         # Constants from orig_inkei.js
@@ -53,18 +123,12 @@ class InkeiAnalyzer:
         p6 = get_val(100, 10, 80, 130)    # Glans Expansion (%)
         
         # Pick from a palette of "Spec" colors used in the tool (Reds, Pinks, Browns)
-        colors = [
-            'FF3737', 'FF8888', 'FFAAAA', 'DDAA99', 'CC8877', 
-            'E58E73', 'FF6666', 'CD5C5C', 'F08080', 'FA8072'
-        ]
-        color = random.choice(colors)
+        color = random.choice(SPEC_COLORS)
         
         name = ''.join(random.choices(string.ascii_uppercase, k=3))
         
         # Generate a funny title based on stats
-        prefix = "ULTIMATE" if p0 > 180 else "NEO" if p0 < 100 else "THE"
-        suffix = "DESTROYER" if p1 > 150 else "LANCE" if p0 > 160 else "CANNON"
-        title = f"{prefix} {name} {suffix}"
+        title = make_title(name, p0, p1)
         
         return {
             'p0': p0, 'p1': p1, 'p2': p2, 'p3': p3, 
@@ -75,6 +139,49 @@ class InkeiAnalyzer:
             'desc': f"Ability : {random.randint(10, 99)}%"
         }
 
+    def generate_random_params_batch(self, n, seed=None, chunk_size=65536):
+        """
+        Vectorized, seeded version of generate_random_params for N shapes.
+        Each chunk of `chunk_size` rows draws from its own stream spawned from
+        `seed`, so the output only depends on (seed, chunk_size) and chunks can
+        be generated independently.
+        """
+        columns = {k: np.empty(n, dtype=np.int64) for k in PARAM_SPECS}
+        color_idx = np.empty(n, dtype=np.int64)
+        name_codes = np.empty((n, 3), dtype=np.uint8)
+        ability = np.empty(n, dtype=np.int64)
+
+        def clamp(val, min_v, max_v):
+            # Clamp then truncate toward zero like int() in get_val
+            return np.clip(val, min_v, max_v).astype(np.int64)
+
+        root = np.random.SeedSequence(seed)
+        for k, st in enumerate(range(0, n, chunk_size)):
+            ed = min(st + chunk_size, n)
+            m = ed - st
+            rng = np.random.default_rng(
+                np.random.SeedSequence(root.entropy, spawn_key=(k,))
+            )
+
+            default, sigma, min_v, max_v = PARAM_SPECS['p0']
+            p0 = clamp(rng.normal(default, sigma, m), min_v, max_v)
+            columns['p0'][st:ed] = p0
+
+            # Circumference depends slightly on length to prevent needles or pancakes
+            _, sigma, min_v, max_v = PARAM_SPECS['p1']
+            avg_circ = 120 + (p0 - 140) * 0.2
+            columns['p1'][st:ed] = clamp(rng.normal(avg_circ, sigma), min_v, max_v)
+
+            for key in ('p2', 'p3', 'p4', 'p5', 'p6'):
+                default, sigma, min_v, max_v = PARAM_SPECS[key]
+                columns[key][st:ed] = clamp(rng.normal(default, sigma, m), min_v, max_v)
+
+            color_idx[st:ed] = rng.integers(0, len(SPEC_COLORS), m)
+            name_codes[st:ed] = rng.integers(0, 26, (m, 3), dtype=np.uint8)
+            ability[st:ed] = rng.integers(10, 100, m)
+
+        return ParamBatch(columns, color_idx, name_codes, ability)
+
     def rotate_point(self, base_x, base_y, x, y, angle_deg):
         if angle_deg % 360 != 0:
             rad = math.radians(angle_deg)
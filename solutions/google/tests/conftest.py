@@ -0,0 +1,23 @@
+import importlib.util
+import os
+import sys
+
+import pytest
+
+SOLUTION_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "gemini3pro.py")
+
+
+def _load_solution():
+    # load by path so the tests run from any working directory
+    name = "gemini3pro"
+    if name not in sys.modules:
+        spec = importlib.util.spec_from_file_location(name, SOLUTION_PATH)
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[name] = module
+        spec.loader.exec_module(module)
+    return sys.modules[name]
+
+
+@pytest.fixture(scope="session")
+def gm():
+    return _load_solution()
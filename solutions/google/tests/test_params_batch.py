@@ -0,0 +1,45 @@
+import numpy as np
+import pytest
+
+N = 5000
+
+
+@pytest.mark.parametrize("chunk_size", [1000, 65536])
+def test_batch_is_deterministic(gm, chunk_size):
+    analyzer = gm.InkeiAnalyzer()
+    a = analyzer.generate_random_params_batch(N, seed=27, chunk_size=chunk_size)
+    b = analyzer.generate_random_params_batch(N, seed=27, chunk_size=chunk_size)
+    assert len(a) == len(b) == N
+    for key in gm.PARAM_SPECS:
+        np.testing.assert_array_equal(a[key], b[key])
+    np.testing.assert_array_equal(a.color_idx, b.color_idx)
+    np.testing.assert_array_equal(a.name_codes, b.name_codes)
+    np.testing.assert_array_equal(a.ability, b.ability)
+    assert a.row(N - 1) == b.row(N - 1)
+    c = analyzer.generate_random_params_batch(N, seed=28, chunk_size=chunk_size)
+    assert not np.array_equal(a["p0"], c["p0"])
+
+
+def test_chunks_draw_independent_streams(gm):
+    # the first chunk does not depend on how many rows follow it
+    analyzer = gm.InkeiAnalyzer()
+    full = analyzer.generate_random_params_batch(3000, seed=27, chunk_size=1000)
+    head = analyzer.generate_random_params_batch(1000, seed=27, chunk_size=1000)
+    for key in gm.PARAM_SPECS:
+        np.testing.assert_array_equal(full[key][:1000], head[key])
+
+
+def test_columns_obey_clamps(gm):
+    batch = gm.InkeiAnalyzer().generate_random_params_batch(N, seed=27, chunk_size=1000)
+    for key, (_, _, min_v, max_v) in gm.PARAM_SPECS.items():
+        col = batch[key]
+        assert col.dtype == np.int64
+        assert col.min() >= min_v and col.max() <= max_v, key
+    # wide sigmas reach the hard limits, so clamping is exercised
+    assert (batch["p0"] == 280).any() or (batch["p0"] == 60).any()
+    assert ((batch.color_idx >= 0) & (batch.color_idx < len(gm.SPEC_COLORS))).all()
+    assert ((batch.ability >= 10) & (batch.ability <= 99)).all()
+    assert batch.name_codes.max() <= 25
+    row = batch.row(0)
+    assert set(row) == {"p0", "p1", "p2", "p3", "p4", "p5", "p6", "color", "name", "title", "desc"}
+    assert row["name"].isupper() and len(row["name"]) == 3
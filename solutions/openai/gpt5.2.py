@@ -1,12 +1,28 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
+from dataclasses import dataclass, replace
+import asyncio
+import functools
 import html as _html
+import json
 import math
+import multiprocessing
+import os
 import re
-from typing import List, Optional, Tuple
+import tempfile
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from multiprocessing import resource_tracker, shared_memory
+from typing import AsyncIterator, Callable, Iterable, Iterator, List, Optional, Tuple
 
-from PIL import Image, ImageDraw
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+try:  # optional JIT backend for the geometry kernels
+    import numba
+except ImportError:
+    numba = None
 
 
 # ----------------------------
@@ -26,6 +42,14 @@ class Path3D:
     z: List[float]
 
 
+@dataclass(frozen=True)
+class LayoutBox:
+    x: float
+    y: float
+    w: float
+    h: float
+
+
 @dataclass
 class LayerParams:
     # p0..p9 (same naming as the JS)
@@ -88,31 +112,13 @@ def _hex_to_rgba(hex6: str, alpha_01: float) -> Tuple[int, int, int, int]:
     return r, g, b, a
 
 
-def _sample_cubic_bezier(
-    p0: Tuple[float, float],
-    p1: Tuple[float, float],
-    p2: Tuple[float, float],
-    p3: Tuple[float, float],
-    steps: int = 30,
-) -> List[Tuple[float, float]]:
-    pts: List[Tuple[float, float]] = []
-    for i in range(steps + 1):
-        t = i / steps
-        mt = 1.0 - t
-        x = (
-            (mt * mt * mt) * p0[0]
-            + 3 * t * (mt * mt) * p1[0]
-            + 3 * (t * t) * mt * p2[0]
-            + (t * t * t) * p3[0]
-        )
-        y = (
-            (mt * mt * mt) * p0[1]
-            + 3 * t * (mt * mt) * p1[1]
-            + 3 * (t * t) * mt * p2[1]
-            + (t * t * t) * p3[1]
-        )
-        pts.append((x, y))
-    return pts
+def _bernstein(u: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    # cubic Bernstein basis and its 1st/2nd derivatives at u, each (len(u), 4)
+    mu = 1.0 - u
+    b = np.stack([mu ** 3, 3 * u * mu ** 2, 3 * u ** 2 * mu, u ** 3], axis=1)
+    d1 = np.stack([-3 * mu ** 2, 3 * mu ** 2 - 6 * u * mu, 6 * u * mu - 3 * u ** 2, 3 * u ** 2], axis=1)
+    d2 = np.stack([6 * mu, 6 * u - 12 * mu, 6 * mu - 12 * u, 6 * u], axis=1)
+    return b, d1, d2
 
 
 # ----------------------------
@@ -129,6 +135,27 @@ class Morph:
         rad = math.radians(ang)
         return base_x + math.cos(rad) * r, base_y + math.sin(rad) * r
 
+    @staticmethod
+    def rotate2d_batch(
+        base_x: np.ndarray,
+        base_y: np.ndarray,
+        x: np.ndarray,
+        y: np.ndarray,
+        angle_deg: np.ndarray,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        # rotate2d over rows: base_*/angle_deg are (N,), x/y are (N, K)
+        base_x = np.asarray(base_x, dtype=np.float64)[:, None]
+        base_y = np.asarray(base_y, dtype=np.float64)[:, None]
+        angle_deg = np.asarray(angle_deg, dtype=np.float64)
+        r = np.hypot(x - base_x, y - base_y)
+        ang = np.degrees(np.arctan2(y - base_y, x - base_x)) + angle_deg[:, None]
+        rad = np.radians(ang)
+        keep = (angle_deg % 360 == 0)[:, None]
+        return (
+            np.where(keep, x, base_x + np.cos(rad) * r),
+            np.where(keep, y, base_y + np.sin(rad) * r),
+        )
+
     @staticmethod
     def _minmax(arr: List[float]) -> Tuple[float, float]:
         mn = None
@@ -178,6 +205,23 @@ class Morph:
         e = max(w, h, d)
         return float(e if e > 1 else 1)
 
+    @staticmethod
+    def get_layout_xy(
+        x: float, y: float, w: float, h: float, margin: float, gap: float,
+        cols: int, rows: int, col: int, row: int, span_w: int, span_h: int,
+    ) -> "LayoutBox":
+        # Port of clsMorph.fnGetLayoutXY (without the debug drawing)
+        x += margin
+        y += margin
+        cell_w = math.floor((w - 2 * margin - gap * (cols + 1)) / cols)
+        cell_h = math.floor((h - 2 * margin - gap * (rows + 1)) / rows)
+        return LayoutBox(
+            gap + x + (cell_w + gap) * col,
+            gap + y + (cell_h + gap) * row,
+            cell_w * span_w + gap * (span_w - 1),
+            cell_h * span_h + gap * (span_h - 1),
+        )
+
     @staticmethod
     def morph_path3d(a: Path3D, b: Path3D, per: float) -> Path3D:
         # Port of clsMorph.fnGetMophPath3d
@@ -196,6 +240,22 @@ class Morph:
         z = [a.z[i] + (b.z[i] - a.z[i]) * per for i in range(len(a.z))]
         return Path3D(x, y, z)
 
+    @staticmethod
+    def morph_path3d_batch(a: Path3D, b: Path3D, pers) -> np.ndarray:
+        """
+        morph_path3d for every per in pers with one broadcasted lerp:
+        (F, V, 3) array of x, y, z, frame f matching morph_path3d(a, b, pers[f]).
+        """
+        pers = np.atleast_1d(np.asarray(pers, dtype=np.float64))
+        xa = np.stack([a.x, a.y, a.z], axis=1).astype(np.float64)
+        if len(a.x) != len(b.x) or len(a.y) != len(b.y) or len(a.z) != len(b.z):
+            return np.repeat(xa[None], len(pers), axis=0)
+        xb = np.stack([b.x, b.y, b.z], axis=1).astype(np.float64)
+        out = xa + (xb - xa) * pers[:, None, None]
+        out[pers == 0] = xa
+        out[pers == 1] = xb
+        return out
+
     @staticmethod
     def conv_xy_to_xyz_of_cylinder3d(
         shape: Path2D,
@@ -398,6 +458,253 @@ class Morph:
 
         return Path2D(t, q)
 
+    @staticmethod
+    def project_xy3d_array(
+        scale_a: float,
+        xyz: np.ndarray,
+        stage_w: float,
+        perspective_d: float,
+        origin_x: float,
+        origin_y: float,
+        center_x: float,
+        center_y: float,
+        center_z: float,
+        angle_x: float,
+        angle_y: float,
+        angle_z: float,
+        morph_per: float,
+        mode: str = "l",
+    ) -> np.ndarray:
+        # project_xy3d_only over a (V, 3) array; returns (V, 2) screen points
+        group = 4 if mode == "c" else 2
+        k = scale_a / stage_w
+        p = (np.asarray(xyz, dtype=np.float64) - (center_x, center_y, center_z)) * k
+
+        if morph_per < 1:
+            n = (len(p) // group) * group
+            g = p[:n].reshape(-1, group, 3)
+            if morph_per < 0:
+                anchor = g[:, group - 1:group, :]
+                g[:] = anchor + (g - anchor) * -morph_per
+            else:
+                anchor = g[:, 0:1, :]
+                g[:] = anchor + (g - anchor) * morph_per
+                # a trailing partial group still has its start point
+                if n < len(p):
+                    p[n + 1:] = p[n] + (p[n + 1:] - p[n]) * morph_per
+
+        t, q, u = Morph.rotate_xyz_array(p, angle_x, angle_y, angle_z)
+        per = (-u + perspective_d) / perspective_d
+        return np.stack([origin_x + t * per, origin_y + q * per], axis=1)
+
+    @staticmethod
+    def rotate_xyz_array(
+        p: np.ndarray, angle_x: float, angle_y: float, angle_z: float
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        # the z / x / y plane rotations of fnGetXY3dOnly over (V, 3) -> (t, q, u)
+        t, q, u = p[:, 0], p[:, 1], p[:, 2]
+        if angle_z % 360 != 0:
+            c, s = math.cos(math.radians(angle_z)), math.sin(math.radians(angle_z))
+            t, q = t * c - q * s, t * s + q * c
+        if angle_x % 360 != 0:
+            c, s = math.cos(math.radians(angle_x)), math.sin(math.radians(angle_x))
+            q, u = q * c - u * s, q * s + u * c
+        if angle_y % 360 != 0:
+            c, s = math.cos(math.radians(-angle_y)), math.sin(math.radians(-angle_y))
+            u, t = u * c - t * s, u * s + t * c
+        return t, q, u
+
+
+def _flatten_cubic_segments(pts: np.ndarray, steps: int = 24) -> np.ndarray:
+    # (4*S, 2) control points in groups of 4 -> (S, steps + 1, 2) polyline points
+    n = (len(pts) // 4) * 4
+    b, _, _ = _bernstein(np.linspace(0.0, 1.0, steps + 1))
+    return np.einsum("qk,skc->sqc", b, pts[:n].reshape(-1, 4, 2))
+
+
+@functools.lru_cache(maxsize=None)
+def _cylinder_segment_endpoints(slices: int, m: int, ring_ts: Tuple[int, ...]) -> np.ndarray:
+    # (S, 2) grid indices (slice * m + t) of the two ends of every cubic segment
+    # in a conv_xy_to_xyz_of_cylinder3d path: slice curves first, then the rings
+    ends = []
+    for slice_i in range(slices):
+        for t in range(0, m, 4):
+            ends.append((slice_i * m + t, slice_i * m + t + 3))
+    for t in ring_ts:
+        for slice_i in range(slices):
+            ends.append((slice_i * m + t, ((slice_i + 1) % slices) * m + t))
+    out = np.asarray(ends, dtype=np.intp).reshape(-1, 2)
+    out.setflags(write=False)
+    return out
+
+
+def _cylinder_vertex_normals(grid: np.ndarray) -> np.ndarray:
+    # grid: (slices, m, 3) revolved points -> outward (slices, m, 3) normals.
+    # Cross product of the ring tangent and the bezier tangent at each control
+    # point; falls back to the radial direction where either one degenerates.
+    slices, m, _ = grid.shape
+    radial = grid - grid.mean(axis=0, keepdims=True)
+    t_ring = np.roll(grid, -1, axis=0) - np.roll(grid, 1, axis=0)
+    j = np.arange(m)
+    lo = np.where(j % 4 == 3, j - 1, j)
+    hi = np.where(j % 4 == 3, j, j + 1)
+    t_prof = grid[:, hi] - grid[:, lo]
+    n = np.cross(t_ring, t_prof)
+    flip = np.einsum("smc,smc->sm", n, radial) < 0
+    n[flip] = -n[flip]
+    n_len = np.linalg.norm(n, axis=2)
+    r_len = np.linalg.norm(radial, axis=2)
+    scale = np.maximum(r_len, 1e-12)
+    bad = n_len < 1e-9 * scale * scale
+    n[bad] = radial[bad]
+    return n
+
+
+def _backface_segment_mask(
+    xyz: np.ndarray,
+    center: Tuple[float, float, float],
+    angle_x: float,
+    angle_y: float,
+    angle_z: float,
+    perspective_d: float,
+    scale: float,
+    slices: Optional[int] = None,
+) -> np.ndarray:
+    """
+    Front-facing mask (S,) for the cubic segments of a ShapeInkei.conv3d path
+    seen through project_xy3d_array. A segment is kept when either end faces
+    the eye point (0, 0, -perspective_d), so silhouette strokes survive.
+    """
+    slices, m, ring_ts = ShapeInkei.conv3d_layout(slices)
+    grid = np.asarray(xyz[: slices * m], dtype=np.float64).reshape(slices, m, 3)
+    normals = _cylinder_vertex_normals(grid)
+
+    p = (grid.reshape(-1, 3) - center) * scale
+    t, q, u = Morph.rotate_xyz_array(p, angle_x, angle_y, angle_z)
+    nt, nq, nu = Morph.rotate_xyz_array(normals.reshape(-1, 3), angle_x, angle_y, angle_z)
+    facing = (nt * -t + nq * -q + nu * (-perspective_d - u)) >= 0
+
+    ends = _cylinder_segment_endpoints(slices, m, ring_ts)
+    return facing[ends[:, 0]] | facing[ends[:, 1]]
+
+
+def _scanline_runs(polys: np.ndarray, width: int, height: int) -> Tuple[np.ndarray, np.ndarray]:
+    # (K, n, 2) polygons -> sorted, disjoint [start, end) runs of flat pixel indices (row * width + x)
+    polys = np.asarray(polys, dtype=np.float64)
+    a = polys.reshape(-1, 2)
+    b = np.roll(polys, -1, axis=1).reshape(-1, 2)
+    poly_id = np.repeat(np.arange(len(polys)), polys.shape[1])
+    y_lo = np.minimum(a[:, 1], b[:, 1])
+    y_hi = np.maximum(a[:, 1], b[:, 1])
+    # half-open [lo, hi) so shared vertices are counted once
+    row0 = np.clip(np.ceil(y_lo - 0.5), 0, height).astype(np.intp)
+    row1 = np.clip(np.ceil(y_hi - 0.5), 0, height).astype(np.intp)
+    counts = row1 - row0
+    live = counts > 0
+    a, b, poly_id, row0, counts = a[live], b[live], poly_id[live], row0[live], counts[live]
+    edge = np.repeat(np.arange(len(a)), counts)
+    if len(edge) == 0:
+        return np.zeros(0, dtype=np.intp), np.zeros(0, dtype=np.intp)
+    row = np.arange(len(edge)) - np.repeat(np.cumsum(counts) - counts, counts) + row0[edge]
+    # x = x_at_row0_centre + (row - row0) * dx/dy, per edge
+    slope = (b[:, 0] - a[:, 0]) / (b[:, 1] - a[:, 1])
+    x_first = a[:, 0] + (row0 + 0.5 - a[:, 1]) * slope
+    x = x_first[edge] + (row - row0[edge]) * slope[edge]
+
+    # one sort key: (polygon, row) group, then x inside the group; pair crossings even-odd
+    x = np.clip(x, -1.0, width + 1.0)
+    order = np.argsort((poly_id[edge] * height + row) * (width + 4.0) + (x + 2.0))
+    x = x[order]
+    base = row[order][0::2] * width
+    start = base + np.clip(np.ceil(x[0::2] - 0.5), 0, width).astype(np.intp)
+    end = base + np.clip(np.ceil(x[1::2] - 0.5), 0, width).astype(np.intp)
+    keep = end > start
+    start, end = start[keep], end[keep]
+    if len(start) == 0:
+        return start, end
+
+    # union: sort spans by start, merge every span that begins inside the running end
+    order = np.argsort(start, kind="stable")
+    start, end = start[order], np.maximum.accumulate(end[order])
+    new = np.ones(len(start), dtype=bool)
+    new[1:] = start[1:] > end[:-1]
+    first = np.flatnonzero(new)
+    return start[first], end[np.append(first[1:] - 1, len(end) - 1)]
+
+
+def _paint_runs(starts: np.ndarray, ends: np.ndarray, width: int, height: int, value, dtype) -> np.ndarray:
+    # disjoint sorted runs -> (height, width) raster holding value inside the runs, 0 elsewhere
+    bounds = np.empty(2 * len(starts) + 2, dtype=np.intp)
+    bounds[0], bounds[-1] = 0, width * height
+    bounds[1:-1:2], bounds[2:-1:2] = starts, ends
+    vals = np.zeros(len(bounds) - 1, dtype=dtype)
+    vals[1::2] = value
+    return np.repeat(vals, np.diff(bounds)).reshape(height, width)
+
+
+def scanline_fill_mask(polys: np.ndarray, width: int, height: int) -> np.ndarray:
+    """
+    Even-odd scanline fill of (K, n, 2) polygons (same vertex count each) into
+    a (height, width) bool mask, sampling pixel centres. Each polygon is
+    filled even-odd on its own; the polygons are then unioned. Crossings of
+    all edges with all scanlines are built, sorted and paired in one go, and
+    the merged spans are expanded run-length, so no per-pixel pass is needed.
+    """
+    starts, ends = _scanline_runs(polys, width, height)
+    return _paint_runs(starts, ends, width, height, True, bool)
+
+
+def _silhouette_polygons(pts: np.ndarray, slices: int, m: int, steps: int) -> np.ndarray:
+    # projected conv3d control points -> (Q, 4, 2) quads covering the revolved surface's outline.
+    # The surface (patches between neighbouring slices, both end rings closed as triangle fans
+    # (a, b, c, c)) is closed and consistently wound, so every ray through the outline enters it
+    # through a positively wound face: those faces alone cover the outline.
+    seg = _flatten_cubic_segments(pts[: slices * m], steps).reshape(slices, m // 4, steps + 1, 2)
+    grid = np.concatenate([seg[:, :, :-1].reshape(slices, -1, 2), seg[:, -1:, -1]], axis=1)
+    nxt = np.roll(grid, -1, axis=0)
+    quads = np.stack([grid[:, :-1], grid[:, 1:], nxt[:, 1:], nxt[:, :-1]], axis=2).reshape(-1, 4, 2)
+    first, last = grid[:, 0], grid[:, -1]
+    cap0 = np.stack([np.broadcast_to(first[0], (slices - 2, 2)), first[1:-1], first[2:], first[2:]], axis=1)
+    cap1 = np.stack([np.broadcast_to(last[0], (slices - 2, 2)), last[2:], last[1:-1], last[1:-1]], axis=1)
+    polys = np.concatenate([quads, cap0, cap1])
+    nx = np.roll(polys, -1, axis=1)
+    area = (polys[..., 0] * nx[..., 1] - nx[..., 0] * polys[..., 1]).sum(axis=1)
+    return polys[area > 0]
+
+
+def fill_silhouette(
+    frame: Image.Image,
+    pts: np.ndarray,
+    fill_hex: str,
+    alpha_01: float,
+    slices: Optional[int] = None,
+    steps: int = 6,
+) -> None:
+    """
+    Fills the projected outline of a conv3d path (union of the surface quads
+    between neighbouring slices plus both end rings) onto an RGBA frame with
+    fc / fp semantics. Only the outline's bounding box is rasterized.
+    """
+    slices, m, _ = ShapeInkei.conv3d_layout(slices)
+    quads = _silhouette_polygons(np.asarray(pts, dtype=np.float64), slices, m, steps)
+    if len(quads) == 0:
+        # no front-facing area (e.g. zero circumference): nothing to paint
+        return
+    w, h = frame.size
+    x0 = max(0, int(np.floor(quads[..., 0].min())))
+    y0 = max(0, int(np.floor(quads[..., 1].min())))
+    x1 = min(w, int(np.ceil(quads[..., 0].max())) + 1)
+    y1 = min(h, int(np.ceil(quads[..., 1].max())) + 1)
+    if x1 <= x0 or y1 <= y0 or alpha_01 <= 0:
+        return
+    off = np.array([x0, y0], dtype=np.float64)
+    starts, ends = _scanline_runs(quads - off, x1 - x0, y1 - y0)
+    a = int(max(0.0, min(1.0, alpha_01)) * 255)
+    mask = _paint_runs(starts, ends, x1 - x0, y1 - y0, a, np.uint8)
+    alpha = Image.frombuffer("L", (x1 - x0, y1 - y0), mask.tobytes(), "raw", "L", 0, 1)
+    # pasting a solid image through the mask is much cheaper in PIL than pasting a colour
+    frame.paste(Image.new("RGBA", alpha.size, _hex_to_rgba(fill_hex, 1.0)), (x0, y0, x1, y1), alpha)
+
 
 # ----------------------------
 # Port of clsShapeInkei (subset)
@@ -434,6 +741,8 @@ class ShapeInkei:
     I_KUKI3 = 24
 
     iStageWidth = 320
+    iSlices = 12
+    aiSegmentMask = [0, 0]
     aiAutoX = [0, 0, 0, 90, 0]
     aiAutoY = [-160, -90, 180, 360, 630]
     aiAutoZ = [0, 0, 0, 0, 0]
@@ -442,19 +751,31 @@ class ShapeInkei:
     def get_fny0(iP0, iP1, iP2, iP3, iP4, iP5, iP6, iP7, iP8, iP9) -> Path2D:
         return ShapeInkei.get_path(90, 80, -20, -40, -30, 140, 80, iP7, iP8, iP9)
 
+    # Base control points (3*n+1 = 25)
+    _BASE_X = (0, 29, 55, 84, 86, 89, 91, 92, 93, 96, 105, 124, 129, 128, 123, 116, 113, 113, 111, 109, 106, 103, 66, 34, 0)
+    _BASE_Y = (0, 2, 3, 1, 2, 2, 4, 2, 0, -3, 0, 1, 13, 21, 29, 32, 31, 31, 30, 31, 32, 33, 36, 35, 35)
+
     @staticmethod
     def get_path(iAl, iRf, iSv, iSa, iHa, iSe, iHe, iP7, iP8, iP9) -> Path2D:
-        # Base control points (3*n+1 = 25)
-        aiX = [0, 29, 55, 84, 86, 89, 91, 92, 93, 96, 105, 124, 129, 128, 123, 116, 113, 113, 111, 109, 106, 103, 66, 34, 0]
-        aiY = [0, 2, 3, 1, 2, 2, 4, 2, 0, -3, 0, 1, 13, 21, 29, 32, 31, 31, 30, 31, 32, 33, 36, 35, 35]
+        aiX = list(ShapeInkei._BASE_X)
+        aiY = list(ShapeInkei._BASE_Y)
+        ShapeInkei._stage_diameter(aiX, aiY, iRf)
+        ShapeInkei._stage_glans_expansion(aiX, aiY, iHe)
+        ShapeInkei._stage_shaft_expansion(aiX, aiY, iSe)
+        ShapeInkei._stage_length(aiX, aiY, iAl)
+        ShapeInkei._stage_shaft_curve(aiX, aiY, iSv)
+        ShapeInkei._stage_shaft_angle(aiX, aiY, iSa)
+        ShapeInkei._stage_glans_angle(aiX, aiY, iHa)
+        ShapeInkei._stage_center(aiX, aiY)
+        return Path2D([float(v) for v in aiX], [float(v) for v in aiY])
+
+    # get_path stages, in order; each updates aiX/aiY in place.
 
+    @staticmethod
+    def _stage_diameter(aiX: List[float], aiY: List[float], iRf: float) -> None:
         KUKI0 = ShapeInkei.I_KUKI0
         KUKI1 = ShapeInkei.I_KUKI1
-        KITO0 = ShapeInkei.I_KITO0
-        KITO1 = ShapeInkei.I_KITO1
         RINKO = ShapeInkei.I_RINKO
-        KITO2 = ShapeInkei.I_KITO2
-        KITO3 = ShapeInkei.I_KITO3
         KUKI2 = ShapeInkei.I_KUKI2
         KUKI3 = ShapeInkei.I_KUKI3
 
@@ -474,7 +795,13 @@ class ShapeInkei:
         for i in range(KUKI1, KUKI2 + 1):
             aiX[i] = aiX[RINKO] + (aiX[i] - aiX[RINKO]) * pr
 
-        # glans expansion (iHe)
+    @staticmethod
+    def _stage_glans_expansion(aiX: List[float], aiY: List[float], iHe: float) -> None:
+        KITO0 = ShapeInkei.I_KITO0
+        KITO1 = ShapeInkei.I_KITO1
+        KITO2 = ShapeInkei.I_KITO2
+        KITO3 = ShapeInkei.I_KITO3
+
         cx = aiX[KITO0] + (aiX[KITO3] - aiX[KITO0]) * 0.5
         cy = aiY[KITO0] + (aiY[KITO3] - aiY[KITO0]) * 0.5
         he = iHe / 100.0
@@ -482,7 +809,13 @@ class ShapeInkei:
             aiX[i] = cx + (aiX[i] - cx) * he
             aiY[i] = cy + (aiY[i] - cy) * he
 
-        # shaft expansion (iSe)
+    @staticmethod
+    def _stage_shaft_expansion(aiX: List[float], aiY: List[float], iSe: float) -> None:
+        KUKI0 = ShapeInkei.I_KUKI0
+        KUKI1 = ShapeInkei.I_KUKI1
+        KUKI2 = ShapeInkei.I_KUKI2
+        KUKI3 = ShapeInkei.I_KUKI3
+
         cx = aiX[KUKI0] + (aiX[KUKI2] - aiX[KUKI0]) * 0.5
         cy = aiY[KUKI0] + (aiY[KUKI2] - aiY[KUKI0]) * 0.5
         se = iSe / 100.0
@@ -491,6 +824,14 @@ class ShapeInkei:
                 aiX[i] = cx + (aiX[i] - cx) * se
                 aiY[i] = cy + (aiY[i] - cy) * se
 
+    @staticmethod
+    def _stage_length(aiX: List[float], aiY: List[float], iAl: float) -> None:
+        KUKI0 = ShapeInkei.I_KUKI0
+        KUKI1 = ShapeInkei.I_KUKI1
+        RINKO = ShapeInkei.I_RINKO
+        KUKI2 = ShapeInkei.I_KUKI2
+        KUKI3 = ShapeInkei.I_KUKI3
+
         # horizontal scale to match length iAl
         pr = iAl / (aiX[RINKO] - aiX[KUKI0])
         tip_x = aiX[RINKO] * pr
@@ -505,7 +846,13 @@ class ShapeInkei:
             aiX[KUKI0 + i] = aiX[KUKI0] + (aiX[KUKI1] - aiX[KUKI0]) * i / 3.0
             aiX[KUKI3 - i] = aiX[KUKI3] + (aiX[KUKI2] - aiX[KUKI3]) * i / 3.0
 
-        # shaft curve iSv
+    @staticmethod
+    def _stage_shaft_curve(aiX: List[float], aiY: List[float], iSv: float) -> None:
+        KUKI0 = ShapeInkei.I_KUKI0
+        KUKI1 = ShapeInkei.I_KUKI1
+        KUKI2 = ShapeInkei.I_KUKI2
+        KUKI3 = ShapeInkei.I_KUKI3
+
         cx = aiX[KUKI0 + 1] + (aiX[KUKI0 + 2] - aiX[KUKI0 + 1]) * 0.5
         cy = aiY[KUKI0 + 1] + (aiY[KUKI0 + 2] - aiY[KUKI0 + 1]) * 0.5
 
@@ -529,6 +876,11 @@ class ShapeInkei:
         for i in range(KUKI1, KUKI2 + 1):
             aiX[i], aiY[i] = Morph.rotate2d(cx, cy, aiX[i], aiY[i], -iSv)
 
+    @staticmethod
+    def _stage_shaft_angle(aiX: List[float], aiY: List[float], iSa: float) -> None:
+        KUKI0 = ShapeInkei.I_KUKI0
+        KUKI3 = ShapeInkei.I_KUKI3
+
         # shaft angle iSa around base point
         bx = aiX[KUKI0]
         by = aiY[KUKI0]
@@ -539,38 +891,156 @@ class ShapeInkei:
         aiY[KUKI0] *= sa_sted
         aiY[KUKI3] *= sa_sted
 
+    @staticmethod
+    def _stage_glans_angle(aiX: List[float], aiY: List[float], iHa: float) -> None:
+        KITO1 = ShapeInkei.I_KITO1
+        RINKO = ShapeInkei.I_RINKO
+        KITO2 = ShapeInkei.I_KITO2
+
         # glans angle iHa around glans center
         cx = aiX[KITO1] + (aiX[KITO2] - aiX[KITO1]) * 0.5
         cy = aiY[KITO1] + (aiY[KITO2] - aiY[KITO1]) * 0.5
         for i in range(RINKO - 1, RINKO + 2):
             aiX[i], aiY[i] = Morph.rotate2d(cx, cy, aiX[i], aiY[i], -iHa)
 
+    @staticmethod
+    def _stage_center(aiX: List[float], aiY: List[float]) -> None:
         # vertical centering
-        height = aiY[KUKI3] - aiY[KUKI0]
+        height = aiY[ShapeInkei.I_KUKI3] - aiY[ShapeInkei.I_KUKI0]
         for i in range(len(aiX)):
             aiY[i] -= height * 0.5
 
-        return Path2D([float(v) for v in aiX], [float(v) for v in aiY])
+    @staticmethod
+    def get_path_batch(iAl, iRf, iSv, iSa, iHa, iSe, iHe) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Vectorized get_path: every argument is a scalar or an (N,) array.
+        Returns (xs, ys), each (N, 25), row i matching get_path for row i.
+        """
+        iAl, iRf, iSv, iSa, iHa, iSe, iHe = np.broadcast_arrays(
+            *(np.atleast_1d(np.asarray(v, dtype=np.float64)) for v in (iAl, iRf, iSv, iSa, iHa, iSe, iHe))
+        )
+        n = iAl.shape[0]
+        aiX = np.tile(np.asarray(ShapeInkei._BASE_X, dtype=np.float64), (n, 1))
+        aiY = np.tile(np.asarray(ShapeInkei._BASE_Y, dtype=np.float64), (n, 1))
+
+        KUKI0 = ShapeInkei.I_KUKI0
+        KUKI1 = ShapeInkei.I_KUKI1
+        KITO0 = ShapeInkei.I_KITO0
+        KITO1 = ShapeInkei.I_KITO1
+        RINKO = ShapeInkei.I_RINKO
+        KITO2 = ShapeInkei.I_KITO2
+        KITO3 = ShapeInkei.I_KITO3
+        KUKI2 = ShapeInkei.I_KUKI2
+        KUKI3 = ShapeInkei.I_KUKI3
+        shaft = [i for i in range(KUKI0 + 1, KUKI3) if i <= KUKI1 - 1 or i >= KUKI2 + 1]
+
+        def col(a, i):
+            return a[:, i:i + 1]
+
+        # circumference -> diameter, vertical scale factor
+        pr = (iRf / math.pi) / (aiY[:, KUKI3] - aiY[:, KUKI0])
+        aiY *= pr[:, None]
+
+        # adjust glans width factor if it would invert
+        inv = aiX[:, RINKO] + (aiX[:, KUKI1] - aiX[:, RINKO]) * pr < aiX[:, KUKI0] + (aiX[:, RINKO] - aiX[:, KUKI0]) * 0.1
+        pr = np.where(inv, (aiX[:, KUKI0] + (aiX[:, RINKO] - aiX[:, KUKI0]) * 1.0) / (aiX[:, RINKO] - aiX[:, KUKI1]), pr)
+        aiX[:, KUKI1:KUKI2 + 1] = col(aiX, RINKO) + (aiX[:, KUKI1:KUKI2 + 1] - col(aiX, RINKO)) * pr[:, None]
+
+        # glans expansion (iHe)
+        cx = col(aiX, KITO0) + (col(aiX, KITO3) - col(aiX, KITO0)) * 0.5
+        cy = col(aiY, KITO0) + (col(aiY, KITO3) - col(aiY, KITO0)) * 0.5
+        he = (iHe / 100.0)[:, None]
+        sl = slice(KITO1 - 1, KITO2 + 2)
+        aiX[:, sl] = cx + (aiX[:, sl] - cx) * he
+        aiY[:, sl] = cy + (aiY[:, sl] - cy) * he
+
+        # shaft expansion (iSe)
+        cx = col(aiX, KUKI0) + (col(aiX, KUKI2) - col(aiX, KUKI0)) * 0.5
+        cy = col(aiY, KUKI0) + (col(aiY, KUKI2) - col(aiY, KUKI0)) * 0.5
+        se = (iSe / 100.0)[:, None]
+        aiX[:, shaft] = cx + (aiX[:, shaft] - cx) * se
+        aiY[:, shaft] = cy + (aiY[:, shaft] - cy) * se
+
+        # horizontal scale to match length iAl, move glans block
+        pr = iAl / (aiX[:, RINKO] - aiX[:, KUKI0])
+        dx = aiX[:, RINKO] * pr - aiX[:, RINKO]
+        aiX[:, KUKI1:KUKI2 + 1] += dx[:, None]
+
+        # fix shaft control points
+        for i in range(1, 3):
+            aiX[:, KUKI0 + i] = aiX[:, KUKI0] + (aiX[:, KUKI1] - aiX[:, KUKI0]) * i / 3.0
+            aiX[:, KUKI3 - i] = aiX[:, KUKI3] + (aiX[:, KUKI2] - aiX[:, KUKI3]) * i / 3.0
+
+        # shaft curve iSv
+        cx = aiX[:, KUKI0 + 1] + (aiX[:, KUKI0 + 2] - aiX[:, KUKI0 + 1]) * 0.5
+        cy = aiY[:, KUKI0 + 1] + (aiY[:, KUKI0 + 2] - aiY[:, KUKI0 + 1]) * 0.5
+        r = np.hypot(cx, cy)
+        s = np.degrees(np.arctan2(cy, cx)) - iSv
+        dy = cy - np.sin(np.radians(s)) * r
+        aiY[:, shaft] += dy[:, None]
+
+        sv_sted = 1.0 / np.cos(np.radians(iSv))
+        sv_sted = (sv_sted - 1.0) * 0.5 + 1.0
+        aiY[:, KUKI0] *= sv_sted
+        aiY[:, KUKI3] *= sv_sted
+
+        # rotate boundary area by -iSv
+        cx = aiX[:, KUKI1] + (aiX[:, KUKI2] - aiX[:, KUKI1]) * 0.5
+        cy = aiY[:, KUKI1] + (aiY[:, KUKI2] - aiY[:, KUKI1]) * 0.5
+        sl = slice(KUKI1, KUKI2 + 1)
+        aiX[:, sl], aiY[:, sl] = Morph.rotate2d_batch(cx, cy, aiX[:, sl], aiY[:, sl], -iSv)
+
+        # shaft angle iSa around base point
+        sl = slice(KUKI0 + 1, KUKI3)
+        aiX[:, sl], aiY[:, sl] = Morph.rotate2d_batch(aiX[:, KUKI0], aiY[:, KUKI0], aiX[:, sl], aiY[:, sl], -iSa)
+
+        sa_sted = 1.0 / np.cos(np.radians(iSa))
+        aiY[:, KUKI0] *= sa_sted
+        aiY[:, KUKI3] *= sa_sted
+
+        # glans angle iHa around glans center
+        cx = aiX[:, KITO1] + (aiX[:, KITO2] - aiX[:, KITO1]) * 0.5
+        cy = aiY[:, KITO1] + (aiY[:, KITO2] - aiY[:, KITO1]) * 0.5
+        sl = slice(RINKO - 1, RINKO + 2)
+        aiX[:, sl], aiY[:, sl] = Morph.rotate2d_batch(cx, cy, aiX[:, sl], aiY[:, sl], -iHa)
+
+        # vertical centering
+        aiY -= ((aiY[:, KUKI3] - aiY[:, KUKI0]) * 0.5)[:, None]
+
+        return aiX, aiY
 
     @staticmethod
-    def conv3d(shape2d: Path2D) -> Path3D:
+    def conv3d(shape2d: Path2D, slices: Optional[int] = None) -> Path3D:
         return Morph.conv_xy_to_xyz_of_cylinder3d(
             shape=shape2d,
             start_idx=[ShapeInkei.iMainSt],
             end_idx=[ShapeInkei.iMainEd],
-            slices=12,
+            slices=slices or ShapeInkei.iSlices,
             slice_mask=[],
-            segment_mask=[0, 0],
+            segment_mask=ShapeInkei.aiSegmentMask,
             radius_scale=[1.0],
         )
 
     @staticmethod
-    def get_path3d(iP0, iP1, iP2, iP3, iP4, iP5, iP6, iP7, iP8, iP9, mode: str = "") -> Path3D:
+    def conv3d_layout(slices: Optional[int] = None) -> Tuple[int, int, Tuple[int, ...]]:
+        # (slices, points per slice, ring t's) of the path conv3d returns
+        half = (ShapeInkei.iMainEd - ShapeInkei.iMainSt) // 2
+        m = 4 * len(range(0, half, 3))
+        mask = ShapeInkei.aiSegmentMask
+        rings = tuple(
+            t for g, t in enumerate(range(0, m, 4)) if (mask[g] == 1 if g < len(mask) else True)
+        )
+        return slices or ShapeInkei.iSlices, m, rings
+
+    @staticmethod
+    def get_path3d(
+        iP0, iP1, iP2, iP3, iP4, iP5, iP6, iP7, iP8, iP9, mode: str = "", slices: Optional[int] = None
+    ) -> Path3D:
         if mode == "click":
             s2d = ShapeInkei.get_fny0(iP0, iP1, iP2, iP3, iP4, iP5, iP6, iP7, iP8, iP9)
         else:
             s2d = ShapeInkei.get_path(iP0, iP1, iP2, iP3, iP4, iP5, iP6, iP7, iP8, iP9)
-        return ShapeInkei.conv3d(s2d)
+        return ShapeInkei.conv3d(s2d, slices)
 
     @staticmethod
     def get_desc_list(lang: str, p: LayerParams) -> str:
@@ -587,6 +1057,218 @@ class ShapeInkei:
         )
 
 
+# ----------------------------
+# Degenerate parameter rows (per-row validity for the batch engines)
+# ----------------------------
+
+# get_path divides by cos(p2) and cos(p3): near +-90 deg the base ends blow up
+# (~1e16 at exactly 90) and NaN / inf inputs spread through every stage. One
+# such row would set the shared perspective of a render or the PCA basis of a
+# ShapeIndex, or abort a pool map, so the batch paths check rows first.
+PARAM_NONFINITE = 1    # a p0..p6 value is NaN / inf: row dropped
+PARAM_BAD_PROFILE = 2  # profile non-finite or beyond PROFILE_MAX_EXTENT: row dropped
+PARAM_CURVE_POLE = 4   # p2 within PARAM_POLE_MARGIN of a zero of cos: clamped
+PARAM_ANGLE_POLE = 8   # p3 likewise
+PARAM_FLAT = 16        # p0 <= 0 or p1 <= 0 (zero length / circumference): kept
+PARAM_DROP = PARAM_NONFINITE | PARAM_BAD_PROFILE
+
+PARAM_POLE_MARGIN = 1.0     # degrees; 1 / cos(89 deg) ~ 57
+PROFILE_MAX_EXTENT = 1.0e6  # mm
+
+_PARAM_FLAG_NAMES = (
+    (PARAM_NONFINITE, "nonfinite"),
+    (PARAM_BAD_PROFILE, "bad_profile"),
+    (PARAM_CURVE_POLE, "curve_clamped"),
+    (PARAM_ANGLE_POLE, "angle_clamped"),
+    (PARAM_FLAT, "flat"),
+)
+
+# stand-in computed for dropped rows so the vectorized stages keep running
+_PARAM_STAND_IN = (
+    ShapeInkei.iDefP0, ShapeInkei.iDefP1, ShapeInkei.iDefP2, ShapeInkei.iDefP3,
+    ShapeInkei.iDefP4, ShapeInkei.iDefP5, ShapeInkei.iDefP6,
+)
+
+
+def _clamp_pole(a: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    # angles (deg) within PARAM_POLE_MARGIN of 90 + 180k -> moved out to the margin
+    pole = 90.0 + 180.0 * np.round((a - 90.0) / 180.0)
+    off = a - pole
+    hit = np.abs(off) < PARAM_POLE_MARGIN
+    side = np.where(off != 0.0, np.sign(off), -np.sign(pole))
+    return np.where(hit, pole + side * PARAM_POLE_MARGIN, a), hit
+
+
+def sanitize_params(params) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    (N, 7+) parameter rows -> (clean copy, flags (N,) uint8). Rows with a
+    non-finite p0..p6 get the default shape and PARAM_NONFINITE; p2 / p3 on
+    a zero of cos are clamped PARAM_POLE_MARGIN off it. Extra columns
+    (p7.., drawing params) pass through.
+    """
+    p = np.array(params, dtype=np.float64)
+    if p.ndim == 1:
+        p = p.reshape(-1, 7)
+    flags = np.zeros(len(p), dtype=np.uint8)
+    bad = ~np.isfinite(p[:, :7]).all(axis=1)
+    flags[bad] |= PARAM_NONFINITE
+    p[bad, :7] = _PARAM_STAND_IN
+    p[:, 2], hit = _clamp_pole(p[:, 2])
+    flags[hit] |= PARAM_CURVE_POLE
+    p[:, 3], hit = _clamp_pole(p[:, 3])
+    flags[hit] |= PARAM_ANGLE_POLE
+    flags[((p[:, 0] <= 0.0) | (p[:, 1] <= 0.0)) & ~bad] |= PARAM_FLAT
+    return p, flags
+
+
+@functools.lru_cache(maxsize=1)
+def _stand_in_profile() -> Tuple[np.ndarray, np.ndarray]:
+    xs, ys = ShapeInkei.get_path_batch(*_PARAM_STAND_IN)
+    xs.setflags(write=False)
+    ys.setflags(write=False)
+    return xs[0], ys[0]
+
+
+def _checked_profiles(p: np.ndarray, flags: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    # get_path_batch on sanitized rows; rows that still overflow get the stand-in
+    with np.errstate(over="ignore", invalid="ignore"):
+        xs, ys = ShapeInkei.get_path_batch(*p[:, :7].T)
+        ok = (np.abs(xs) <= PROFILE_MAX_EXTENT).all(axis=1) & (np.abs(ys) <= PROFILE_MAX_EXTENT).all(axis=1)
+    if not ok.all():
+        bad = ~ok
+        flags[bad] |= PARAM_BAD_PROFILE
+        xs[bad], ys[bad] = _stand_in_profile()
+    return xs, ys
+
+
+def get_path_checked(params) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    get_path_batch that never raises on a row and never lets one row poison
+    the rest: (xs, ys, flags) for sanitize_params rows. Dropped rows hold the
+    stand-in profile, so outputs stay finite; mask with (flags & PARAM_DROP) == 0.
+    """
+    p, flags = sanitize_params(params)
+    xs, ys = _checked_profiles(p, flags)
+    return xs, ys, flags
+
+
+def param_errors(flags: np.ndarray, offset: int = 0) -> List[Tuple[int, str]]:
+    # per-row report: (row + offset, "reason,reason") for every flagged row
+    out = []
+    for i in np.flatnonzero(flags).tolist():
+        f = int(flags[i])
+        out.append((i + offset, ",".join(name for bit, name in _PARAM_FLAG_NAMES if f & bit)))
+    return out
+
+
+@functools.lru_cache(maxsize=4096)
+def _layer_check(key: Tuple[float, ...]) -> Tuple[int, float, float]:
+    # sanitize_params + profile check of one layer key: (flags, p2, p3)
+    p, flags = sanitize_params(key[:7])
+    _checked_profiles(p, flags)
+    return int(flags[0]), float(p[0, 2]), float(p[0, 3])
+
+
+def sanitize_layers(layers: List[LayerParams], errors: Optional[list] = None) -> List[LayerParams]:
+    """
+    Renderer side of sanitize_params: drops PARAM_DROP layers, returns
+    clamped copies of pole layers (the rest as is) and appends the
+    per-layer report to errors when given. Checks are cached per layer key.
+    """
+    checks = [_layer_check(_layer_key(lp)) for lp in layers]
+    if errors is not None:
+        errors.extend(param_errors(np.array([c[0] for c in checks], dtype=np.uint8)))
+    if not any(c[0] for c in checks):
+        return layers
+    out = []
+    for lp, (f, p2, p3) in zip(layers, checks):
+        if f & PARAM_DROP:
+            continue
+        if f & (PARAM_CURVE_POLE | PARAM_ANGLE_POLE):
+            lp = replace(lp, p2=p2, p3=p3)
+        out.append(lp)
+    return out
+
+
+def _parse_render_layers(txtcsv: str, errors: Optional[list] = None) -> List[LayerParams]:
+    # parse + sanitize_layers for the txtCsv entry points; the per-layer report
+    # goes to errors, and is the error message when no layer is left to draw
+    layers = parse_txtcsv_layers(txtcsv)
+    report: list = []
+    out = sanitize_layers(layers, report)
+    if errors is not None:
+        errors.extend(report)
+    if layers and not out:
+        raise ValueError("No renderable layers in txtCsv: " + "; ".join(f"layer {i}: {r}" for i, r in report))
+    return out
+
+
+# ----------------------------
+# Incremental get_path for single-parameter edits (editor sliders)
+# ----------------------------
+
+class StagedPath:
+    """
+    Caches the get_path profile after every stage. A stage's output only
+    depends on the parameters consumed up to it, so when one slider moves only
+    the stages from the first changed parameter onward are re-run. Results are
+    identical to ShapeInkei.get_path.
+    """
+
+    # (parameter consumed, stage) in get_path order
+    _STAGES = (
+        ("iRf", ShapeInkei._stage_diameter),
+        ("iHe", ShapeInkei._stage_glans_expansion),
+        ("iSe", ShapeInkei._stage_shaft_expansion),
+        ("iAl", ShapeInkei._stage_length),
+        ("iSv", ShapeInkei._stage_shaft_curve),
+        ("iSa", ShapeInkei._stage_shaft_angle),
+        ("iHa", ShapeInkei._stage_glans_angle),
+    )
+
+    def __init__(self) -> None:
+        n = len(self._STAGES)
+        self._values: List[Optional[float]] = [None] * n
+        # _cache[i] = (aiX, aiY) after stage i
+        self._cache: List[Optional[Tuple[List[float], List[float]]]] = [None] * n
+        self._path: Optional[Path2D] = None
+        self._path3d: Optional[Path3D] = None
+        self.stages_run = 0  # stages recomputed by the last evaluate()
+
+    def evaluate(self, iAl, iRf, iSv, iSa, iHa, iSe, iHe, iP7=0, iP8=0, iP9=0) -> Path2D:
+        args = {"iAl": iAl, "iRf": iRf, "iSv": iSv, "iSa": iSa, "iHa": iHa, "iSe": iSe, "iHe": iHe}
+        values = [args[name] for name, _ in self._STAGES]
+
+        first = len(values)
+        for i, v in enumerate(values):
+            if self._values[i] is None or self._values[i] != v:
+                first = i
+                break
+        self.stages_run = len(values) - first
+        if first == len(values) and self._path is not None:
+            return self._path
+
+        if first == 0:
+            aiX, aiY = list(ShapeInkei._BASE_X), list(ShapeInkei._BASE_Y)
+        else:
+            aiX, aiY = list(self._cache[first - 1][0]), list(self._cache[first - 1][1])
+        for i in range(first, len(values)):
+            self._STAGES[i][1](aiX, aiY, values[i])
+            self._values[i] = values[i]
+            self._cache[i] = (list(aiX), list(aiY))
+
+        ShapeInkei._stage_center(aiX, aiY)
+        self._path = Path2D([float(v) for v in aiX], [float(v) for v in aiY])
+        self._path3d = None
+        return self._path
+
+    def evaluate3d(self, iAl, iRf, iSv, iSa, iHa, iSe, iHe, iP7=0, iP8=0, iP9=0) -> Path3D:
+        path = self.evaluate(iAl, iRf, iSv, iSa, iHa, iSe, iHe, iP7, iP8, iP9)
+        if self._path3d is None:
+            self._path3d = ShapeInkei.conv3d(path)
+        return self._path3d
+
+
 # ----------------------------
 # Port of the txtCsv parsing logic (from main_u3d.js)
 # ----------------------------
@@ -695,174 +1377,2045 @@ def parse_txtcsv_layers(txtcsv: str, seed: str = "inkei.net") -> List[LayerParam
 
 
 # ----------------------------
-# Simple renderer (Python replacement for canvas drawing)
+# Port of clsParam URI obfuscation (from common_0.js) + bulk link codec
 # ----------------------------
 
-def render_png_from_txtcsv(
-    txtcsv: str,
-    out_path: str,
-    size: int = 640,
-    background_hex: str = "111111",
-    grid_hex: str = "444444",
-    angles_deg: Tuple[float, float, float] = (0.0, -160.0, 0.0),  # (X,Y,Z) like the site default view
-) -> None:
-    layers = parse_txtcsv_layers(txtcsv)
+def _rot_table(lo: str, hi: str, shift: int) -> dict:
+    a, b = ord(lo), ord(hi)
+    n = b - a + 1
+    return {c: a + (c - a + shift) % n for c in range(a, b + 1)}
 
-    # Build 3D paths
-    built = []
-    for lp in layers:
-        p3d = ShapeInkei.get_path3d(lp.p0, lp.p1, lp.p2, lp.p3, lp.p4, lp.p5, lp.p6, lp.p7, lp.p8, lp.p9)
-        cx, cy, cz = Morph.center_path3d(p3d)
-        built.append((lp, p3d, (cx, cy, cz)))
 
-    stage_w = float(ShapeInkei.iStageWidth)
+def _build_uri_table(shift: int) -> dict:
+    # digits rotate mod 10, a-f / A-F mod 6, g-z / G-Z mod 20; '%' <-> '~'
+    table: dict = {}
+    for lo, hi in (("0", "9"), ("a", "f"), ("g", "z"), ("A", "F"), ("G", "Z")):
+        table.update(_rot_table(lo, hi, shift))
+    table[ord("%")] = ord("~")
+    table[ord("~")] = ord("%")
+    return table
 
-    # Perspective like the JS does: iPerspective = 2 * max(get_perspective_size3d(...))
-    persp_size = 1.0
-    for _, p3d, _ in built:
-        persp_size = max(persp_size, Morph.get_perspective_size3d(size, p3d, stage_w))
-    perspective_d = 2.0 * persp_size
 
-    img = Image.new("RGBA", (size, size), _hex_to_rgba(background_hex, 1.0))
-    draw = ImageDraw.Draw(img, "RGBA")
+_URI_ENC_TABLE = _build_uri_table(+1)
+_URI_DEC_TABLE = _build_uri_table(-1)
 
-    # Grid (matches clsAnime.sbDrawStage logic closely)
-    if background_hex.strip().lstrip("#").lower() != grid_hex.strip().lstrip("#").lower():
-        step = int(size / (ShapeInkei.iStageWidth / 10))  # 640/(320/10)=20
-        col = _hex_to_rgba(grid_hex, 1.0)
-        for x in range(0, size + 1, step):
-            draw.line([(x, 0), (x, size)], fill=col, width=1)
-            draw.line([(0, x), (size, x)], fill=col, width=1)
-
-    # Project + draw cubic bezier segments
-    scale_a = size * 0.9375  # ~600 when size=640 (matches the main view box width)
-    ox = size / 2.0
-    oy = size / 2.0
-    ax, ay, az = angles_deg
+# encodeURI leaves these untouched (alphanumerics + reserved + unreserved marks)
+_URI_SAFE = "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789;,/?:@&=+$#-_.!~*'()"
+_URI_UNSAFE_RE = re.compile(r"[^" + re.escape(_URI_SAFE) + r"]")
+_URI_UNSAFE_BLOCK_RE = re.compile(r"[^" + re.escape(_URI_SAFE) + r"\n]")
+_URI_ESCAPE_RE = re.compile(r"(?:%[0-9A-Fa-f]{2})+")
+# decodeURI keeps escapes of reserved characters as-is
+_URI_RESERVED = frozenset(b";/?:@&=+$,#")
 
-    for lp, p3d, (cx, cy, cz) in built:
-        path2d = Morph.project_xy3d_only(
-            scale_a=scale_a,
-            path=p3d,
-            stage_w=stage_w,
-            perspective_d=perspective_d,
-            origin_x=ox,
-            origin_y=oy,
-            center_x=cx,
-            center_y=cy,
-            center_z=cz,
-            angle_x=ax,
-            angle_y=ay,
-            angle_z=az,
-            morph_per=1.0,
-            mode="c",
-        )
 
-        rgba = _hex_to_rgba(lp.lc, lp.lp / 100.0)
-        width_px = max(1, int(round(lp.lw)))
+def _encode_uri_char(m: "re.Match[str]") -> str:
+    return "".join(f"%{b:02X}" for b in m.group(0).encode("utf-8", "surrogatepass"))
 
-        n = (len(path2d.x) // 4) * 4
-        for i in range(0, n, 4):
-            p0 = (path2d.x[i + 0], path2d.y[i + 0])
-            p1 = (path2d.x[i + 1], path2d.y[i + 1])
-            p2 = (path2d.x[i + 2], path2d.y[i + 2])
-            p3 = (path2d.x[i + 3], path2d.y[i + 3])
-            pts = _sample_cubic_bezier(p0, p1, p2, p3, steps=24)
-            draw.line(pts, fill=rgba, width=width_px)
 
-    img.save(out_path)
+def _encode_uri(s: str, unsafe_re: "re.Pattern[str]" = _URI_UNSAFE_RE) -> str:
+    # JS encodeURI
+    if not unsafe_re.search(s):
+        return s
+    return unsafe_re.sub(_encode_uri_char, s)
 
 
-from PIL import Image, ImageDraw
+def _decode_uri_run(m: "re.Match[str]") -> str:
+    return _decode_uri_escapes(m.group(0))
 
-def _ease_cos_01(t: float) -> float:
-    # matches JS: (cos((1-a)*PI)+1)/2
-    t = max(0.0, min(1.0, t))
-    return (math.cos((1.0 - t) * math.pi) + 1.0) * 0.5
 
+@functools.lru_cache(maxsize=65536)
+def _decode_uri_escapes(text: str) -> str:
+    # Escape runs repeat a lot across a log (same names/labels), so cache them
+    raw = bytes.fromhex(text.replace("%", ""))
+    out: List[str] = []
+    pending = bytearray()
+    pos = 0
+    for b in raw:
+        if b in _URI_RESERVED:
+            if pending:
+                out.append(_decode_utf8_or_keep(bytes(pending)))
+                pending.clear()
+            out.append(text[pos:pos + 3])
+        else:
+            pending.append(b)
+        pos += 3
+    if pending:
+        out.append(_decode_utf8_or_keep(bytes(pending)))
+    return "".join(out)
 
-def _morph_color_hex(c0: str, c1: str, per: float) -> str:
-    per = max(0.0, min(1.0, per))
-    c0 = (c0 or "").strip().lstrip("#")
-    c1 = (c1 or "").strip().lstrip("#")
-    if len(c0) != 6:
-        c0 = "000000"
-    if len(c1) != 6:
-        c1 = "000000"
-    r0, g0, b0 = int(c0[0:2], 16), int(c0[2:4], 16), int(c0[4:6], 16)
-    r1, g1, b1 = int(c1[0:2], 16), int(c1[2:4], 16), int(c1[4:6], 16)
-    r = round(r0 + (r1 - r0) * per)
-    g = round(g0 + (g1 - g0) * per)
-    b = round(b0 + (b1 - b0) * per)
-    return f"{r:02X}{g:02X}{b:02X}"
 
+def _decode_utf8_or_keep(raw: bytes) -> str:
+    try:
+        return raw.decode("utf-8")
+    except UnicodeDecodeError:
+        # JS throws URIError here; we keep the escapes so one bad link
+        # doesn't abort a whole log file.
+        return "".join(f"%{b:02X}" for b in raw)
 
-def _draw_background_with_grid(
-    img: Image.Image,
-    background_hex: str,
-    grid_hex: str,
-    stage_width: int = 320,
-) -> None:
-    w, h = img.size
-    draw = ImageDraw.Draw(img, "RGBA")
 
-    draw.rectangle([0, 0, w, h], fill=_hex_to_rgba(background_hex, 1.0))
+def _decode_uri(s: str) -> str:
+    # JS decodeURI (lenient on malformed UTF-8, see _decode_utf8_or_keep)
+    if "%" not in s:
+        return s
+    return _URI_ESCAPE_RE.sub(_decode_uri_run, s)
 
-    bg = background_hex.strip().lstrip("#").lower()
-    gg = grid_hex.strip().lstrip("#").lower()
-    if bg != gg:
-        # matches clsAnime.sbDrawStage grid spacing:
-        # for b=0..stageWidth/10 => positions are evenly spread
-        step = int(w / (stage_width / 10.0))
-        col = _hex_to_rgba(grid_hex, 1.0)
-        for x in range(0, w + 1, step):
-            draw.line([(x, 0), (x, h)], fill=col, width=1)
-            draw.line([(0, x), (w, x)], fill=col, width=1)
 
+class Param:
+    @staticmethod
+    def encryption_uri(s: str) -> str:
+        # Port of clsParam.fnEncryptionURI (input is already encodeURI'd)
+        return _encode_uri(s.replace("~", "").translate(_URI_ENC_TABLE))
 
-def render_gif_from_txtcsv(
-    txtcsv: str,
-    out_path: str,
-    size: int = 640,
-    fps: int = 20,
-    background_hex: str = "111111",
-    grid_hex: str = "444444",
-    show_all_layers: bool = False,
-    seconds_per_layer: Optional[float] = None,  # if None, uses each layer's as_ value
-    supersample: int = 2,  # 1 = faster, 2 = smoother
-) -> None:
-    """
-    Exports an animated GIF using the same camera keyframes as main_u3d.js:
-    ShapeInkei.aiAutoX/Y/Z define 5 keyframes => 4 segments.
-    Segment 0 uses morph_per = -ease (like JS) and color fades from white -> lc.
-    Other segments use morph_per = 1.
+    @staticmethod
+    def decryption_uri(s: str) -> str:
+        # Port of clsParam.fnDecryptionURI
+        return _decode_uri(s).translate(_URI_DEC_TABLE)
 
-    If show_all_layers=False: cycles layers like the website.
-    If show_all_layers=True: renders all layers every frame.
-    """
-    layers = parse_txtcsv_layers(txtcsv)
-    if not layers:
-        raise ValueError("No layers parsed from txtCsv")
 
-    # Precompute 3D paths/centers
-    stage_w = float(ShapeInkei.iStageWidth)
-    built = []
-    for lp in layers:
-        p3d = ShapeInkei.get_path3d(lp.p0, lp.p1, lp.p2, lp.p3, lp.p4, lp.p5, lp.p6, lp.p7, lp.p8, lp.p9)
-        open3d = ShapeInkei.get_path3d(lp.p0, lp.p1, lp.p2, lp.p3, lp.p4, lp.p5, lp.p6, lp.p7, lp.p8, lp.p9, mode="click")
-        cx, cy, cz = Morph.center_path3d(p3d)
-        built.append((lp, p3d, open3d, (cx, cy, cz)))
+def encode_shared_link(text: str) -> str:
+    # Same steps as clsParam.sbSendText/sbSendForm: spaces -> '_', encodeURI, encrypt
+    return Param.encryption_uri(_encode_uri(text.replace(" ", "_")))
 
-    # Perspective like JS: iPerspective = 2 * max(fnGetPerspectiveSize3d(...))
-    persp_size = 1.0
-    for _, p3d, _, _ in built:
-        persp_size = max(persp_size, Morph.get_perspective_size3d(size * supersample, p3d, stage_w))
-    perspective_d = 2.0 * persp_size
 
-    # Label box area size on the site is less than full panel; approximate by scale factor
-    scale_a = (size * supersample) * 0.9375
-    ox = (size * supersample) / 2.0
-    oy = (size * supersample) / 2.0
+def decode_shared_link(link: str) -> str:
+    # Same steps as clsParam.sbParam2Form: last path segment, decrypt,
+    # decodeURI, drop '#...', '_' -> ' '
+    token = (link or "").strip().rsplit("/", 1)[-1]
+    text = _decode_uri(Param.decryption_uri(token))
+    text = text.split("#", 1)[0]
+    return text.replace("_", " ")
+
+
+def parse_shared_link(link: str, seed: str = "inkei.net", encrypted: bool = True) -> List[LayerParams]:
+    # NB: fnEncryptionURI strips every '~', so only links sent with
+    # encrypted=False (sbSendText(..., 0)) keep the txtCsv key separators;
+    # is_lossy_link_text tells when an encrypted one lost them.
+    if not encrypted:
+        token = (link or "").strip().rsplit("/", 1)[-1]
+        return parse_txtcsv_layers(_decode_uri(token).split("#", 1)[0], seed=seed)
+    return parse_txtcsv_layers(decode_shared_link(link), seed=seed)
+
+
+_LINK_VALUE_RES = {
+    **dict.fromkeys(("p0", "p1", "p2", "p3", "p4", "p5", "p6", "p7", "p8", "p9", "lp", "fp", "lw", "as"), _NUM_RE),
+    "lc": re.compile(r"^#?[0-9A-Fa-f]{6}$"),
+    "fc": re.compile(r"^#?[0-9A-Fa-f]{6}$"),
+}
+
+
+def is_lossy_link_text(text: str, seed: str = "inkei.net") -> bool:
+    """
+    True when decrypted link text lost its '~' key separators (fnEncryptionURI
+    strips them): some layer's leading numeric or color key no longer has a
+    valid value because the following keys ran into it. Text keys (q0..q2)
+    swallow anything, so a layer starting with one cannot be told apart.
+    """
+    if "~" in text:
+        return False
+    n = _prefix_len_from_seed(seed)
+    n = n if n > 0 else 2
+    for raw in text.split("!"):
+        check = _LINK_VALUE_RES.get(raw[:n])
+        val = raw[n:].strip()
+        if check is not None and val and not check.match(val):
+            return True
+    return False
+
+
+def _transcode_link(text: str, decode: bool, unsafe_re: "re.Pattern[str]" = _URI_UNSAFE_RE) -> str:
+    if decode:
+        return _decode_uri(Param.decryption_uri(text)).replace("_", " ")
+    text = _encode_uri(text.replace(" ", "_"), unsafe_re)
+    return _encode_uri(text.replace("~", "").translate(_URI_ENC_TABLE), unsafe_re)
+
+
+def _transcode_link_block(lines: List[str], decode: bool) -> List[str]:
+    # The cipher is per-character and URI escapes never span a newline, so a
+    # whole block of links goes through translate()/re.sub in one call. Only
+    # a decoded %0A can add a line break; such a block is redone line by line.
+    out = _transcode_link("\n".join(lines), decode, _URI_UNSAFE_BLOCK_RE).split("\n")
+    if len(out) != len(lines):
+        out = [_transcode_link(line, decode) for line in lines]
+    return out
+
+
+def _escape_line_breaks(line: str) -> str:
+    return line.replace("\r", "%0D").replace("\n", "%0A")
+
+
+def transcode_link_lines(
+    lines,
+    decode: bool = True,
+    block_lines: int = 65536,
+):
+    """
+    Streams share tokens (iterable of str, one per line) through the clsParam
+    codec. Lines are buffered into blocks of `block_lines` and each block is
+    transcoded in a single pass. Yields one output line per input line,
+    without the trailing newline; a decoded line break stays inside its item.
+
+    Unlike decode_shared_link this doesn't cut a URL path prefix or a '#...'
+    fragment; feed it bare tokens.
+    """
+    buf: List[str] = []
+    for line in lines:
+        buf.append(line.rstrip("\r\n"))
+        if len(buf) >= block_lines:
+            yield from _transcode_link_block(buf, decode)
+            buf.clear()
+    if buf:
+        yield from _transcode_link_block(buf, decode)
+
+
+def transcode_link_file(
+    in_path: str,
+    out_path: str,
+    decode: bool = True,
+    block_bytes: int = 1 << 22,
+) -> int:
+    """
+    Decodes (or encodes) a whole log file of share tokens, one per line,
+    reading ~block_bytes of complete lines at a time. Returns the line count.
+    Decoded line breaks are written back as %0A / %0D, so output line i
+    always belongs to input line i.
+    """
+    count = 0
+    with open(in_path, "r", encoding="utf-8") as fin, \
+            open(out_path, "w", encoding="utf-8") as fout:
+        while True:
+            lines = fin.readlines(block_bytes)
+            if not lines:
+                break
+            count += len(lines)
+            out = _transcode_link_block([line.rstrip("\r\n") for line in lines], decode)
+            fout.write("\n".join(_escape_line_breaks(line) for line in out))
+            fout.write("\n")
+    return count
+
+
+# ----------------------------
+# Port of clsDot (from common_0.js) + bulk dot-matrix codec
+# ----------------------------
+
+# fnNum2Alphabet / fnAlphabet2Num: 6-bit value <-> one character
+_DOT_ALPHABET = "0123456789abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ-_"
+_DOT_ALPHABET_BYTES = np.frombuffer(_DOT_ALPHABET.encode("ascii"), dtype=np.uint8)
+
+
+def _build_dot_bit_table() -> np.ndarray:
+    # byte -> its 6 bits MSB first, as the top bits of a uint8 (ready for unpackbits);
+    # like fnAlphabet2Num, anything outside the alphabet reads as 0
+    table = np.zeros(256, dtype=np.uint8)
+    table[_DOT_ALPHABET_BYTES] = np.arange(64, dtype=np.uint8) << 2
+    return table
+
+
+_DOT_BIT_TABLE = _build_dot_bit_table()
+_DOT_BIT_WEIGHTS = np.array([32, 16, 8, 4, 2, 1], dtype=np.uint8)
+
+
+class Dot:
+    @staticmethod
+    def num2alphabet(n: int) -> str:
+        # Port of clsDot.fnNum2Alphabet (out of range -> String.fromCharCode(0))
+        return _DOT_ALPHABET[n] if 0 <= n <= 63 else "\x00"
+
+    @staticmethod
+    def alphabet2num(s: str, i: int) -> int:
+        # Port of clsDot.fnAlphabet2Num
+        k = _DOT_ALPHABET.find(s[i]) if i < len(s) else -1
+        return max(k, 0)
+
+    @staticmethod
+    def code2bit(code: str) -> str:
+        # Port of clsDot.fnCode2Bit: 6 bits per character, MSB first
+        return "".join(format(Dot.alphabet2num(code, i), "06b") for i in range(len(code)))
+
+    @staticmethod
+    def bit2code(bits: str) -> str:
+        # Port of clsDot.fnBit2Code: zero-pad to a multiple of 6, then 6 bits per character
+        if len(bits) % 6:
+            bits += "0" * (6 - len(bits) % 6)
+        out = []
+        for i in range(0, len(bits), 6):
+            # parseInt(x, 2) reads the leading binary digits; none -> NaN -> "\x00"
+            digits = re.match(r"[01]*", bits[i:i + 6]).group(0)
+            out.append(Dot.num2alphabet(int(digits, 2) if digits else -1))
+        return "".join(out)
+
+    @staticmethod
+    def bit2xy(bits: str, n_x: int, n_y: int) -> Tuple[List[int], List[int]]:
+        # Port of clsDot.fnBit2XY: bit f of the first n_x * n_y is dot (f // n_y, f % n_y)
+        bits = bits[: n_x * n_y]
+        ai_x = [f // n_y for f, c in enumerate(bits) if c == "1"]
+        ai_y = [f % n_y for f, c in enumerate(bits) if c == "1"]
+        return ai_x, ai_y
+
+
+def _dot_code_matrix(codes: List[str], width: int) -> np.ndarray:
+    # (N, width) uint8 character matrix: codes cut / padded with "0" (value 0) to width characters
+    if not codes:
+        return np.zeros((0, width), dtype=np.uint8)
+    # one byte per character so offsets line up with JS string indices
+    raw = np.frombuffer("".join(codes).encode("ascii", "replace"), dtype=np.uint8)
+    if len(raw) == 0:
+        return np.full((len(codes), width), ord("0"), dtype=np.uint8)
+    lens = np.fromiter(map(len, codes), dtype=np.intp, count=len(codes))
+    starts = np.cumsum(lens) - lens
+    col = np.arange(width)
+    valid = col < lens[:, None]
+    idx = np.where(valid, starts[:, None] + col, 0)
+    return np.where(valid, raw[idx], ord("0")).astype(np.uint8)
+
+
+def dot_codes_to_bits(codes: Iterable[str], n_bits: int) -> np.ndarray:
+    """
+    Bulk clsDot.fnCode2Bit: decodes share codes into an (N, n_bits) uint8 bit
+    matrix (0/1). Each code is cut to n_bits like fnBit2XY does; short codes
+    read as zero-padded. One table lookup per character, then unpackbits.
+    """
+    codes = list(codes)
+    width = -(-n_bits // 6)
+    chars = _dot_code_matrix(codes, width)
+    bits = np.unpackbits(_DOT_BIT_TABLE[chars][..., None], axis=-1)[..., :6]
+    return bits.reshape(len(codes), width * 6)[:, :n_bits]
+
+
+def decode_dot_codes(
+    codes: Iterable[str],
+    n_x: int,
+    n_y: int,
+    chunk_size: int = 8192,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Bulk fnCode2Bit + fnBit2XY over many codes. Returns (offsets, xs, ys):
+    the dots of code i are xs[offsets[i]:offsets[i + 1]] (and ys, int32), in
+    the same order fnBit2XY lists them. Codes are expanded chunk_size at a
+    time so the bit matrix and nonzero() scratch stay small.
+    """
+    codes = list(codes)
+    n_bits = n_x * n_y
+    # bit index -> (x, y) by table lookup; much cheaper than divmod over every dot
+    x_of, y_of = (t.astype(np.int32) for t in np.divmod(np.arange(n_bits), n_y))
+    offsets = np.zeros(len(codes) + 1, dtype=np.intp)
+    chunks = []
+    for start in range(0, len(codes), chunk_size):
+        bits = dot_codes_to_bits(codes[start:start + chunk_size], n_bits).view(bool)
+        np.cumsum(np.count_nonzero(bits, axis=1), out=offsets[start + 1:start + 1 + len(bits)])
+        offsets[start + 1:start + 1 + len(bits)] += offsets[start]
+        chunks.append(bits)
+    xs = np.empty(offsets[-1], dtype=np.int32)
+    ys = np.empty(offsets[-1], dtype=np.int32)
+    for k, bits in enumerate(chunks):
+        _, f = np.nonzero(bits)
+        lo = offsets[k * chunk_size]
+        xs[lo:lo + len(f)] = x_of[f]
+        ys[lo:lo + len(f)] = y_of[f]
+    return offsets, xs, ys
+
+
+def dot_bits_to_codes(bits: np.ndarray) -> List[str]:
+    """
+    Bulk clsDot.fnBit2Code: (N, n_bits) 0/1 matrix -> N codes of
+    ceil(n_bits / 6) characters each.
+    """
+    bits = np.asarray(bits, dtype=np.uint8)
+    n, n_bits = bits.shape
+    width = -(-n_bits // 6)
+    padded = np.zeros((n, width * 6), dtype=np.uint8)
+    padded[:, :n_bits] = bits != 0
+    chars = _DOT_ALPHABET_BYTES[padded.reshape(n, width, 6) @ _DOT_BIT_WEIGHTS]
+    text = chars.tobytes().decode("ascii")
+    return [text[i:i + width] for i in range(0, n * width, width)]
+
+
+def encode_dot_codes(
+    offsets: np.ndarray,
+    xs: np.ndarray,
+    ys: np.ndarray,
+    n_x: int,
+    n_y: int,
+    chunk_size: int = 8192,
+) -> List[str]:
+    # inverse of decode_dot_codes: dots back onto the n_x * n_y bit grid, then fnBit2Code
+    offsets = np.asarray(offsets, dtype=np.intp)
+    out: List[str] = []
+    for start in range(0, len(offsets) - 1, chunk_size):
+        rows = offsets[start:start + chunk_size + 1]
+        lo, hi = rows[0], rows[-1]
+        owner = np.repeat(np.arange(len(rows) - 1), np.diff(rows))
+        bits = np.zeros((len(rows) - 1, n_x * n_y), dtype=np.uint8)
+        bits[owner, np.asarray(xs[lo:hi], dtype=np.intp) * n_y + ys[lo:hi]] = 1
+        out.extend(dot_bits_to_codes(bits))
+    return out
+
+
+# ----------------------------
+# Streaming corpus statistics over txtCsv / share-link logs
+# ----------------------------
+
+class QuantileSketch:
+    """
+    Mergeable KLL-style quantile sketch. Level h holds items that stand for
+    2**h values each; a level over its capacity is sorted and every other
+    item (random offset) moves up a level. Memory stays around 3k items
+    whatever the stream length; rank error is about 2 / k.
+    """
+
+    def __init__(self, k: int = 256, seed: int = 0) -> None:
+        self.k = k
+        self.levels: List[np.ndarray] = [np.empty(0)]
+        self.count = 0
+        self.min = math.inf
+        self.max = -math.inf
+        self._rng = np.random.default_rng(seed)
+
+    def _capacity(self, h: int) -> int:
+        return max(8, int(math.ceil(self.k * (2.0 / 3.0) ** (len(self.levels) - 1 - h))))
+
+    def _compress(self) -> None:
+        h = 0
+        while h < len(self.levels):
+            items = self.levels[h]
+            if len(items) <= self._capacity(h):
+                h += 1
+                continue
+            items = np.sort(items)
+            # an odd item out stays on this level
+            keep = len(items) % 2
+            grew = h + 1 == len(self.levels)
+            if grew:
+                self.levels.append(np.empty(0))
+            self.levels[h + 1] = np.concatenate([self.levels[h + 1], items[keep + self._rng.integers(2)::2]])
+            self.levels[h] = items[:keep]
+            # a new top level shrinks every capacity below it
+            h = 0 if grew else h + 1
+
+    def update(self, values: np.ndarray) -> None:
+        values = np.asarray(values, dtype=np.float64).ravel()
+        if len(values) == 0:
+            return
+        self.count += len(values)
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+        self.levels[0] = np.concatenate([self.levels[0], values])
+        self._compress()
+
+    def merge(self, other: "QuantileSketch") -> None:
+        while len(self.levels) < len(other.levels):
+            self.levels.append(np.empty(0))
+        for h, items in enumerate(other.levels):
+            self.levels[h] = np.concatenate([self.levels[h], items])
+        self.count += other.count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self._compress()
+
+    def quantile(self, qs) -> np.ndarray:
+        # values at ranks qs * count (qs in [0, 1]); NaN while empty
+        qs = np.asarray(qs, dtype=np.float64)
+        if self.count == 0:
+            return np.full(qs.shape, np.nan)
+        items = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(l), 2.0 ** h) for h, l in enumerate(self.levels)])
+        order = np.argsort(items, kind="stable")
+        cum = np.cumsum(weights[order])
+        idx = np.minimum(np.searchsorted(cum, qs * cum[-1], side="left"), len(cum) - 1)
+        out = items[order][idx]
+        # the extremes are known exactly
+        out = np.where(qs <= 0.0, self.min, out)
+        return np.where(qs >= 1.0, self.max, out)
+
+
+class HeavyHitters:
+    """
+    Misra-Gries summary with at most k counters. Every key seen more than
+    total / (k + 1) times is kept, and its count is low by at most that much.
+    Summaries merge by adding counters and pruning back to k.
+    """
+
+    def __init__(self, k: int = 64) -> None:
+        self.k = k
+        self.counts: dict = {}
+        self.total = 0
+
+    def _add(self, counts: dict) -> None:
+        for key, c in counts.items():
+            self.counts[key] = self.counts.get(key, 0) + c
+        if len(self.counts) > self.k:
+            cut = sorted(self.counts.values(), reverse=True)[self.k]
+            self.counts = {key: c - cut for key, c in self.counts.items() if c > cut}
+
+    def update(self, counts: dict) -> None:
+        # counts: exact {key: count} of one batch
+        self.total += sum(counts.values())
+        self._add(counts)
+
+    def merge(self, other: "HeavyHitters") -> None:
+        self.total += other.total
+        self._add(other.counts)
+
+    def top(self, n: Optional[int] = None) -> List[Tuple[str, int]]:
+        return sorted(self.counts.items(), key=lambda kv: (-kv[1], kv[0]))[:n]
+
+
+CORPUS_STAT_PARAMS = ("p0", "p1", "p2", "p3", "p4", "p5", "p6")
+# histogram range per parameter; values outside land in the under / overflow bins
+CORPUS_STAT_RANGES = {
+    "p0": (0.0, 400.0),
+    "p1": (0.0, 400.0),
+    "p2": (-180.0, 180.0),
+    "p3": (-180.0, 180.0),
+    "p4": (-180.0, 180.0),
+    "p5": (0.0, 400.0),
+    "p6": (0.0, 400.0),
+}
+
+
+def is_test_mode(layers: List[LayerParams]) -> bool:
+    # main_u3d.js: 2+ layers and "test" in the last layer's q1 -> that layer is dropped,
+    # the rest animate with as = 1
+    return len(layers) >= 2 and "test" in layers[-1].q1
+
+
+@functools.lru_cache(maxsize=65536)
+def _line_stat_rows(line: str, seed: str, decode_links: bool) -> Tuple[bool, int, Tuple[Tuple[float, ...], ...], Tuple[str, ...]]:
+    # (test mode, layer count, p0..p6 per layer, lc per layer) of one log line; popular links repeat.
+    # Layer count -1: an encrypted link whose keys ran together (is_lossy_link_text)
+    if decode_links:
+        text = decode_shared_link(line)
+        if is_lossy_link_text(text, seed):
+            return False, -1, (), ()
+        layers = parse_txtcsv_layers(text, seed)
+    else:
+        layers = parse_txtcsv_layers(line, seed)
+    test = is_test_mode(layers)
+    if test:
+        layers = layers[:-1]
+    rows = tuple((lp.p0, lp.p1, lp.p2, lp.p3, lp.p4, lp.p5, lp.p6) for lp in layers)
+    return test, len(layers), rows, tuple(lp.lc.upper() for lp in layers)
+
+
+class CorpusStats:
+    """
+    Single-pass statistics over txtCsv (or share-link) lines, in bounded
+    memory: p0..p6 histograms (CORPUS_STAT_RANGES, bin_width wide, plus
+    under / overflow), QuantileSketch per parameter, HeavyHitters over lc,
+    layer-count histogram and the "test" mode count. Layers are counted as
+    the viewer shows them (test mode drops its last layer). Share links
+    that decrypt without their key separators (is_lossy_link_text) only add
+    to `undecodable`, not to the parameter statistics.
+
+    update() counts distinct lines per batch and parses each once (with an
+    LRU cache across batches), so repeated links cost a dict hit. Partial
+    states from other chunks or processes combine with merge().
+    """
+
+    MAX_LAYERS = 64  # layer_counts[MAX_LAYERS] counts everything longer
+
+    def __init__(self, bin_width: float = 1.0, sketch_k: int = 256, top_k: int = 64, sketch_seed: int = 0) -> None:
+        self.bin_width = bin_width
+        self.sketch_k = sketch_k
+        self.top_k = top_k
+        self.lines = 0
+        self.layers = 0
+        self.test_mode = 0
+        self.undecodable = 0
+        self.layer_counts = np.zeros(self.MAX_LAYERS + 1, dtype=np.int64)
+        self.hist = {
+            name: np.zeros(self._bins(name) + 2, dtype=np.int64) for name in CORPUS_STAT_PARAMS
+        }
+        self.sums = dict.fromkeys(CORPUS_STAT_PARAMS, 0.0)
+        self.sketches = {name: QuantileSketch(sketch_k, sketch_seed + i) for i, name in enumerate(CORPUS_STAT_PARAMS)}
+        self.colors = HeavyHitters(top_k)
+
+    def _bins(self, name: str) -> int:
+        lo, hi = CORPUS_STAT_RANGES[name]
+        return int(math.ceil((hi - lo) / self.bin_width))
+
+    def bin_edges(self, name: str) -> np.ndarray:
+        lo, _ = CORPUS_STAT_RANGES[name]
+        return lo + self.bin_width * np.arange(self._bins(name) + 1)
+
+    def update(
+        self,
+        lines: Iterable[str],
+        seed: str = "inkei.net",
+        decode_links: bool = False,
+        batch_lines: int = 65536,
+        errors: Optional[list] = None,
+    ) -> "CorpusStats":
+        """
+        Adds lines (txtCsv, or share tokens with decode_links=True). With an
+        errors list, undecodable links are reported as (line index in this
+        call, "undecodable_link").
+        """
+        batch: dict = {}
+        n = 0
+        for i, line in enumerate(lines):
+            line = line.rstrip("\r\n")
+            if errors is not None and decode_links and _line_stat_rows(line, seed, True)[1] < 0:
+                errors.append((i, "undecodable_link"))
+            batch[line] = batch.get(line, 0) + 1
+            n += 1
+            if n >= batch_lines:
+                self._add_batch(batch, seed, decode_links)
+                batch, n = {}, 0
+        if batch:
+            self._add_batch(batch, seed, decode_links)
+        return self
+
+    def _add_batch(self, batch: dict, seed: str, decode_links: bool) -> None:
+        rows: List[Tuple[float, ...]] = []
+        weights: List[int] = []
+        colors: dict = {}
+        for line, c in batch.items():
+            test, n_layers, line_rows, line_colors = _line_stat_rows(line, seed, decode_links)
+            self.lines += c
+            if n_layers < 0:
+                self.undecodable += c
+                continue
+            self.test_mode += c if test else 0
+            self.layers += c * n_layers
+            self.layer_counts[min(n_layers, self.MAX_LAYERS)] += c
+            rows.extend(line_rows)
+            weights.extend([c] * n_layers)
+            for lc in line_colors:
+                colors[lc] = colors.get(lc, 0) + c
+        self.colors.update(colors)
+        if not rows:
+            return
+        values = np.array(rows, dtype=np.float64)
+        w = np.array(weights, dtype=np.int64)
+        for j, name in enumerate(CORPUS_STAT_PARAMS):
+            v = values[:, j]
+            ok = np.isfinite(v)
+            v, wj = v[ok], w[ok]
+            lo, _ = CORPUS_STAT_RANGES[name]
+            bins = len(self.hist[name]) - 2
+            # bin 0 = underflow, bins + 1 = overflow
+            idx = np.clip(np.floor((v - lo) / self.bin_width), -1, bins).astype(np.intp) + 1
+            self.hist[name] += np.bincount(idx, weights=wj, minlength=bins + 2).astype(np.int64)
+            self.sums[name] += float(v @ wj)
+            self.sketches[name].update(np.repeat(v, wj))
+
+    def merge(self, other: "CorpusStats") -> "CorpusStats":
+        if other.bin_width != self.bin_width:
+            raise ValueError("Cannot merge CorpusStats with different bin widths")
+        self.lines += other.lines
+        self.layers += other.layers
+        self.test_mode += other.test_mode
+        self.undecodable += other.undecodable
+        self.layer_counts += other.layer_counts
+        for name in CORPUS_STAT_PARAMS:
+            self.hist[name] += other.hist[name]
+            self.sums[name] += other.sums[name]
+            self.sketches[name].merge(other.sketches[name])
+        self.colors.merge(other.colors)
+        return self
+
+    def summary(
+        self,
+        quantiles: Tuple[float, ...] = (0.01, 0.05, 0.25, 0.5, 0.75, 0.95, 0.99),
+        top: int = 20,
+    ) -> dict:
+        params = {}
+        for name in CORPUS_STAT_PARAMS:
+            sk = self.sketches[name]
+            params[name] = {
+                "count": sk.count,
+                "mean": self.sums[name] / sk.count if sk.count else math.nan,
+                "min": sk.min if sk.count else math.nan,
+                "max": sk.max if sk.count else math.nan,
+                "quantiles": dict(zip(quantiles, sk.quantile(quantiles).tolist())),
+                "underflow": int(self.hist[name][0]),
+                "overflow": int(self.hist[name][-1]),
+            }
+        nz = np.flatnonzero(self.layer_counts)
+        return {
+            "lines": self.lines,
+            "layers": self.layers,
+            "test_mode": self.test_mode,
+            "undecodable": self.undecodable,
+            "layer_counts": {int(i): int(self.layer_counts[i]) for i in nz},
+            "params": params,
+            "colors": self.colors.top(top),
+        }
+
+
+def _iter_line_range(path: str, start: int, end: int) -> Iterator[str]:
+    # lines of a file whose first byte lies in [start, end)
+    with open(path, "rb") as f:
+        pos = start
+        if start > 0:
+            # finish the line that straddles start; it belongs to the previous range
+            f.seek(start - 1)
+            pos = start - 1 + len(f.readline())
+        while pos < end:
+            line = f.readline()
+            if not line:
+                break
+            pos += len(line)
+            yield line.decode("utf-8", "replace")
+
+
+def _corpus_stats_job(job: Tuple[str, int, int, str, bool, int, dict]) -> CorpusStats:
+    path, start, end, seed, decode_links, batch_lines, stats_kwargs = job
+    stats = CorpusStats(**{"sketch_seed": start, **stats_kwargs})
+    return stats.update(_iter_line_range(path, start, end), seed, decode_links, batch_lines)
+
+
+def corpus_stats_file(
+    path: str,
+    processes: Optional[int] = None,
+    chunk_bytes: int = 1 << 26,
+    batch_lines: int = 65536,
+    seed: str = "inkei.net",
+    decode_links: bool = False,
+    **stats_kwargs,
+) -> CorpusStats:
+    """
+    CorpusStats of a log file, one txtCsv (or share token) per line. The file
+    is cut into ~chunk_bytes ranges on line boundaries; each range is read
+    and aggregated by a pool process and the partial states merged here as
+    they come back, so memory does not grow with the file.
+    """
+    size = os.path.getsize(path)
+    jobs = [
+        (path, start, min(size, start + chunk_bytes), seed, decode_links, batch_lines, stats_kwargs)
+        for start in range(0, size, chunk_bytes)
+    ]
+    total = CorpusStats(**stats_kwargs)
+    if processes == 1 or len(jobs) <= 1:
+        for job in jobs:
+            total.merge(_corpus_stats_job(job))
+        return total
+    with multiprocessing.Pool(processes) as pool:
+        for part in pool.imap_unordered(_corpus_stats_job, jobs):
+            total.merge(part)
+    return total
+
+
+# ----------------------------
+# Geometric metrics (volume / area / length / bounds) from the bezier profile
+# ----------------------------
+
+# conv_xy_to_xyz_of_cylinder3d pairs profile point t with 24 - t, 4 cubic
+# segments per side: (0..3, 3..6, 6..9, 9..12) vs (24..21, ..., 15..12).
+_PROFILE_LEFT_IDX = np.array([[3 * k + j for j in range(4)] for k in range(4)])
+_PROFILE_RIGHT_IDX = 24 - _PROFILE_LEFT_IDX
+
+
+@functools.lru_cache(maxsize=None)
+def _gauss_legendre_01(order: int, pieces: int = 1) -> Tuple[np.ndarray, np.ndarray]:
+    # composite Gauss-Legendre nodes/weights on [0, 1]
+    x, w = np.polynomial.legendre.leggauss(order)
+    k = np.arange(pieces)[:, None]
+    return ((k + 0.5 * (x + 1.0)) / pieces).ravel(), np.tile(0.5 * w / pieces, pieces)
+
+
+@dataclass(frozen=True)
+class ShapeMetrics:
+    # All arrays are (N,) except bbox_min/bbox_max (N, 3). Units follow the
+    # profile (mm); axes are the profile frame: x along the shaft, y up,
+    # z depth (Path3D swaps x and z).
+    volume: np.ndarray
+    surface_area: np.ndarray  # lateral surface, base disc excluded
+    base_area: np.ndarray     # disc closing the base ring
+    spine_length: np.ndarray  # arc length of the revolve axis, base -> tip
+    bbox_min: np.ndarray
+    bbox_max: np.ndarray
+
+
+def _cubic_extrema_bounds(ctrl: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    # ctrl (..., 4) -> exact min/max of the cubic over u in [0, 1]
+    p0, p1, p2, p3 = ctrl[..., 0], ctrl[..., 1], ctrl[..., 2], ctrl[..., 3]
+    # B'(u)/3 = a u^2 + b u + c
+    a = -p0 + 3 * p1 - 3 * p2 + p3
+    b = 2 * (p0 - 2 * p1 + p2)
+    c = p1 - p0
+    lo = np.minimum(p0, p3)
+    hi = np.maximum(p0, p3)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        disc = np.sqrt(np.maximum(b * b - 4 * a * c, 0.0))
+        quad = np.abs(a) > 1e-12
+        cands = [
+            np.where(quad, (-b + disc) / (2 * a), -c / b),
+            np.where(quad, (-b - disc) / (2 * a), np.nan),
+        ]
+    for u in cands:
+        ok = np.isfinite(u) & (u > 0) & (u < 1)
+        u = np.where(ok, u, 0.0)
+        mu = 1.0 - u
+        v = mu ** 3 * p0 + 3 * u * mu ** 2 * p1 + 3 * u ** 2 * mu * p2 + u ** 3 * p3
+        lo = np.where(ok, np.minimum(lo, v), lo)
+        hi = np.where(ok, np.maximum(hi, v), hi)
+    return lo, hi
+
+
+def profile_metrics_batch(
+    xs: np.ndarray,
+    ys: np.ndarray,
+    order: int = 8,
+    pieces: int = 1,
+    theta_steps: int = 16,
+    radius_samples: int = 16,
+    chunk_size: int = 8192,
+) -> ShapeMetrics:
+    """
+    Physical quantities of the surface conv_xy_to_xyz_of_cylinder3d revolves
+    from 25-point profiles (xs, ys of shape (N, 25), e.g. get_path_batch).
+
+    The surface is P(u, a) = (M + sin(a) V, cos(a) |V|) with M/V the mid point
+    and half difference of the paired left/right cubics. Integrals over u use
+    `order`-point Gauss-Legendre on `pieces` sub-intervals per cubic segment;
+    the angle is integrated analytically for the volume and with the periodic
+    trapezoid rule (`theta_steps`) for the area. Raise `pieces` for shapes
+    whose axis doubles back (|M'| -> 0 makes the length/area integrands kink).
+    Rows are processed `chunk_size` at a time to bound the temporaries.
+    """
+    xs = np.atleast_2d(np.asarray(xs, dtype=np.float64))
+    ys = np.atleast_2d(np.asarray(ys, dtype=np.float64))
+    parts = [
+        _profile_metrics_chunk(xs[i:i + chunk_size], ys[i:i + chunk_size], order, pieces, theta_steps, radius_samples)
+        for i in range(0, xs.shape[0], chunk_size)
+    ]
+    if len(parts) == 1:
+        return parts[0]
+    return ShapeMetrics(*(
+        np.concatenate([getattr(p, f) for p in parts])
+        for f in ("volume", "surface_area", "base_area", "spine_length", "bbox_min", "bbox_max")
+    ))
+
+
+def _profile_metrics_chunk(
+    xs: np.ndarray,
+    ys: np.ndarray,
+    order: int,
+    pieces: int,
+    theta_steps: int,
+    radius_samples: int,
+) -> ShapeMetrics:
+    n = xs.shape[0]
+
+    # (N, 4 segments, 4 control points, 2)
+    left = np.stack([xs[:, _PROFILE_LEFT_IDX], ys[:, _PROFILE_LEFT_IDX]], axis=-1)
+    right = np.stack([xs[:, _PROFILE_RIGHT_IDX], ys[:, _PROFILE_RIGHT_IDX]], axis=-1)
+    mid = 0.5 * (left + right)
+    half = 0.5 * (right - left)
+
+    u, w = _gauss_legendre_01(order, pieces)
+    b, d1, _ = _bernstein(u)
+    # (N, seg, q, 2)
+    m_d = np.einsum("qk,nskc->nsqc", d1, mid)
+    v = np.einsum("qk,nskc->nsqc", b, half)
+    v_d = np.einsum("qk,nskc->nsqc", d1, half)
+    r = np.hypot(v[..., 0], v[..., 1])
+    with np.errstate(divide="ignore", invalid="ignore"):
+        r_d = np.where(r > 0, (v[..., 0] * v_d[..., 0] + v[..., 1] * v_d[..., 1]) / r, 0.0)
+
+    # Volume via div(0, 0, z): the base cap's normal has no z part, so only the
+    # tube contributes, and the angular integral of z * n_z is pi * r * (M' x V).
+    cross_mv = m_d[..., 0] * v[..., 1] - m_d[..., 1] * v[..., 0]
+    volume = np.abs(np.pi * np.einsum("nsq,q->n", r * cross_mv, w))
+
+    spine_length = np.einsum("nsq,q->n", np.hypot(m_d[..., 0], m_d[..., 1]), w)
+
+    # |P_u x P_a| over a periodic angle grid
+    ang = np.arange(theta_steps) * (2.0 * np.pi / theta_steps)
+    sa = np.sin(ang)[None, None, None, :]
+    ca = np.cos(ang)[None, None, None, :]
+    mdx, mdy = m_d[..., 0, None], m_d[..., 1, None]
+    vx, vy = v[..., 0, None], v[..., 1, None]
+    vdx, vdy = v_d[..., 0, None], v_d[..., 1, None]
+    rr, rrd = r[..., None], r_d[..., None]
+    nx = -sa * rr * mdy - sa * sa * rr * vdy - ca * ca * rrd * vy
+    ny = ca * ca * rrd * vx + sa * rr * mdx + sa * sa * rr * vdx
+    nz = ca * ((mdx + sa * vdx) * vy - (mdy + sa * vdy) * vx)
+    dens = np.sqrt(nx * nx + ny * ny + nz * nz).mean(axis=-1) * (2.0 * np.pi)
+    surface_area = np.einsum("nsq,q->n", dens, w)
+
+    r0 = np.hypot(half[:, 0, 0, 0], half[:, 0, 0, 1])
+    base_area = np.pi * r0 * r0
+
+    # x/y bounds: the extreme angles (sin = +-1) are exactly the left/right
+    # cubics, so the exact cubic extrema of both sides give the xy box.
+    both = np.concatenate([left, right], axis=1)
+    lo_x, hi_x = _cubic_extrema_bounds(both[..., 0])
+    lo_y, hi_y = _cubic_extrema_bounds(both[..., 1])
+
+    # z bound is max |V(u)|: sample, then polish with Newton on V . V' = 0
+    us = np.linspace(0.0, 1.0, radius_samples + 1)
+    bs, _, _ = _bernstein(us)
+    rs = np.hypot(*np.moveaxis(np.einsum("qk,nskc->nsqc", bs, half), -1, 0))
+    best = us[np.argmax(rs, axis=-1)]  # (N, seg)
+    for _ in range(4):
+        bb, bd1, bd2 = _bernstein(best.ravel())
+        bb = bb.reshape(n, 4, 4)
+        bd1 = bd1.reshape(n, 4, 4)
+        bd2 = bd2.reshape(n, 4, 4)
+        vv = np.einsum("nsk,nskc->nsc", bb, half)
+        vd = np.einsum("nsk,nskc->nsc", bd1, half)
+        vdd = np.einsum("nsk,nskc->nsc", bd2, half)
+        g = (vv * vd).sum(-1)
+        gd = (vd * vd).sum(-1) + (vv * vdd).sum(-1)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            step = np.where(gd < 0, g / gd, 0.0)
+        best = np.clip(best - step, 0.0, 1.0)
+    bb, _, _ = _bernstein(best.ravel())
+    vv = np.einsum("nsk,nskc->nsc", bb.reshape(n, 4, 4), half)
+    r_max = np.maximum(np.hypot(vv[..., 0], vv[..., 1]).max(axis=1), rs.max(axis=(1, 2)))
+
+    return ShapeMetrics(
+        volume=volume,
+        surface_area=surface_area,
+        base_area=base_area,
+        spine_length=spine_length,
+        bbox_min=np.stack([lo_x.min(axis=1), lo_y.min(axis=1), -r_max], axis=1),
+        bbox_max=np.stack([hi_x.max(axis=1), hi_y.max(axis=1), r_max], axis=1),
+    )
+
+
+def profile_metrics(shape: Path2D, **kwargs) -> ShapeMetrics:
+    return profile_metrics_batch(np.asarray([shape.x]), np.asarray([shape.y]), **kwargs)
+
+
+def _layers_to_p_array(layers: List[LayerParams]) -> np.ndarray:
+    # p0..p6 of each layer as (N, 7) float64 (p7..p9 don't change the shape)
+    return np.array(
+        [[lp.p0, lp.p1, lp.p2, lp.p3, lp.p4, lp.p5, lp.p6] for lp in layers],
+        dtype=np.float64,
+    ).reshape(-1, 7)
+
+
+def layer_metrics_batch(layers: List[LayerParams], errors: Optional[list] = None, **kwargs) -> ShapeMetrics:
+    # dropped rows (get_path_checked) come back as NaN; errors gets the per-row report
+    xs, ys, flags = get_path_checked(_layers_to_p_array(layers))
+    if errors is not None:
+        errors.extend(param_errors(flags))
+    m = profile_metrics_batch(xs, ys, **kwargs)
+    drop = (flags & PARAM_DROP) != 0
+    if drop.any():
+        for name in ("volume", "surface_area", "base_area", "spine_length", "bbox_min", "bbox_max"):
+            getattr(m, name)[drop] = np.nan
+    return m
+
+
+# ----------------------------
+# Triangle mesh export (binary STL / OBJ / binary glTF) of the revolved surface
+# ----------------------------
+
+@dataclass(frozen=True)
+class Mesh:
+    vertices: np.ndarray  # (V, 3) float32, Path3D axes (x/z swapped like the JS)
+    indices: np.ndarray   # (T, 3) uint32, counter-clockwise seen from outside
+
+
+@functools.lru_cache(maxsize=32)
+def _revolve_topology(rings: int, slices: int) -> np.ndarray:
+    # Vertex layout: rings * slices ring vertices, then the tip, then the base
+    # center. The tip ring always collapses: both profile sides end at RINKO.
+    tip = rings * slices
+    base = tip + 1
+    k = np.arange(rings - 1)[:, None]
+    j = np.arange(slices)[None, :]
+    a = k * slices + j
+    b = k * slices + (j + 1) % slices
+    c = a + slices
+    d = b + slices
+    tris = [
+        np.stack([a, c, b], axis=-1).reshape(-1, 3),
+        np.stack([b, c, d], axis=-1).reshape(-1, 3),
+    ]
+    last = (rings - 1) * slices
+    jj = np.arange(slices)
+    tris.append(np.stack([last + jj, np.full(slices, tip), last + (jj + 1) % slices], axis=-1))
+    tris.append(np.stack([np.full(slices, base), jj, (jj + 1) % slices], axis=-1))
+    # the X<->Z swap mirrors the surface, so flip winding to face outward
+    out = np.ascontiguousarray(np.concatenate(tris)[:, ::-1], dtype=np.uint32)
+    out.setflags(write=False)
+    return out
+
+
+def revolve_vertices_batch(
+    xs: np.ndarray,
+    ys: np.ndarray,
+    rings_per_segment: int = 8,
+    slices: int = 32,
+) -> np.ndarray:
+    """
+    Samples the revolved surface of 25-point profiles (xs, ys (N, 25)) on a
+    (4 * rings_per_segment) x slices grid, same construction and angle origin
+    as conv_xy_to_xyz_of_cylinder3d. Returns float32 (N, V, 3) in the vertex
+    layout of _revolve_topology.
+    """
+    xs = np.atleast_2d(np.asarray(xs, dtype=np.float64))
+    ys = np.atleast_2d(np.asarray(ys, dtype=np.float64))
+    n = xs.shape[0]
+    left = np.stack([xs[:, _PROFILE_LEFT_IDX], ys[:, _PROFILE_LEFT_IDX]], axis=-1)
+    right = np.stack([xs[:, _PROFILE_RIGHT_IDX], ys[:, _PROFILE_RIGHT_IDX]], axis=-1)
+
+    u = np.arange(rings_per_segment) / rings_per_segment
+    b, _, _ = _bernstein(u)
+    lp = np.einsum("qk,nskc->nsqc", b, left).reshape(n, -1, 2)
+    rp = np.einsum("qk,nskc->nsqc", b, right).reshape(n, -1, 2)
+    mid = 0.5 * (lp + rp)
+    half = 0.5 * (rp - lp)
+    rad = np.hypot(half[..., 0], half[..., 1])
+
+    ang = np.radians(270.0 + np.arange(slices) * (360.0 / slices))
+    sa = np.sin(ang)[None, None, :]
+    ca = np.cos(ang)[None, None, :]
+    rings = mid.shape[1]
+    out = np.empty((n, rings * slices + 2, 3), dtype=np.float32)
+    ring = out[:, :rings * slices].reshape(n, rings, slices, 3)
+    # swap X<->Z like the JS
+    ring[..., 0] = ca * rad[..., None]
+    ring[..., 1] = mid[..., 1, None] + sa * half[..., 1, None]
+    ring[..., 2] = mid[..., 0, None] + sa * half[..., 0, None]
+    out[:, -2] = np.stack([np.zeros(n), ys[:, ShapeInkei.I_RINKO], xs[:, ShapeInkei.I_RINKO]], axis=1)
+    out[:, -1] = np.stack([np.zeros(n), mid[:, 0, 1], mid[:, 0, 0]], axis=1)
+    return out
+
+
+def revolve_mesh(shape: Path2D, rings_per_segment: int = 8, slices: int = 32) -> Mesh:
+    verts = revolve_vertices_batch(np.asarray([shape.x]), np.asarray([shape.y]), rings_per_segment, slices)[0]
+    return Mesh(verts, _revolve_topology(4 * rings_per_segment, slices))
+
+
+_STL_DTYPE = np.dtype([("normal", "<f4", 3), ("v", "<f4", (3, 3)), ("attr", "<u2")])
+MESH_WRITE_ROWS = 65536  # vertices / triangles packed or formatted per write
+
+
+def _write_stl(fh, vertices: np.ndarray, indices: np.ndarray) -> None:
+    fh.write(b"inkei revolve mesh".ljust(80, b" "))
+    fh.write(np.uint32(len(indices)).tobytes())
+    for st in range(0, len(indices), MESH_WRITE_ROWS):
+        tri = vertices[indices[st:st + MESH_WRITE_ROWS]]
+        nrm = np.cross(tri[:, 1] - tri[:, 0], tri[:, 2] - tri[:, 0])
+        ln = np.linalg.norm(nrm, axis=1, keepdims=True)
+        np.divide(nrm, ln, out=nrm, where=ln > 0)
+        rec = np.zeros(len(tri), dtype=_STL_DTYPE)
+        rec["normal"] = nrm
+        rec["v"] = tri
+        fh.write(rec.tobytes())
+
+
+def _write_obj(fh, vertices: np.ndarray, indices: np.ndarray) -> None:
+    # formatted MESH_WRITE_ROWS lines at a time, so memory stays bounded by the chunk
+    for st in range(0, len(vertices), MESH_WRITE_ROWS):
+        chunk = vertices[st:st + MESH_WRITE_ROWS]
+        fh.write((("v %.6f %.6f %.6f\n" * len(chunk)) % tuple(chunk.ravel().tolist())).encode("ascii"))
+    for st in range(0, len(indices), MESH_WRITE_ROWS):
+        chunk = indices[st:st + MESH_WRITE_ROWS].astype(np.int64) + 1
+        fh.write((("f %d %d %d\n" * len(chunk)) % tuple(chunk.ravel().tolist())).encode("ascii"))
+
+
+def _write_glb(fh, vertices: np.ndarray, indices: np.ndarray) -> None:
+    pos = np.ascontiguousarray(vertices, dtype="<f4").tobytes()
+    idx = np.ascontiguousarray(indices, dtype="<u4").tobytes()
+    gltf = {
+        "asset": {"version": "2.0", "generator": "inkei revolve mesh"},
+        "scene": 0,
+        "scenes": [{"nodes": [0]}],
+        "nodes": [{"mesh": 0}],
+        "meshes": [{"primitives": [{"attributes": {"POSITION": 0}, "indices": 1, "mode": 4}]}],
+        "buffers": [{"byteLength": len(pos) + len(idx)}],
+        "bufferViews": [
+            {"buffer": 0, "byteOffset": 0, "byteLength": len(pos), "target": 34962},
+            {"buffer": 0, "byteOffset": len(pos), "byteLength": len(idx), "target": 34963},
+        ],
+        "accessors": [
+            {
+                "bufferView": 0, "componentType": 5126, "count": len(vertices), "type": "VEC3",
+                "min": vertices.min(axis=0).tolist(), "max": vertices.max(axis=0).tolist(),
+            },
+            {"bufferView": 1, "componentType": 5125, "count": indices.size, "type": "SCALAR"},
+        ],
+    }
+    js = json.dumps(gltf, separators=(",", ":")).encode("utf-8")
+    js += b" " * (-len(js) % 4)
+    total = 12 + 8 + len(js) + 8 + len(pos) + len(idx)
+    fh.write(np.array([0x46546C67, 2, total], dtype="<u4").tobytes())
+    fh.write(np.array([len(js), 0x4E4F534A], dtype="<u4").tobytes())
+    fh.write(js)
+    fh.write(np.array([len(pos) + len(idx), 0x004E4942], dtype="<u4").tobytes())
+    fh.write(pos)
+    fh.write(idx)
+
+
+_MESH_WRITERS = {"stl": _write_stl, "obj": _write_obj, "glb": _write_glb}
+
+
+def write_mesh(mesh: Mesh, out_path: str, fmt: Optional[str] = None) -> None:
+    fmt = (fmt or out_path.rsplit(".", 1)[-1]).lower()
+    if fmt not in _MESH_WRITERS:
+        raise ValueError(f"Unsupported mesh format: {fmt}")
+    with open(out_path, "wb") as fh:
+        _MESH_WRITERS[fmt](fh, mesh.vertices, mesh.indices)
+
+
+def export_meshes_from_layers(
+    layers: List[LayerParams],
+    out_pattern: str,
+    fmt: str = "stl",
+    rings_per_segment: int = 8,
+    slices: int = 32,
+    chunk_size: int = 1024,
+    errors: Optional[list] = None,
+) -> int:
+    """
+    Writes one mesh file per layer; out_pattern is formatted with the layer
+    index, e.g. "out/shape_{:06d}.stl". Profiles and vertices are built
+    chunk_size layers at a time with the shared topology. Returns the number
+    of triangles written. Degenerate layers (get_path_checked) are skipped
+    and reported to errors when given.
+    """
+    fmt = fmt.lower()
+    if fmt not in _MESH_WRITERS:
+        raise ValueError(f"Unsupported mesh format: {fmt}")
+    writer = _MESH_WRITERS[fmt]
+    indices = _revolve_topology(4 * rings_per_segment, slices)
+    written = 0
+    for st in range(0, len(layers), chunk_size):
+        chunk = layers[st:st + chunk_size]
+        xs, ys, flags = get_path_checked(_layers_to_p_array(chunk))
+        if errors is not None:
+            errors.extend(param_errors(flags, st))
+        verts = revolve_vertices_batch(xs, ys, rings_per_segment, slices)
+        for i in np.flatnonzero((flags & PARAM_DROP) == 0).tolist():
+            with open(out_pattern.format(st + i), "wb") as fh:
+                writer(fh, verts[i], indices)
+            written += len(indices)
+    return written
+
+
+# ----------------------------
+# Similarity index ("shapes like this one") over profile descriptors
+# ----------------------------
+
+def shape_descriptor_batch(
+    params: np.ndarray, scale_invariant: bool = False, errors: Optional[list] = None
+) -> np.ndarray:
+    """
+    (N, 7) p0..p6 -> (N, 50) descriptor: the get_path profile (x then y)
+    centered on its bounding-box center, optionally divided by its RMS radius.
+    Rows dropped by get_path_checked are NaN (reported to errors when given).
+    """
+    xs, ys, flags = get_path_checked(np.asarray(params, dtype=np.float64).reshape(-1, 7))
+    if errors is not None:
+        errors.extend(param_errors(flags))
+    d = _profile_descriptors(xs, ys, scale_invariant)
+    d[(flags & PARAM_DROP) != 0] = np.nan
+    return d
+
+
+def _profile_descriptors(xs: np.ndarray, ys: np.ndarray, scale_invariant: bool) -> np.ndarray:
+    xs = xs - 0.5 * (xs.min(axis=1, keepdims=True) + xs.max(axis=1, keepdims=True))
+    ys = ys - 0.5 * (ys.min(axis=1, keepdims=True) + ys.max(axis=1, keepdims=True))
+    d = np.concatenate([xs, ys], axis=1)
+    if scale_invariant:
+        rms = np.sqrt((d * d).mean(axis=1, keepdims=True))
+        d /= np.where(rms > 0, rms, 1.0)
+    return d
+
+
+class ShapeIndex:
+    """
+    Quantized flat k-NN index over shape descriptors.
+
+    Descriptors are projected on a PCA basis and stored as int8 codes next to
+    the float32 p0..p6 of each shape. A query scans the codes with one matrix
+    product per block, keeps `rerank` * k candidates and re-ranks them on exact
+    descriptors rebuilt from the stored parameters. Basis and quantizer are
+    refitted (and every code re-encoded) each time the index has doubled since
+    the last fit, until the fit has seen `fit_sample` rows; after that inserts
+    only append. Ids are row numbers, so refits never move them.
+    """
+
+    def __init__(
+        self, dims: int = 16, scale_invariant: bool = False, block_size: int = 65536, fit_sample: int = 20000
+    ):
+        self.dims = dims
+        self.scale_invariant = scale_invariant
+        self.block_size = block_size
+        self.fit_sample = fit_sample
+        self._mean: Optional[np.ndarray] = None
+        self._basis: Optional[np.ndarray] = None  # (50, dims)
+        self._step: Optional[np.ndarray] = None   # (dims,) quantizer step
+        self._fit_size = 0                        # rows stored at the last fit
+        self._codes = np.empty((0, dims), dtype=np.int8)
+        self._norms = np.empty(0, dtype=np.float32)  # sum(step^2 * code^2) per row
+        self._params = np.empty((0, 7), dtype=np.float32)
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _fit(self, desc: np.ndarray) -> None:
+        sample = desc[:: max(1, len(desc) // self.fit_sample)]
+        self._mean = sample.mean(axis=0)
+        _, _, vt = np.linalg.svd(sample - self._mean, full_matrices=False)
+        basis = np.zeros((desc.shape[1], self.dims))
+        k = min(self.dims, vt.shape[0])
+        basis[:, :k] = vt[:k].T
+        self._basis = basis
+        proj = (sample - self._mean) @ basis
+        # +-4 sigma per component maps onto the int8 range
+        self._step = np.maximum(4.0 * proj.std(axis=0), 1e-9) / 127.0
+
+    def _project(self, desc: np.ndarray) -> np.ndarray:
+        return (desc - self._mean) @ self._basis
+
+    def _encode(self, lo: int, desc: np.ndarray) -> None:
+        codes = np.clip(np.rint(self._project(desc) / self._step), -127, 127).astype(np.int8)
+        cf = codes.astype(np.float32)
+        self._codes[lo:lo + len(codes)] = codes
+        self._norms[lo:lo + len(codes)] = (cf * cf) @ (self._step ** 2).astype(np.float32)
+
+    def _refit(self) -> None:
+        # fit on a strided sample of every stored row, then re-encode them all
+        stride = max(1, self._size // self.fit_sample)
+        self._fit(shape_descriptor_batch(self._params[:self._size:stride], self.scale_invariant))
+        self._fit_size = self._size
+        for st in range(0, self._size, self.block_size):
+            ed = min(st + self.block_size, self._size)
+            self._encode(st, shape_descriptor_batch(self._params[st:ed], self.scale_invariant))
+
+    def _grow(self, extra: int) -> None:
+        need = self._size + extra
+        cap = len(self._codes)
+        if need <= cap:
+            return
+        cap = max(need, 2 * cap, 1024)
+        codes = np.empty((cap, self.dims), dtype=np.int8)
+        norms = np.empty(cap, dtype=np.float32)
+        params = np.empty((cap, 7), dtype=np.float32)
+        codes[:self._size] = self._codes[:self._size]
+        norms[:self._size] = self._norms[:self._size]
+        params[:self._size] = self._params[:self._size]
+        self._codes, self._norms, self._params = codes, norms, params
+
+    def add(self, params, errors: Optional[list] = None) -> np.ndarray:
+        """
+        Inserts (N, 7) p0..p6 rows (or LayerParams); returns their ids. Rows
+        dropped by get_path_checked get id -1 and are reported to errors
+        when given; pole rows are stored clamped.
+        """
+        if isinstance(params, list) and params and isinstance(params[0], LayerParams):
+            params = _layers_to_p_array(params)
+        params = np.asarray(params, dtype=np.float64).reshape(-1, 7)
+        ids = np.full(len(params), -1, dtype=np.int64)
+        for st in range(0, len(params), self.block_size):
+            chunk, flags = sanitize_params(params[st:st + self.block_size])
+            xs, ys = _checked_profiles(chunk, flags)
+            if errors is not None:
+                errors.extend(param_errors(flags, st))
+            keep = (flags & PARAM_DROP) == 0
+            chunk = chunk[keep]
+            if not len(chunk):
+                continue
+            desc = _profile_descriptors(xs[keep], ys[keep], self.scale_invariant)
+            self._grow(len(chunk))
+            lo = self._size
+            ids[st:st + len(keep)][keep] = np.arange(lo, lo + len(chunk))
+            self._params[lo:lo + len(chunk)] = chunk
+            self._size += len(chunk)
+            if self._fit_size < self.fit_sample and self._size >= 2 * self._fit_size:
+                self._refit()
+            else:
+                self._encode(lo, desc)
+        return ids
+
+    def _scan(self, qproj: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        # approximate squared distances on dequantized codes, without the
+        # per-query |q|^2 term (ranking only), best k per query
+        qs = (qproj * self._step).astype(np.float32)  # q . (step * code) == (q * step) . code
+        best_d = best_i = None
+        for st in range(0, self._size, self.block_size):
+            ed = min(st + self.block_size, self._size)
+            d = self._norms[st:ed] - 2.0 * (qs @ self._codes[st:ed].T.astype(np.float32))
+            idx = np.broadcast_to(np.arange(st, ed), d.shape)
+            if best_d is not None:
+                d = np.concatenate([best_d, d], axis=1)
+                idx = np.concatenate([best_i, idx], axis=1)
+            kk = min(k, d.shape[1])
+            sel = np.argpartition(d, kk - 1, axis=1)[:, :kk]
+            best_d = np.take_along_axis(d, sel, axis=1)
+            best_i = np.take_along_axis(idx, sel, axis=1)
+        return best_i, best_d
+
+    def _exact_rank(self, qdesc: np.ndarray, cand: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        # rebuild each distinct candidate's descriptor once for the whole batch
+        uniq, inv = np.unique(cand, return_inverse=True)
+        desc = shape_descriptor_batch(self._params[uniq], self.scale_invariant)[inv.reshape(cand.shape)]
+        d = np.sqrt(((desc - qdesc[:, None, :]) ** 2).sum(axis=-1))
+        order = np.argsort(d, axis=1)[:, :k]
+        return np.take_along_axis(cand, order, axis=1), np.take_along_axis(d, order, axis=1)
+
+    def search(
+        self, params, k: int = 20, rerank: int = 4, errors: Optional[list] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Batched k-NN. params is (Q, 7) or a list of LayerParams. Returns
+        (ids, distances), both (Q, k), nearest first; distances are Euclidean
+        between descriptors (mm unless scale_invariant). Queries dropped by
+        get_path_checked return ids -1 at distance inf.
+        """
+        if self._size == 0:
+            raise ValueError("ShapeIndex is empty")
+        if isinstance(params, list) and params and isinstance(params[0], LayerParams):
+            params = _layers_to_p_array(params)
+        params = np.asarray(params, dtype=np.float64).reshape(-1, 7)
+        k = min(k, self._size)
+        qdesc, drop = self._query_descriptors(params, errors)
+        cand, _ = self._scan(self._project(qdesc), min(self._size, k * max(1, rerank)))
+        ids, dist = self._exact_rank(qdesc, cand, k)
+        ids[drop], dist[drop] = -1, np.inf
+        return ids, dist
+
+    def _query_descriptors(self, params: np.ndarray, errors: Optional[list] = None) -> Tuple[np.ndarray, np.ndarray]:
+        # dropped query rows are searched as the mean shape, then blanked by the caller
+        qdesc = shape_descriptor_batch(params, self.scale_invariant, errors)
+        drop = np.isnan(qdesc).any(axis=1)
+        qdesc[drop] = self._mean
+        return qdesc, drop
+
+    def brute_force(self, params, k: int = 20) -> Tuple[np.ndarray, np.ndarray]:
+        # Exact search over every stored shape (reference for recall)
+        params = np.asarray(params, dtype=np.float64).reshape(-1, 7)
+        k = min(k, self._size)
+        qdesc, drop = self._query_descriptors(params)
+        best_i = np.empty((len(params), 0), dtype=np.int64)
+        best_d = np.empty((len(params), 0))
+        for st in range(0, self._size, self.block_size):
+            ed = min(st + self.block_size, self._size)
+            desc = shape_descriptor_batch(self._params[st:ed], self.scale_invariant)
+            d = np.sqrt(np.maximum(
+                (desc * desc).sum(1)[None, :] - 2.0 * qdesc @ desc.T + (qdesc * qdesc).sum(1)[:, None], 0.0
+            ))
+            d_all = np.concatenate([best_d, d], axis=1)
+            i_all = np.concatenate([best_i, np.broadcast_to(np.arange(st, ed), d.shape)], axis=1)
+            kk = min(k, d_all.shape[1])
+            sel = np.argpartition(d_all, kk - 1, axis=1)[:, :kk]
+            best_d = np.take_along_axis(d_all, sel, axis=1)
+            best_i = np.take_along_axis(i_all, sel, axis=1)
+        order = np.argsort(best_d, axis=1)
+        ids, dist = np.take_along_axis(best_i, order, axis=1), np.take_along_axis(best_d, order, axis=1)
+        ids[drop], dist[drop] = -1, np.inf
+        return ids, dist
+
+    def evaluate(self, params, k: int = 20, rerank: int = 4) -> dict:
+        """
+        Query latency and recall@k of search() against brute_force().
+        speedup < 1 means the quantized scan does not pay off at this size.
+        """
+        params = np.asarray(params, dtype=np.float64).reshape(-1, 7)
+        t0 = time.perf_counter()
+        ids, _ = self.search(params, k=k, rerank=rerank)
+        t1 = time.perf_counter()
+        ref, _ = self.brute_force(params, k=k)
+        t2 = time.perf_counter()
+        hits = sum(len(set(a.tolist()) & set(b.tolist())) for a, b in zip(ids, ref))
+        return {
+            "queries": len(params),
+            "k": k,
+            "recall": hits / float(ref.size) if ref.size else 1.0,
+            "search_ms_per_query": 1000.0 * (t1 - t0) / max(1, len(params)),
+            "brute_force_ms_per_query": 1000.0 * (t2 - t1) / max(1, len(params)),
+            "speedup": (t2 - t1) / max(t1 - t0, 1e-12),
+        }
+
+
+# ----------------------------
+# Geometry / projection kernels (numba JIT when installed, else NumPy / Python)
+# ----------------------------
+
+STROKE_MAX_COORD = 65536.0  # px; stroke pieces reaching beyond this are skipped
+
+
+def _project_loop(xyz, out, scale_a, stage_w, perspective_d, origin_x, origin_y,
+                  center_x, center_y, center_z, angle_x, angle_y, angle_z, morph_per, group):
+    # Morph.project_xy3d_only as flat loops over float64 arrays (numba-compilable)
+    n = xyz.shape[0]
+    buf = np.empty((n, 3))
+    for i in range(n):
+        buf[i, 0] = (xyz[i, 0] - center_x) * scale_a / stage_w
+        buf[i, 1] = (xyz[i, 1] - center_y) * scale_a / stage_w
+        buf[i, 2] = (xyz[i, 2] - center_z) * scale_a / stage_w
+    if morph_per < 0:
+        k = -morph_per
+        for i in range(n):
+            e = (i // group) * group + (group - 1)
+            if i != e and e < n:
+                for a in range(3):
+                    buf[i, a] = buf[e, a] + (buf[i, a] - buf[e, a]) * k
+    elif morph_per < 1:
+        for i in range(n):
+            b = (i // group) * group
+            if i != b:
+                for a in range(3):
+                    buf[i, a] = buf[b, a] + (buf[i, a] - buf[b, a]) * morph_per
+    for i in range(n):
+        t = buf[i, 0]
+        q = buf[i, 1]
+        u = buf[i, 2]
+        if angle_z % 360 != 0:
+            r = math.hypot(t, q)
+            rad = math.radians(math.degrees(math.atan2(q, t)) + angle_z)
+            t = math.cos(rad) * r
+            q = math.sin(rad) * r
+        if angle_x % 360 != 0:
+            r = math.hypot(q, u)
+            rad = math.radians(math.degrees(math.atan2(u, q)) + angle_x)
+            q = math.cos(rad) * r
+            u = math.sin(rad) * r
+        if angle_y % 360 != 0:
+            r = math.hypot(u, t)
+            rad = math.radians(math.degrees(math.atan2(t, u)) - angle_y)
+            u = math.cos(rad) * r
+            t = math.sin(rad) * r
+        per = (-u + perspective_d) / perspective_d
+        out[i, 0] = origin_x + t * per
+        out[i, 1] = origin_y + q * per
+
+
+def _revolve_grid_loop(lx, ly, rx, ry, slices, out):
+    # slice part of Morph.conv_xy_to_xyz_of_cylinder3d (X/Z already swapped)
+    m = lx.shape[0]
+    step_deg = 360.0 / slices
+    for i in range(slices):
+        ang = math.radians(270.0 + i * step_deg)
+        s = math.sin(ang)
+        c = math.cos(ang)
+        for t in range(m):
+            vx = 0.5 * (rx[t] - lx[t])
+            vy = 0.5 * (ry[t] - ly[t])
+            rad = math.sqrt(vx * vx + vy * vy)
+            k = i * m + t
+            out[k, 0] = c * rad * 1.0
+            out[k, 1] = ly[t] + 0.5 * (ry[t] - ly[t]) + s * vy
+            out[k, 2] = lx[t] + 0.5 * (rx[t] - lx[t]) + s * vx
+
+
+def _stroke_loop(segs, offsets, mask, value):
+    # (S, n, 2) polylines -> mask[y, x] = value on every pixel a stroke covers.
+    # Endpoints are truncated like ImageDraw; each piece is walked one pixel
+    # per major-axis step and the (K, 2) (dy, dx) width offsets stamped there.
+    h = mask.shape[0]
+    w = mask.shape[1]
+    for s in range(segs.shape[0]):
+        for j in range(segs.shape[1] - 1):
+            fx0 = segs[s, j, 0]
+            fy0 = segs[s, j, 1]
+            fx1 = segs[s, j + 1, 0]
+            fy1 = segs[s, j + 1, 1]
+            if not (abs(fx0) < STROKE_MAX_COORD and abs(fy0) < STROKE_MAX_COORD
+                    and abs(fx1) < STROKE_MAX_COORD and abs(fy1) < STROKE_MAX_COORD):
+                continue
+            x0 = math.floor(fx0)
+            y0 = math.floor(fy0)
+            dx = math.floor(fx1) - x0
+            dy = math.floor(fy1) - y0
+            n = max(abs(dx), abs(dy))
+            for k in range(n + 1):
+                t = k / n if n > 0 else 0.0
+                px = x0 + math.floor(dx * t + 0.5)
+                py = y0 + math.floor(dy * t + 0.5)
+                for o in range(offsets.shape[0]):
+                    y = py + offsets[o, 0]
+                    x = px + offsets[o, 1]
+                    if 0 <= y < h and 0 <= x < w:
+                        mask[y, x] = value
+
+
+def _stroke_numpy(segs, offsets, mask, value):
+    # _stroke_loop as whole-array operations (same pixels)
+    h, w = mask.shape
+    a = np.asarray(segs, dtype=np.float64)
+    p0 = a[:, :-1].reshape(-1, 2)
+    p1 = a[:, 1:].reshape(-1, 2)
+    ok = (np.abs(p0) < STROKE_MAX_COORD).all(axis=1) & (np.abs(p1) < STROKE_MAX_COORD).all(axis=1)
+    i0 = np.floor(p0[ok]).astype(np.int64)
+    d = np.floor(p1[ok]).astype(np.int64) - i0
+    n = np.abs(d).max(axis=1)
+    piece = np.repeat(np.arange(len(n)), n + 1)
+    k = np.arange(piece.size) - np.repeat(np.cumsum(n + 1) - (n + 1), n + 1)
+    nn = n[piece]
+    t = np.where(nn > 0, k / np.maximum(nn, 1), 0.0)
+    py = i0[piece, 1] + np.floor(d[piece, 1] * t + 0.5).astype(np.int64)
+    px = i0[piece, 0] + np.floor(d[piece, 0] * t + 0.5).astype(np.int64)
+    y = (py[:, None] + offsets[:, 0]).ravel()
+    x = (px[:, None] + offsets[:, 1]).ravel()
+    inside = (y >= 0) & (y < h) & (x >= 0) & (x < w)
+    mask[y[inside], x[inside]] = value
+
+
+@functools.lru_cache(maxsize=None)
+def _stroke_offsets(width: int) -> np.ndarray:
+    # (K, 2) (dy, dx) pixel offsets of a round pen `width` px across
+    c = (width - 1) / 2.0
+    o = np.arange(width)
+    oy, ox = np.meshgrid(o, o, indexing="ij")
+    keep = (oy - c) ** 2 + (ox - c) ** 2 <= (width / 2.0) ** 2
+    out = np.stack([oy[keep], ox[keep]], axis=1).astype(np.int64) - (width - 1) // 2
+    out.setflags(write=False)
+    return out
+
+
+def _profile_pairs(shape2d: Path2D) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    # left / right profile points paired like conv3d (iMainSt .. iMainEd)
+    return _profile_pairs_array(np.asarray(shape2d.x, dtype=np.float64), np.asarray(shape2d.y, dtype=np.float64))
+
+
+def _profile_pairs_array(x: np.ndarray, y: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    # same over (..., 25) profile arrays -> four (..., m) arrays
+    st, ed = ShapeInkei.iMainSt, ShapeInkei.iMainEd
+    idx = np.asarray([t + i2 for t in range(0, (ed - st) // 2, 3) for i2 in range(4)], dtype=np.intp)
+    return x[..., st + idx], y[..., st + idx], x[..., ed - idx], y[..., ed - idx]
+
+
+def _revolve_grid_arrays(lx, ly, rx, ry, slices: int) -> np.ndarray:
+    # (..., m) profile pairs -> (..., slices * m, 3) slice points
+    ang = np.radians(270.0 + np.arange(slices) * (360.0 / slices))[:, None]
+    s, c = np.sin(ang), np.cos(ang)
+    lx, ly, rx, ry = (a[..., None, :] for a in (lx, ly, rx, ry))
+    vx = 0.5 * (rx - lx)
+    vy = 0.5 * (ry - ly)
+    rad = np.sqrt(vx * vx + vy * vy)
+    out = np.empty(lx.shape[:-2] + (slices, lx.shape[-1], 3))
+    out[..., 0] = c * rad * 1.0
+    out[..., 1] = ly + 0.5 * (ry - ly) + s * vy
+    out[..., 2] = lx + 0.5 * (rx - lx) + s * vx
+    return out.reshape(lx.shape[:-2] + (-1, 3))
+
+
+def _revolve_grid_numpy(shape2d: Path2D, slices: int) -> np.ndarray:
+    return _revolve_grid_arrays(*_profile_pairs(shape2d), slices)
+
+
+def _revolve_grid_python(shape2d: Path2D, slices: int) -> np.ndarray:
+    half = (ShapeInkei.iMainEd - ShapeInkei.iMainSt) // 2
+    p3d = Morph.conv_xy_to_xyz_of_cylinder3d(
+        shape=shape2d,
+        start_idx=[ShapeInkei.iMainSt],
+        end_idx=[ShapeInkei.iMainEd],
+        slices=slices,
+        slice_mask=[],
+        segment_mask=[0] * (half + 1),  # no rings, slice curves only
+        radius_scale=[1.0],
+    )
+    return np.stack([p3d.x, p3d.y, p3d.z], axis=1)
+
+
+def _project_python(scale_a, xyz, stage_w, perspective_d, origin_x, origin_y,
+                    center_x, center_y, center_z, angle_x, angle_y, angle_z, morph_per, mode="l"):
+    xyz = np.asarray(xyz, dtype=np.float64)
+    p2d = Morph.project_xy3d_only(
+        scale_a, Path3D(xyz[:, 0].tolist(), xyz[:, 1].tolist(), xyz[:, 2].tolist()),
+        stage_w, perspective_d, origin_x, origin_y, center_x, center_y, center_z,
+        angle_x, angle_y, angle_z, morph_per, mode,
+    )
+    return np.stack([p2d.x, p2d.y], axis=1)
+
+
+@dataclass(frozen=True)
+class KernelSet:
+    # project: same arguments as Morph.project_xy3d_array -> (V, 2)
+    # revolve_grid: (shape2d, slices) -> (slices * m, 3) slice points of conv3d
+    # stroke: (segs, offsets, mask, value) rasterizes polylines into a uint8 mask
+    name: str
+    project: Callable[..., np.ndarray]
+    revolve_grid: Callable[[Path2D, int], np.ndarray]
+    stroke: Callable[[np.ndarray, np.ndarray, np.ndarray, int], None]
+
+
+@functools.lru_cache(maxsize=1)
+def _jit_kernels() -> KernelSet:
+    # built once per process; set_kernel_backend("numba") reuses the compiled kernels
+    jit = numba.njit(cache=True, nogil=True)  # render threads run the kernels concurrently
+    project_loop = jit(_project_loop)
+    revolve_loop = jit(_revolve_grid_loop)
+    stroke_loop = jit(_stroke_loop)
+
+    def project(scale_a, xyz, stage_w, perspective_d, origin_x, origin_y,
+                center_x, center_y, center_z, angle_x, angle_y, angle_z, morph_per, mode="l"):
+        xyz = np.ascontiguousarray(xyz, dtype=np.float64)
+        out = np.empty((len(xyz), 2))
+        project_loop(
+            xyz, out, float(scale_a), float(stage_w), float(perspective_d), float(origin_x), float(origin_y),
+            float(center_x), float(center_y), float(center_z), float(angle_x), float(angle_y), float(angle_z),
+            float(morph_per), 4 if mode == "c" else 2,
+        )
+        return out
+
+    def revolve_grid(shape2d, slices):
+        lx, ly, rx, ry = _profile_pairs(shape2d)
+        out = np.empty((slices * len(lx), 3))
+        revolve_loop(lx, ly, rx, ry, int(slices), out)
+        return out
+
+    def stroke(segs, offsets, mask, value):
+        stroke_loop(np.ascontiguousarray(segs, dtype=np.float64), offsets, mask, int(value))
+
+    return KernelSet("numba", project, revolve_grid, stroke)
+
+
+KERNEL_BACKENDS = ("numba", "numpy", "python")
+_kernels: Optional[KernelSet] = None
+
+
+def available_kernel_backends() -> List[str]:
+    return [b for b in KERNEL_BACKENDS if b != "numba" or numba is not None]
+
+
+def set_kernel_backend(name: str = "auto") -> KernelSet:
+    """Selects the kernels used by get_kernels(); "auto" = fastest available."""
+    global _kernels
+    if name == "auto":
+        name = available_kernel_backends()[0]
+    if name not in available_kernel_backends():
+        raise ValueError(f"Kernel backend not available: {name}")
+    if name == "numba":
+        _kernels = _jit_kernels()
+    elif name == "numpy":
+        _kernels = KernelSet("numpy", Morph.project_xy3d_array, _revolve_grid_numpy, _stroke_numpy)
+    else:
+        _kernels = KernelSet("python", _project_python, _revolve_grid_python, _stroke_loop)
+    return _kernels
+
+
+def get_kernels() -> KernelSet:
+    return _kernels if _kernels is not None else set_kernel_backend()
+
+
+def conv3d_array(shape2d: Path2D, slices: Optional[int] = None) -> np.ndarray:
+    # ShapeInkei.conv3d as a (V, 3) array through the selected kernels
+    slices, m, ring_ts = ShapeInkei.conv3d_layout(slices)
+    grid = get_kernels().revolve_grid(shape2d, slices)
+    rings = _cylinder_segment_endpoints(slices, m, ring_ts)[slices * m // 4:]
+    return np.concatenate([grid, grid[np.repeat(rings, 2, axis=1).ravel()]])
+
+
+def conv3d_batch(xs: np.ndarray, ys: np.ndarray, slices: Optional[int] = None) -> np.ndarray:
+    # conv3d over (N, 25) profiles (get_path_batch) -> (N, V, 3)
+    slices, m, ring_ts = ShapeInkei.conv3d_layout(slices)
+    grid = _revolve_grid_arrays(*_profile_pairs_array(xs, ys), slices)
+    rings = _cylinder_segment_endpoints(slices, m, ring_ts)[slices * m // 4:]
+    return np.concatenate([grid, grid[:, np.repeat(rings, 2, axis=1).ravel()]], axis=1)
+
+
+def benchmark_kernels(repeat: int = 200, slices: Optional[int] = None) -> dict:
+    """
+    Times project / revolve for every available backend on the default shape
+    and reports the largest deviation from the pure-Python path.
+    """
+    global _kernels
+    d = ShapeInkei
+    shape2d = d.get_path(d.iDefP0, d.iDefP1, d.iDefP2, d.iDefP3, d.iDefP4, d.iDefP5, d.iDefP6, 0, 0, 0)
+    args = (600.0, None, float(d.iStageWidth), 1200.0, 320.0, 320.0, 0.0, 0.0, 0.0, 30.0, -160.0, 10.0, 0.5, "c")
+
+    prev = _kernels
+    results = {}
+    ref = None
+    try:
+        for name in reversed(available_kernel_backends()):  # python first, as the reference
+            ks = set_kernel_backend(name)
+            xyz = conv3d_array(shape2d, slices)
+            pts = ks.project(args[0], xyz, *args[2:])
+            # warm-up above also triggers JIT compilation
+            t0 = time.perf_counter()
+            for _ in range(repeat):
+                conv3d_array(shape2d, slices)
+            t1 = time.perf_counter()
+            for _ in range(repeat):
+                ks.project(args[0], xyz, *args[2:])
+            t2 = time.perf_counter()
+            if ref is None:
+                ref = (xyz, pts)
+            results[name] = {
+                "revolve_ms": (t1 - t0) / repeat * 1000.0,
+                "project_ms": (t2 - t1) / repeat * 1000.0,
+                "max_abs_diff": float(max(np.abs(xyz - ref[0]).max(), np.abs(pts - ref[1]).max())),
+            }
+    finally:
+        _kernels = prev
+    return results
+
+
+# ----------------------------
+# Level of detail (slices / curve steps by on-screen size)
+# ----------------------------
+
+# (largest on-screen extent in px, revolve slices, flatten steps per segment)
+LOD_LEVELS: List[Tuple[float, int, int]] = [
+    (48, 6, 4),
+    (128, 8, 8),
+    (320, 12, 16),
+    (800, 12, 24),
+    (1600, 18, 32),
+    (float("inf"), 24, 48),
+]
+
+
+def lod_level(extent_px: float) -> int:
+    for i, (max_px, _, _) in enumerate(LOD_LEVELS):
+        if extent_px <= max_px:
+            return i
+    return len(LOD_LEVELS) - 1
+
+
+class LodGeometry:
+    """
+    Revolved paths of one layer, built lazily and kept once per LOD level.
+    The profile (get_path / get_fny0) is evaluated once; only the revolve
+    step depends on the level.
+    """
+
+    def __init__(self, lp: LayerParams) -> None:
+        self.lp = lp
+        self._shape2d: dict = {}
+        self._path3d: dict = {}
+
+    def shape2d(self, mode: str = "") -> Path2D:
+        if mode not in self._shape2d:
+            lp = self.lp
+            fn = ShapeInkei.get_fny0 if mode == "click" else ShapeInkei.get_path
+            self._shape2d[mode] = fn(lp.p0, lp.p1, lp.p2, lp.p3, lp.p4, lp.p5, lp.p6, lp.p7, lp.p8, lp.p9)
+        return self._shape2d[mode]
+
+    def path3d(self, level: Optional[int] = None, mode: str = "") -> Path3D:
+        # level None = the site's own geometry (ShapeInkei.iSlices)
+        slices = None if level is None else LOD_LEVELS[level][1]
+        key = (slices or ShapeInkei.iSlices, mode)
+        if key not in self._path3d:
+            self._path3d[key] = ShapeInkei.conv3d(self.shape2d(mode), slices)
+        return self._path3d[key]
+
+    def extent_px(self, scale_a: float, stage_w: float) -> float:
+        return Morph.get_perspective_size3d(scale_a, self.path3d(), stage_w)
+
+    def level_for(self, scale_a: float, stage_w: float) -> int:
+        return lod_level(self.extent_px(scale_a, stage_w))
+
+
+# ----------------------------
+# Label / description panel (port of the clsAnime label layout + clsPanel.fnGetTableText)
+# ----------------------------
+
+def label_boxes(layer_count: int, panel_w: float, panel_h: float) -> List[LayoutBox]:
+    """
+    Port of the clsAnime.sbInit aiLabel layout: [2*i] is the shape box of
+    layer i, [2*i+1] its title box; one layer also gets three thumbnail
+    boxes at [2..4].
+    """
+    m = panel_w / 64
+    box = Morph.get_layout_xy
+    out: List[Optional[LayoutBox]] = [None] * (2 * layer_count + (3 if layer_count == 1 else 0))
+    if layer_count == 1:
+        out[0] = box(0, 0, panel_w, panel_h, m, m, 1, 4, 0, 1, 1, 2)
+        out[1] = box(0, 0, panel_w, panel_h, m, m, 1, 4, 0, 3, 1, 1)
+        for i in range(3):
+            out[i + 2] = box(0, 0, panel_w, panel_h, m, m, 3, 4, i, 0, 1, 1)
+    elif layer_count == 2:
+        for i in range(2):
+            out[2 * i] = box(0, 0, panel_w, panel_h, m, m, 2, 3, i, 0, 1, 2)
+            out[2 * i + 1] = box(0, 0, panel_w, panel_h, m, m, 2, 3, i, 2, 1, 1)
+    else:
+        for i in range(layer_count):
+            out[2 * i] = box(0, 0, panel_w, panel_h, m, m, 2, 6, i % 2, 3 * (i // 2), 1, 2)
+            out[2 * i + 1] = box(0, 0, panel_w, panel_h, m, m, 2, 6, i % 2, 3 * (i // 2) + 2, 1, 1)
+    return out
+
+
+class GlyphAtlas:
+    """
+    Glyphs of one font and size, rasterized once on first use into a shared
+    "L" sheet. glyph() returns the sheet box, the offset from the pen
+    position and the advance.
+    """
+
+    SHEET_W = 1024
+
+    def __init__(self, font_px: int, font_path: Optional[str] = None) -> None:
+        self.font = ImageFont.truetype(font_path, font_px) if font_path else ImageFont.load_default(font_px)
+        ascent, descent = self.font.getmetrics()
+        self.line_h = ascent + descent
+        self.sheet = Image.new("L", (self.SHEET_W, 2 * self.line_h))
+        self._glyphs: dict = {}
+        self._x = 0
+        self._y = 0
+        self._row_h = 0
+        self._lock = threading.Lock()
+
+    def glyph(self, ch: str) -> Tuple[Tuple[int, int, int, int], Tuple[int, int], float]:
+        g = self._glyphs.get(ch)
+        if g is None:
+            with self._lock:
+                g = self._glyphs.get(ch) or self._add(ch)
+        return g
+
+    def _add(self, ch: str):
+        x0, y0, x1, y1 = self.font.getbbox(ch)
+        w, h = max(0, x1 - x0), max(0, y1 - y0)
+        if self._x + w + 1 > self.SHEET_W:
+            self._x = 0
+            self._y += self._row_h + 1
+            self._row_h = 0
+        if self._y + h + 1 > self.sheet.height:
+            grown = Image.new("L", (self.SHEET_W, max(2 * self.sheet.height, self._y + h + 1)))
+            grown.paste(self.sheet, (0, 0))
+            self.sheet = grown
+        if w and h:
+            ImageDraw.Draw(self.sheet).text((self._x - x0, self._y - y0), ch, fill=255, font=self.font)
+        g = ((self._x, self._y, self._x + w, self._y + h), (x0, y0), self.font.getlength(ch))
+        self._x += w + 1
+        self._row_h = max(self._row_h, h)
+        self._glyphs[ch] = g
+        return g
+
+
+@functools.lru_cache(maxsize=None)
+def _glyph_atlas(font_px: int, font_path: Optional[str] = None) -> GlyphAtlas:
+    return GlyphAtlas(font_px, font_path)
+
+
+@functools.lru_cache(maxsize=1024)
+def _text_block_mask(
+    lines: Tuple[Tuple[str, int], ...], w: int, h: int, align: str, font_path: Optional[str] = None
+) -> Image.Image:
+    """
+    Lays out (text, font_px) lines in a w x h box like a one-cell table:
+    vertically centred, aligned "l" / "c" / "r", 1.2 line height. Glyphs
+    are copied from the atlases; the mask is cached (treat it as read-only).
+    """
+    mask = Image.new("L", (w, h))
+    heights = [int(round(font_px * 1.2)) for _, font_px in lines]
+    pen_y = (h - sum(heights)) / 2.0
+    for (text, font_px), line_h in zip(lines, heights):
+        atlas = _glyph_atlas(font_px, font_path)
+        glyphs = [atlas.glyph(ch) for ch in text]
+        width = sum(g[2] for g in glyphs)
+        pen_x = {"c": (w - width) / 2.0, "r": w - width}.get(align, 0.0)
+        base_y = pen_y + (line_h - atlas.line_h) / 2.0
+        for box, (ox, oy), advance in glyphs:
+            if box[2] > box[0] and box[3] > box[1]:
+                mask.paste(255, (int(round(pen_x + ox)), int(round(base_y + oy))), atlas.sheet.crop(box))
+            pen_x += advance
+        pen_y += line_h
+    return mask
+
+
+@functools.lru_cache(maxsize=1024)
+def _text_sprite(
+    lines: Tuple[Tuple[str, int], ...], w: int, h: int, align: str, color_hex: str, font_path: Optional[str] = None
+) -> Image.Image:
+    # coloured RGBA version of _text_block_mask, ready for alpha_composite
+    sprite = Image.new("RGBA", (w, h), _hex_to_rgba(color_hex, 1.0))
+    sprite.putalpha(_text_block_mask(lines, w, h, align, font_path))
+    return sprite
+
+
+class LabelPanel:
+    """
+    Title (q0 / q1 / q2) and description (ShapeInkei.get_desc_list, one layer
+    only) blocks placed like the site viewer, prepared once as sprites;
+    composite() only alpha-blends them onto a frame.
+    """
+
+    def __init__(
+        self,
+        layers: List[LayerParams],
+        size: int = 640,
+        color_hex: str = "FFFFFF",  # clsAnime.strDc
+        font_path: Optional[str] = None,
+        lang: str = "en",
+    ) -> None:
+        n = len(layers)
+        per = size / 640.0  # clsPanel.iPer (iViewPanelMaxW = 640)
+        pad = size / 64.0
+        boxes = label_boxes(n, size, size)
+
+        def place(x, y, w, h, lines, align):
+            # fnGetTableText: ceil the position, floor the size, drop it if off the panel
+            x, y, w, h = math.ceil(x), math.ceil(y), max(1, math.floor(w)), math.floor(h)
+            if x < 0 or y < 0 or x + w > size or y + h > size or h <= 0:
+                return None
+            return _text_sprite(tuple(lines), w, h, align, color_hex, font_path), (x, y)
+
+        title_px = math.floor((22 if n <= 2 else 16) * per)
+        self.titles = []
+        for i, lp in enumerate(layers):
+            b = boxes[2 * i + 1]
+            lines = [(lp.q0, title_px), (lp.q1, title_px), (lp.q2, title_px)]
+            self.titles.append(place(b.x + pad, b.y, b.w - 2 * pad, b.h, lines, "l"))
+
+        self.desc = None
+        if n == 1:
+            b = boxes[0]
+            desc_px = math.ceil(math.floor(14 * per))
+            lines = [(t, desc_px) for t in ShapeInkei.get_desc_list(lang, layers[0]).splitlines()]
+            self.desc = place(b.x + pad, b.y + 0.4 * b.h + pad, b.w - 2 * pad, 0.6 * b.h - 2 * pad, lines, "r")
+
+    def composite(self, frame: Image.Image, titles: Optional[Iterable[int]] = None, desc: bool = True) -> None:
+        """Blends the chosen titles (default all) and the description onto an RGBA frame."""
+        items = [self.titles[i] for i in (range(len(self.titles)) if titles is None else titles)]
+        if desc:
+            items.append(self.desc)
+        for item in items:
+            if item is not None:
+                frame.alpha_composite(item[0], item[1])
+
+
+# ----------------------------
+# Simple renderer (Python replacement for canvas drawing)
+# ----------------------------
+
+def render_png_from_txtcsv(
+    txtcsv: str,
+    out_path: str,
+    size: int = 640,
+    background_hex: str = "111111",
+    grid_hex: str = "444444",
+    angles_deg: Tuple[float, float, float] = (0.0, -160.0, 0.0),  # (X,Y,Z) like the site default view
+    cull_backfaces: bool = False,  # drop strokes on the far side of the surface
+    lod: bool = False,  # pick slices / curve steps from the on-screen size (LOD_LEVELS)
+    supersample: int = 1,  # >1 draws larger and downsamples (LANCZOS)
+    labels: bool = False,  # title / description panel (LabelPanel)
+    fill: bool = False,  # fill the silhouette with fc / fp under the strokes
+    errors: Optional[list] = None,  # per-layer report (sanitize_layers)
+) -> None:
+    # thread-safe: geometry is shared read-only, draw buffers are per thread
+    render_image_from_txtcsv(
+        txtcsv,
+        size=size,
+        background_hex=background_hex,
+        grid_hex=grid_hex,
+        angles_deg=angles_deg,
+        cull_backfaces=cull_backfaces,
+        lod=lod,
+        supersample=supersample,
+        labels=labels,
+        fill=fill,
+        errors=errors,
+    ).save(out_path)
+
+
+from PIL import Image, ImageDraw
+
+def _ease_cos_01(t: float) -> float:
+    # matches JS: (cos((1-a)*PI)+1)/2
+    t = max(0.0, min(1.0, t))
+    return (math.cos((1.0 - t) * math.pi) + 1.0) * 0.5
+
+
+def _morph_color_hex(c0: str, c1: str, per: float) -> str:
+    per = max(0.0, min(1.0, per))
+    c0 = (c0 or "").strip().lstrip("#")
+    c1 = (c1 or "").strip().lstrip("#")
+    if len(c0) != 6:
+        c0 = "000000"
+    if len(c1) != 6:
+        c1 = "000000"
+    r0, g0, b0 = int(c0[0:2], 16), int(c0[2:4], 16), int(c0[4:6], 16)
+    r1, g1, b1 = int(c1[0:2], 16), int(c1[2:4], 16), int(c1[4:6], 16)
+    r = round(r0 + (r1 - r0) * per)
+    g = round(g0 + (g1 - g0) * per)
+    b = round(b0 + (b1 - b0) * per)
+    return f"{r:02X}{g:02X}{b:02X}"
+
+
+def _draw_background_with_grid(
+    img: Image.Image,
+    background_hex: str,
+    grid_hex: str,
+    stage_width: int = 320,
+) -> None:
+    w, h = img.size
+    draw = ImageDraw.Draw(img, "RGBA")
+
+    draw.rectangle([0, 0, w, h], fill=_hex_to_rgba(background_hex, 1.0))
+
+    bg = background_hex.strip().lstrip("#").lower()
+    gg = grid_hex.strip().lstrip("#").lower()
+    if bg != gg:
+        # matches clsAnime.sbDrawStage grid spacing:
+        # for b=0..stageWidth/10 => positions are evenly spread
+        step = int(w / (stage_width / 10.0))
+        col = _hex_to_rgba(grid_hex, 1.0)
+        for x in range(0, w + 1, step):
+            draw.line([(x, 0), (x, h)], fill=col, width=1)
+            draw.line([(0, x), (w, x)], fill=col, width=1)
+
+
+def iter_animation_frames(
+    txtcsv: str,
+    size: int = 640,
+    fps: int = 20,
+    background_hex: str = "111111",
+    grid_hex: str = "444444",
+    show_all_layers: bool = False,
+    seconds_per_layer: Optional[float] = None,  # if None, uses each layer's as_ value
+    supersample: int = 2,  # 1 = faster, 2 = smoother
+    cull_backfaces: bool = False,  # drop strokes on the far side of the surface
+    lod: bool = False,  # pick slices / curve steps from the on-screen size (LOD_LEVELS)
+    labels: bool = False,  # titles appear on each layer's last segment, like the site
+    fill: bool = False,  # fill the silhouette with fc / fp under the strokes
+    transition: str = "cut",  # "morph": later layers morph in from the previous one
+    errors: Optional[list] = None,  # per-layer report (sanitize_layers)
+) -> Iterator[Image.Image]:
+    """
+    Yields the RGBA frames of the site animation (one per 1/fps seconds)
+    using the same camera keyframes as main_u3d.js:
+    ShapeInkei.aiAutoX/Y/Z define 5 keyframes => 4 segments.
+    Segment 0 uses morph_per = -ease (like JS) and color fades from white -> lc.
+    Other segments use morph_per = 1.
+
+    If show_all_layers=False: cycles layers like the website.
+    If show_all_layers=True: renders all layers every frame.
+
+    transition="morph" (layer cycling only): segment 0 of every layer after
+    the first morphs the previous layer's path into this one
+    (Morph.morph_path3d_batch, all frames of the segment in one lerp) and
+    fades lc / fc from the previous layer's, instead of growing from white.
+    """
+    if transition not in ("cut", "morph"):
+        raise ValueError(f"Unknown transition: {transition}")
+    layers = _parse_render_layers(txtcsv, errors)
+    if not layers:
+        raise ValueError("No layers parsed from txtCsv")
+
+    # Precompute 3D paths/centers
+    stage_w = float(ShapeInkei.iStageWidth)
+    geos = [LodGeometry(lp) for lp in layers]
+    built = []
+    for lp, geo in zip(layers, geos):
+        p3d = geo.path3d()
+        open3d = geo.path3d(mode="click")
+        built.append((lp, p3d, open3d, Morph.center_path3d(p3d)))
+
+    # Perspective like JS: iPerspective = 2 * max(fnGetPerspectiveSize3d(...))
+    persp_size = 1.0
+    for _, p3d, _, _ in built:
+        persp_size = max(persp_size, Morph.get_perspective_size3d(size * supersample, p3d, stage_w))
+    perspective_d = 2.0 * persp_size
+
+    # Label box area size on the site is less than full panel; approximate by scale factor
+    scale_a = (size * supersample) * 0.9375
+    ox = (size * supersample) / 2.0
+    oy = (size * supersample) / 2.0
+
+    # per layer (slices, flatten steps); the drawn path is swapped for the LOD one
+    lod_specs: List[Tuple[Optional[int], int]] = [(None, 24)] * len(built)
+    levels: List[Optional[int]] = [None] * len(built)
+    if lod:
+        for li, geo in enumerate(geos):
+            level = levels[li] = geo.level_for(scale_a, stage_w)
+            lp, _, open3d, center = built[li]
+            built[li] = (lp, geo.path3d(level), open3d, center)
+            lod_specs[li] = LOD_LEVELS[level][1:]
+    # (V, 3) arrays of the drawn paths for kernels.project
+    xyz_list = [np.stack([b[1].x, b[1].y, b[1].z], axis=1) for b in built]
 
     # Camera keyframes
     ax = ShapeInkei.aiAutoX
@@ -872,14 +3425,45 @@ def render_gif_from_txtcsv(
         raise ValueError("Invalid aiAutoX/Y/Z keyframes")
 
     segments = len(ax) - 1  # typically 4
-
-    frames: List[Image.Image] = []
+    panel = LabelPanel(layers, size) if labels else None
+    kernels = get_kernels()
+
+    def layer_morph_frames(li: int, ts: List[float]) -> List[Tuple[np.ndarray, Tuple[float, float, float], str, str]]:
+        # (xyz, center, lc, fc) per segment-0 frame of the previous layer -> layer li morph;
+        # the previous layer is taken at li's LOD level so the vertex counts match
+        prev = built[li - 1][0]
+        lp = built[li][0]
+        xyz = Morph.morph_path3d_batch(geos[li - 1].path3d(levels[li]), built[li][1], ts)
+        mn = xyz.min(axis=1)
+        centers = (mn + 0.5 * (xyz.max(axis=1) - mn)).tolist()
+        return [
+            (xyz[fi], tuple(centers[fi]), _morph_color_hex(prev.lc, lp.lc, t), _morph_color_hex(prev.fc, lp.fc, t))
+            for fi, t in enumerate(ts)
+        ]
+
+    def draw_morph_frame(draw_img: Image.Image, li: int, morph, angle_x, angle_y, angle_z):
+        # one transition frame: the morphed path at full extent (morph_per = 1)
+        lp = built[li][0]
+        xyz, center, lc, fc = morph
+        slices, steps = lod_specs[li]
+        pts = kernels.project(
+            scale_a, xyz, stage_w, perspective_d, ox, oy, *center, angle_x, angle_y, angle_z, 1.0, "c"
+        )
+        if fill:
+            fill_silhouette(draw_img, pts, fc, lp.fp / 100.0, slices)
+        segs = _flatten_cubic_segments(pts, steps)
+        if cull_backfaces:
+            segs = segs[_backface_segment_mask(
+                xyz, center, angle_x, angle_y, angle_z, perspective_d, scale_a / stage_w, slices
+            )]
+        width_px = max(1, int(round(lp.lw * supersample)))
+        _stroke_layer(draw_img, segs, _hex_to_rgba(lc, lp.lp / 100.0), width_px, kernels)
 
     def draw_paths_for_frame(draw_img: Image.Image, layer_indices: List[int], angle_x, angle_y, angle_z, seg_idx, seg_t):
         # seg_t is eased 0..1
-        draw = ImageDraw.Draw(draw_img, "RGBA")
         for li in layer_indices:
-            lp, p3d, _open3d, (cx, cy, cz) = built[li]
+            lp, _p3d, _open3d, center = built[li]
+            slices, steps = lod_specs[li]
 
             # JS uses l=-a only for segment 0
             morph_per = -seg_t if seg_idx == 0 else 1.0
@@ -887,34 +3471,19 @@ def render_gif_from_txtcsv(
             # JS fades line color from white -> lc during segment 0
             lc = _morph_color_hex("FFFFFF", lp.lc, seg_t) if seg_idx == 0 else lp.lc
 
-            path2d = Morph.project_xy3d_only(
-                scale_a=scale_a,
-                path=p3d,
-                stage_w=stage_w,
-                perspective_d=perspective_d,
-                origin_x=ox,
-                origin_y=oy,
-                center_x=cx,
-                center_y=cy,
-                center_z=cz,
-                angle_x=angle_x,
-                angle_y=angle_y,
-                angle_z=angle_z,
-                morph_per=morph_per,
-                mode="c",
+            pts = kernels.project(
+                scale_a, xyz_list[li], stage_w, perspective_d, ox, oy, *center, angle_x, angle_y, angle_z,
+                morph_per, "c",
             )
-
-            rgba = _hex_to_rgba(lc, lp.lp / 100.0)
+            if fill:
+                fill_silhouette(draw_img, pts, lp.fc, lp.fp / 100.0, slices)
+            segs = _flatten_cubic_segments(pts, steps)
+            if cull_backfaces:
+                segs = segs[_backface_segment_mask(
+                    xyz_list[li], center, angle_x, angle_y, angle_z, perspective_d, scale_a / stage_w, slices
+                )]
             width_px = max(1, int(round(lp.lw * supersample)))
-
-            n = (len(path2d.x) // 4) * 4
-            for i in range(0, n, 4):
-                p0 = (path2d.x[i + 0], path2d.y[i + 0])
-                p1 = (path2d.x[i + 1], path2d.y[i + 1])
-                p2 = (path2d.x[i + 2], path2d.y[i + 2])
-                p3 = (path2d.x[i + 3], path2d.y[i + 3])
-                pts = _sample_cubic_bezier(p0, p1, p2, p3, steps=24)
-                draw.line(pts, fill=rgba, width=width_px)
+            _stroke_layer(draw_img, segs, _hex_to_rgba(lc, lp.lp / 100.0), width_px, kernels)
 
     # Build animation frames
     for layer_idx in range(1 if show_all_layers else len(built)):
@@ -930,6 +3499,12 @@ def render_gif_from_txtcsv(
 
         frames_per_segment = max(2, int(round((layer_seconds * fps) / segments)))
 
+        morph_frames = None
+        if transition == "morph" and not show_all_layers and layer_idx > 0:
+            morph_frames = layer_morph_frames(
+                layer_idx, [_ease_cos_01((fi + 1) / frames_per_segment) for fi in range(frames_per_segment)]
+            )
+
         for seg in range(segments):
             for fi in range(frames_per_segment):
                 t_lin = (fi + 1) / frames_per_segment
@@ -941,24 +3516,1616 @@ def render_gif_from_txtcsv(
 
                 img = Image.new("RGBA", (size * supersample, size * supersample), (0, 0, 0, 0))
                 _draw_background_with_grid(img, background_hex, grid_hex, stage_width=ShapeInkei.iStageWidth)
-                draw_paths_for_frame(img, layer_indices, angle_x, angle_y, angle_z, seg, t)
+                if seg == 0 and morph_frames is not None:
+                    draw_morph_frame(img, layer_idx, morph_frames[fi], angle_x, angle_y, angle_z)
+                else:
+                    draw_paths_for_frame(img, layer_indices, angle_x, angle_y, angle_z, seg, t)
 
                 if supersample > 1:
                     img = img.resize((size, size), resample=Image.Resampling.LANCZOS)
 
-                # Quantize to keep GIF size reasonable
-                frames.append(img.convert("P", palette=Image.Palette.ADAPTIVE, colors=256))
-
-    duration_ms = int(round(1000 / fps))
-    frames[0].save(
-        out_path,
-        save_all=True,
-        append_images=frames[1:],
-        duration=duration_ms,
-        loop=0,
-        optimize=False,
-        disposal=2,
+                if panel is not None:
+                    done = layer_indices if show_all_layers else range(layer_idx + 1)
+                    if seg < segments - 1:
+                        done = [i for i in done if i < layer_idx] if not show_all_layers else []
+                    panel.composite(img, done, desc=bool(done))
+
+                yield img
+
+
+# ----------------------------
+# Animation sinks (GIF / animated WebP / APNG / raw RGBA stream)
+# ----------------------------
+
+class GifSink:
+    # 256-colour adaptive palette per frame (the expensive step the other sinks skip)
+    def __init__(self, out_path: str, duration_ms: int) -> None:
+        self.out_path = out_path
+        self.duration_ms = duration_ms
+        self.frames: List[Image.Image] = []
+
+    def write(self, frame: Image.Image) -> None:
+        self.frames.append(frame.convert("P", palette=Image.Palette.ADAPTIVE, colors=256))
+
+    def close(self) -> None:
+        if not self.frames:
+            raise ValueError("No frames to write")
+        self.frames[0].save(
+            self.out_path,
+            save_all=True,
+            append_images=self.frames[1:],
+            duration=self.duration_ms,
+            loop=0,
+            optimize=False,
+            disposal=2,
+        )
+
+
+class AnimatedImageSink:
+    # truecolour animation through Pillow's save_all (WEBP or APNG), no quantization
+    def __init__(self, out_path: str, duration_ms: int, fmt: str = "WEBP", **save_kwargs) -> None:
+        self.out_path = out_path
+        self.duration_ms = duration_ms
+        self.fmt = fmt
+        self.save_kwargs = save_kwargs
+        self.frames: List[Image.Image] = []
+
+    def write(self, frame: Image.Image) -> None:
+        self.frames.append(frame)
+
+    def close(self) -> None:
+        if not self.frames:
+            raise ValueError("No frames to write")
+        self.frames[0].save(
+            self.out_path,
+            format=self.fmt,
+            save_all=True,
+            append_images=self.frames[1:],
+            duration=self.duration_ms,
+            loop=0,
+            **self.save_kwargs,
+        )
+
+
+class RawFrameSink:
+    """
+    Streams frames as packed RGBA (width*height*4 bytes each, no header) to a
+    file descriptor or binary file, e.g. the stdin of
+    ffmpeg -f rawvideo -pix_fmt rgba -s 640x640 -r 20 -i - out.mp4
+    Nothing is buffered beyond the current frame.
+    """
+
+    def __init__(self, out, duration_ms: int = 0) -> None:
+        self._fh = open(out, "wb", closefd=False) if isinstance(out, int) else out
+        self.duration_ms = duration_ms
+        self.frames_written = 0
+
+    def write(self, frame: Image.Image) -> None:
+        self._fh.write(frame.tobytes() if frame.mode == "RGBA" else frame.convert("RGBA").tobytes())
+        self.frames_written += 1
+
+    def close(self) -> None:
+        self._fh.flush()
+
+
+def webp_sink(out_path: str, duration_ms: int) -> AnimatedImageSink:
+    return AnimatedImageSink(out_path, duration_ms, "WEBP", lossless=False, quality=90, method=4)
+
+
+def apng_sink(out_path: str, duration_ms: int) -> AnimatedImageSink:
+    return AnimatedImageSink(out_path, duration_ms, "PNG", disposal=1)
+
+
+_ANIMATION_SINKS = {"gif": GifSink, "webp": webp_sink, "png": apng_sink, "apng": apng_sink, "raw": RawFrameSink}
+
+
+def render_animation_from_txtcsv(txtcsv: str, out, fmt: Optional[str] = None, fps: int = 20, **frame_kwargs) -> int:
+    """
+    Renders the site animation into one sink: "gif", "webp", "apng" (or
+    "png"), or "raw" (out is then a file descriptor or binary file). fmt
+    defaults to the extension of out. Returns the number of frames.
+    """
+    if fmt is None:
+        fmt = "raw" if not isinstance(out, str) else out.rsplit(".", 1)[-1]
+    fmt = fmt.lower()
+    if fmt not in _ANIMATION_SINKS:
+        raise ValueError(f"Unsupported animation format: {fmt}")
+    sink = _ANIMATION_SINKS[fmt](out, int(round(1000 / fps)))
+    count = 0
+    for frame in iter_animation_frames(txtcsv, fps=fps, **frame_kwargs):
+        sink.write(frame)
+        count += 1
+    sink.close()
+    return count
+
+
+def render_gif_from_txtcsv(txtcsv: str, out_path: str, **kwargs) -> None:
+    """
+    Exports an animated GIF of the site animation; keyword arguments are
+    those of iter_animation_frames (size, fps, supersample, ...).
+    """
+    render_animation_from_txtcsv(txtcsv, out_path, fmt="gif", **kwargs)
+
+
+# ----------------------------
+# SVG output (cubic segments as path "C" commands, SMIL for the auto timeline)
+# ----------------------------
+
+def _svg_color(hex6: str) -> str:
+    r, g, b, _ = _hex_to_rgba(hex6, 1.0)
+    return f"#{r:02x}{g:02x}{b:02x}"
+
+
+def _svg_path_d(pts: np.ndarray) -> str:
+    # (4*S, 2) projected control points -> "M x y C x y x y x y" per segment
+    n = len(pts) // 4
+    return ("M%.2f %.2fC%.2f %.2f %.2f %.2f %.2f %.2f" * n) % tuple(pts[:n * 4].ravel().tolist())
+
+
+def _svg_stroke_attrs(lp: LayerParams, color: Optional[str] = None) -> str:
+    return (
+        f'fill="none" stroke="{color or _svg_color(lp.lc)}" stroke-opacity="{max(0.0, min(1.0, lp.lp / 100.0)):.3g}" '
+        f'stroke-width="{max(1, int(round(lp.lw)))}" stroke-linecap="round" stroke-linejoin="round"'
+    )
+
+
+def _svg_open(write: Callable[[str], object], size: int, background_hex: str, grid_hex: str) -> None:
+    write(
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{size}" height="{size}" viewBox="0 0 {size} {size}">\n'
+        f'<rect width="{size}" height="{size}" fill="{_svg_color(background_hex)}"/>\n'
+    )
+    bg = background_hex.strip().lstrip("#").lower()
+    gg = grid_hex.strip().lstrip("#").lower()
+    if bg != gg:
+        # same spacing as _draw_background_with_grid
+        step = int(size / (ShapeInkei.iStageWidth / 10.0))
+        d = "".join(f"M{x + 0.5} 0V{size}M0 {x + 0.5}H{size}" for x in range(0, size + 1, step))
+        write(f'<path d="{d}" stroke="{_svg_color(grid_hex)}" stroke-width="1"/>\n')
+
+
+def _svg_target(out):
+    # path -> (write, close) on a new file; file objects are written to as-is
+    if isinstance(out, str):
+        fh = open(out, "w", encoding="utf-8")
+        return fh.write, fh.close
+    return out.write, (lambda: None)
+
+
+def write_svg_from_txtcsv(
+    txtcsv: str,
+    out,
+    size: int = 640,
+    background_hex: str = "111111",
+    grid_hex: str = "444444",
+    angles_deg: Tuple[float, float, float] = (0.0, -160.0, 0.0),
+    cull_backfaces: bool = False,
+    errors: Optional[list] = None,  # per-layer report (sanitize_layers)
+) -> None:
+    """
+    Writes the still of render_png_from_txtcsv as SVG to a path or text file
+    object: one <path> per layer, its cubic segments emitted as-is.
+    """
+    layers = _parse_render_layers(txtcsv, errors)
+    stage_w = float(ShapeInkei.iStageWidth)
+    scale_a = size * 0.9375
+    half = size / 2.0
+    ax, ay, az = angles_deg
+    kernels = get_kernels()
+
+    base = [_layer_geometry(lp) for lp in layers]
+    persp_size = 1.0
+    for xyz, _ in base:
+        persp_size = max(persp_size, _perspective_size_array(size, xyz, stage_w))
+    perspective_d = 2.0 * persp_size
+
+    write, close = _svg_target(out)
+    try:
+        _svg_open(write, size, background_hex, grid_hex)
+        for lp, (xyz, center) in zip(layers, base):
+            pts = kernels.project(scale_a, xyz, stage_w, perspective_d, half, half, *center, ax, ay, az, 1.0, "c")
+            if cull_backfaces:
+                keep = _backface_segment_mask(xyz, center, ax, ay, az, perspective_d, scale_a / stage_w)
+                pts = pts[:len(keep) * 4].reshape(-1, 4, 2)[keep].reshape(-1, 2)
+            write(f'<path d="{_svg_path_d(pts)}" {_svg_stroke_attrs(lp)}/>\n')
+        write("</svg>\n")
+    finally:
+        close()
+
+
+def write_svg_animation_from_txtcsv(
+    txtcsv: str,
+    out,
+    size: int = 640,
+    fps: int = 10,
+    background_hex: str = "111111",
+    grid_hex: str = "444444",
+    show_all_layers: bool = False,
+    seconds_per_layer: Optional[float] = None,
+    errors: Optional[list] = None,  # per-layer report (sanitize_layers)
+) -> None:
+    """
+    SVG version of iter_animation_frames: every layer path carries SMIL
+    <animate> elements for "d" (keyframes sampled at fps, interpolated by the
+    browser since all keyframes share one command structure), the white -> lc
+    stroke fade of segment 0 and, when layers cycle, its visibility window.
+    """
+    layers = _parse_render_layers(txtcsv, errors)
+    if not layers:
+        raise ValueError("No layers parsed from txtCsv")
+    stage_w = float(ShapeInkei.iStageWidth)
+    scale_a = size * 0.9375
+    half = size / 2.0
+    kernels = get_kernels()
+    ax, ay, az = ShapeInkei.aiAutoX, ShapeInkei.aiAutoY, ShapeInkei.aiAutoZ
+    segments = len(ax) - 1
+
+    base = [_layer_geometry(lp) for lp in layers]
+    persp_size = 1.0
+    for xyz, _ in base:
+        persp_size = max(persp_size, _perspective_size_array(size, xyz, stage_w))
+    perspective_d = 2.0 * persp_size
+
+    # frame schedule per window, same as iter_animation_frames
+    windows = []
+    for li in range(1 if show_all_layers else len(layers)):
+        layer_seconds = float(seconds_per_layer) if seconds_per_layer is not None else float(layers[li].as_)
+        frames_per_segment = max(2, int(round((max(0.2, layer_seconds) * fps) / segments)))
+        windows.append((li, frames_per_segment))
+    total_frames = sum(fps_seg * segments for _, fps_seg in windows)
+    dur = total_frames / fps
+
+    write, close = _svg_target(out)
+    try:
+        _svg_open(write, size, background_hex, grid_hex)
+        start = 0
+        for li, frames_per_segment in windows:
+            drawn = range(len(layers)) if show_all_layers else [li]
+            n_frames = frames_per_segment * segments
+            key_times = []
+            poses = []
+            for seg in range(segments):
+                for fi in range(frames_per_segment):
+                    t = _ease_cos_01((fi + 1) / frames_per_segment)
+                    key_times.append((start + seg * frames_per_segment + fi) / total_frames)
+                    poses.append((
+                        ax[seg] + (ax[seg + 1] - ax[seg]) * t,
+                        ay[seg] + (ay[seg + 1] - ay[seg]) * t,
+                        az[seg] + (az[seg + 1] - az[seg]) * t,
+                        seg, t,
+                    ))
+            # the first / last keyframe are held up to the ends of the cycle
+            key_times[0] = 0.0
+            key_times.append(1.0)
+            poses.append(poses[-1])
+            times = ";".join(f"{k:.5f}" for k in key_times)
+
+            for di in drawn:
+                lp = layers[di]
+                xyz, center = base[di]
+                ds = []
+                colors = []
+                for x_deg, y_deg, z_deg, seg, t in poses:
+                    morph_per = -t if seg == 0 else 1.0
+                    pts = kernels.project(
+                        scale_a, xyz, stage_w, perspective_d, half, half, *center, x_deg, y_deg, z_deg, morph_per, "c"
+                    )
+                    ds.append(_svg_path_d(pts))
+                    colors.append(_svg_color(_morph_color_hex("FFFFFF", lp.lc, t) if seg == 0 else lp.lc))
+                write(f'<path d="{ds[0]}" {_svg_stroke_attrs(lp, colors[0])}>')
+                write(f'<animate attributeName="d" dur="{dur:.3f}s" repeatCount="indefinite" keyTimes="{times}" values="')
+                write(";".join(ds))
+                write('"/>')
+                write(
+                    f'<animate attributeName="stroke" dur="{dur:.3f}s" repeatCount="indefinite" '
+                    f'keyTimes="{times}" values="{";".join(colors)}"/>'
+                )
+                if not show_all_layers and len(windows) > 1:
+                    a = start / total_frames
+                    b = (start + n_frames) / total_frames
+                    vis = [("visible" if a == 0 else "hidden", 0.0)]
+                    if a > 0:
+                        vis.append(("visible", a))
+                    if b < 1:
+                        vis.append(("hidden", b))
+                    write(
+                        f'<animate attributeName="visibility" dur="{dur:.3f}s" repeatCount="indefinite" calcMode="discrete" '
+                        f'keyTimes="{";".join(f"{k:.5f}" for _, k in vis)}" values="{";".join(v for v, _ in vis)}"/>'
+                    )
+                write("</path>\n")
+            start += n_frames
+        write("</svg>\n")
+    finally:
+        close()
+
+
+# ----------------------------
+# Thread-safe rendering (shared read-only geometry, per-thread scratch buffers)
+# ----------------------------
+
+def _layer_key(lp: LayerParams) -> Tuple[float, ...]:
+    return (lp.p0, lp.p1, lp.p2, lp.p3, lp.p4, lp.p5, lp.p6, lp.p7, lp.p8, lp.p9)
+
+
+@functools.lru_cache(maxsize=4096)
+def _frozen_path3d(params: Tuple[float, ...], slices: Optional[int] = None, mode: str = "") -> np.ndarray:
+    # conv3d path of one parameter set as a read-only (V, 3) array shared by all threads
+    fn = ShapeInkei.get_fny0 if mode == "click" else ShapeInkei.get_path
+    xyz = conv3d_array(fn(*params), slices)
+    xyz.setflags(write=False)
+    return xyz
+
+
+def _center_array3d(xyz: np.ndarray) -> Tuple[float, float, float]:
+    # Morph.center_path3d over a (V, 3) array
+    mn = xyz.min(axis=0)
+    mx = xyz.max(axis=0)
+    c = mn + 0.5 * (mx - mn)
+    return float(c[0]), float(c[1]), float(c[2])
+
+
+def _perspective_size_array(panel_w: float, xyz: np.ndarray, stage_w: float) -> float:
+    # Morph.get_perspective_size3d over a (V, 3) array
+    p = xyz * panel_w / stage_w
+    e = int(np.floor(p.max(axis=0) - p.min(axis=0)).max())
+    return float(e if e > 1 else 1)
+
+
+class _RenderScratch(threading.local):
+    # per-thread stage (background + grid) and frame buffers, reused across renders
+    def __init__(self) -> None:
+        self.stages: dict = {}
+        self.frames: dict = {}
+
+
+_scratch = _RenderScratch()
+
+
+def _scratch_frame(size: int, background_hex: str, grid_hex: str) -> Tuple[Image.Image, ImageDraw.ImageDraw]:
+    key = (size, background_hex, grid_hex)
+    stage = _scratch.stages.get(key)
+    if stage is None:
+        stage = Image.new("RGBA", (size, size), (0, 0, 0, 0))
+        _draw_background_with_grid(stage, background_hex, grid_hex, stage_width=ShapeInkei.iStageWidth)
+        _scratch.stages[key] = stage
+    entry = _scratch.frames.get(size)
+    if entry is None:
+        frame = Image.new("RGBA", (size, size))
+        entry = _scratch.frames[size] = (frame, ImageDraw.Draw(frame, "RGBA"))
+    entry[0].paste(stage, (0, 0))
+    return entry
+
+
+def render_image_from_txtcsv(
+    txtcsv: str,
+    size: int = 640,
+    background_hex: str = "111111",
+    grid_hex: str = "444444",
+    angles_deg: Tuple[float, float, float] = (0.0, -160.0, 0.0),
+    cull_backfaces: bool = False,
+    lod: bool = False,
+    supersample: int = 1,
+    labels: bool = False,
+    fill: bool = False,
+    errors: Optional[list] = None,  # per-layer report (sanitize_layers)
+) -> Image.Image:
+    """
+    Renders one still like render_png_from_txtcsv and returns the image.
+    Without supersampling the result is this thread's scratch frame: it is
+    overwritten by the thread's next render, so copy it to keep it.
+    """
+    layers = _parse_render_layers(txtcsv, errors)
+    return _render_layers_image(
+        layers, [_layer_geometry(lp) for lp in layers], size, background_hex, grid_hex, angles_deg,
+        cull_backfaces, lod, supersample, labels, fill,
     )
+
+
+def _render_layers_image(
+    layers: List[LayerParams],
+    base: List[Tuple[np.ndarray, Tuple[float, float, float]]],
+    size: int,
+    background_hex: str,
+    grid_hex: str,
+    angles_deg: Tuple[float, float, float],
+    cull_backfaces: bool,
+    lod: bool,
+    supersample: int,
+    labels: bool,
+    fill: bool,
+    coarse: Optional[Tuple[int, int]] = None,
+) -> Image.Image:
+    # render_image_from_txtcsv on already built (path, center) geometry;
+    # coarse=(slices, steps) forces that geometry and 1px strokes (preview)
+    stage_w = float(ShapeInkei.iStageWidth)
+    draw_size = size * supersample
+    scale_a = draw_size * 0.9375
+    half = draw_size / 2.0
+    ax, ay, az = angles_deg
+    kernels = get_kernels()
+
+    persp_size = 1.0
+    for xyz, _ in base:
+        persp_size = max(persp_size, _perspective_size_array(draw_size, xyz, stage_w))
+    perspective_d = 2.0 * persp_size
+
+    frame, _ = _scratch_frame(draw_size, background_hex, grid_hex)
+    for lp, (xyz, center) in zip(layers, base):
+        slices = None
+        steps = 24
+        if coarse is not None:
+            slices, steps = coarse
+            xyz = _frozen_path3d(_layer_key(lp), slices)
+        elif lod:
+            _, slices, steps = LOD_LEVELS[lod_level(_perspective_size_array(scale_a, xyz, stage_w))]
+            xyz = _frozen_path3d(_layer_key(lp), slices)
+
+        pts = kernels.project(scale_a, xyz, stage_w, perspective_d, half, half, *center, ax, ay, az, 1.0, "c")
+        if fill:
+            fill_silhouette(frame, pts, lp.fc, lp.fp / 100.0, slices)
+        segs = _flatten_cubic_segments(pts, steps)
+        if cull_backfaces:
+            segs = segs[_backface_segment_mask(xyz, center, ax, ay, az, perspective_d, scale_a / stage_w, slices)]
+
+        rgba = _hex_to_rgba(lp.lc, lp.lp / 100.0)
+        width_px = 1 if coarse is not None else max(1, int(round(lp.lw * supersample)))
+        _stroke_layer(frame, segs, rgba, width_px, kernels)
+
+    if supersample > 1:
+        # resampling runs outside the GIL
+        frame = frame.resize((size, size), resample=Image.Resampling.LANCZOS)
+    if labels and layers:
+        LabelPanel(layers, size).composite(frame)
+    return frame
+
+
+def _stroke_layer(
+    frame: Image.Image, segs: np.ndarray, rgba: Tuple[int, int, int, int], width_px: int, kernels: KernelSet
+) -> None:
+    # one kernels.stroke call rasterizes all of a layer's polylines into a
+    # coverage mask over their bounding box, one paste blends it into the frame
+    pts = segs.reshape(-1, 2)
+    pts = pts[(np.abs(pts) < STROKE_MAX_COORD).all(axis=1)]
+    if not len(pts) or rgba[3] == 0:
+        return
+    pad = width_px // 2 + 1
+    x0, y0 = np.maximum(np.floor(pts.min(axis=0)).astype(int) - pad, 0).tolist()
+    x1, y1 = np.minimum(np.floor(pts.max(axis=0)).astype(int) + pad + 1, frame.size).tolist()
+    if x1 <= x0 or y1 <= y0:
+        return
+    mask = np.zeros((y1 - y0, x1 - x0), dtype=np.uint8)
+    kernels.stroke(segs - np.array([x0, y0], dtype=np.float64), _stroke_offsets(width_px), mask, rgba[3])
+    frame.paste(rgba[:3] + (255,), (x0, y0), Image.frombuffer("L", (x1 - x0, y1 - y0), mask, "raw", "L", 0, 1))
+
+
+def render_png_batch(
+    jobs: Iterable[Tuple[str, str]],
+    workers: Optional[int] = None,
+    errors: Optional[list] = None,
+    **render_kwargs,
+) -> int:
+    """
+    Renders (txtcsv, out_path) jobs on a thread pool; returns the count.
+    Keyword arguments are passed on to render_png_from_txtcsv. With an
+    errors list a failing job is recorded as (job index, message) and the
+    batch carries on; the count is then of the jobs written.
+
+    Each layer is rasterized by one kernels.stroke call and blended with
+    one paste; those, the NumPy array operations, LANCZOS resampling and
+    the PNG encoder release the GIL (the numba kernels entirely), so the
+    threads overlap everything but the per-layer Python glue.
+    """
+    def run(job: Tuple[str, str]) -> Optional[str]:
+        if errors is None:
+            render_png_from_txtcsv(job[0], job[1], **render_kwargs)
+            return None
+        return _render_png_job_checked((job[0], job[1], render_kwargs))
+
+    count = 0
+    with ThreadPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+        for i, err in enumerate(pool.map(run, jobs)):
+            if err is None:
+                count += 1
+            else:
+                errors.append((i, err))
+    return count
+
+
+def _render_png_job_checked(job: Tuple[str, str, dict]) -> Optional[str]:
+    # one batch job; the failure message instead of the exception
+    try:
+        render_png_from_txtcsv(job[0], job[1], **job[2])
+    except Exception as exc:
+        return f"{type(exc).__name__}: {exc}"
+    return None
+
+
+# ----------------------------
+# Multi-resolution output (one geometry build, many sizes)
+# ----------------------------
+
+def render_png_pyramid(
+    txtcsv: str,
+    outputs: Iterable[Tuple[int, str]],
+    background_hex: str = "111111",
+    grid_hex: str = "444444",
+    angles_deg: Tuple[float, float, float] = (0.0, -160.0, 0.0),
+    cull_backfaces: bool = False,
+    lod: bool = False,
+    supersample: int = 1,
+    labels: bool = False,
+    fill: bool = False,
+    stroke_ref: Optional[float] = 640.0,  # lw is in px at this size; None keeps lw px at every size
+    workers: Optional[int] = None,
+    errors: Optional[list] = None,  # per-layer report (sanitize_layers)
+) -> List[str]:
+    """
+    Writes one PNG per (size, out_path) from a single parse and geometry
+    build. Layers are projected and flattened once, in screen units of a
+    size-1 stage (the perspective distance taken from the largest size), so
+    each size only scales those coordinates; with lod=True that happens once
+    per LOD level in use. Stroke widths are lw * size / stroke_ref. PNG
+    encoding runs on a thread pool, concurrently with drawing the next size.
+
+    The largest size matches render_png_from_txtcsv (same stroke width) up
+    to float rounding; smaller sizes share its perspective instead of
+    re-deriving it from their own pixel extent.
+    """
+    outputs = list(outputs)
+    if not outputs:
+        return []
+    layers = _parse_render_layers(txtcsv, errors)
+    stage_w = float(ShapeInkei.iStageWidth)
+    ax, ay, az = angles_deg
+    kernels = get_kernels()
+    base = [_layer_geometry(lp) for lp in layers]
+
+    ref = max(size for size, _ in outputs) * supersample
+    persp_size = 1.0
+    for xyz, _ in base:
+        persp_size = max(persp_size, _perspective_size_array(ref, xyz, stage_w))
+    perspective_d = 2.0 * persp_size / ref
+
+    # (layer, slices, steps) -> (control points, segments) on the size-1 stage, centred on 0
+    geometry: dict = {}
+    plans: List[List[Tuple[Optional[int], Tuple[np.ndarray, np.ndarray]]]] = []
+    for size, _ in outputs:
+        plan = []
+        for li, (lp, (xyz, center)) in enumerate(zip(layers, base)):
+            slices = None
+            steps = 24
+            if lod:
+                _, slices, steps = LOD_LEVELS[lod_level(_perspective_size_array(size * supersample * 0.9375, xyz, stage_w))]
+            key = (li, slices, steps)
+            if key not in geometry:
+                path = xyz if slices is None else _frozen_path3d(_layer_key(lp), slices)
+                pts = kernels.project(0.9375, path, stage_w, perspective_d, 0.0, 0.0, *center, ax, ay, az, 1.0, "c")
+                segs = _flatten_cubic_segments(pts, steps)
+                if cull_backfaces:
+                    segs = segs[_backface_segment_mask(
+                        path, center, ax, ay, az, perspective_d, 0.9375 / stage_w, slices,
+                    )]
+                geometry[key] = (pts, segs)
+            plan.append((slices, geometry[key]))
+        plans.append(plan)
+
+    def draw_size_image(i: int) -> Image.Image:
+        size, _ = outputs[i]
+        draw_size = size * supersample
+        half = draw_size / 2.0
+        width_k = supersample * (size / stroke_ref if stroke_ref else 1.0)
+        frame, _ = _scratch_frame(draw_size, background_hex, grid_hex)
+        for lp, (slices, (pts, segs)) in zip(layers, plans[i]):
+            if fill:
+                fill_silhouette(frame, half + pts * draw_size, lp.fc, lp.fp / 100.0, slices)
+            rgba = _hex_to_rgba(lp.lc, lp.lp / 100.0)
+            width_px = max(1, int(round(lp.lw * width_k)))
+            _stroke_layer(frame, half + segs * draw_size, rgba, width_px, kernels)
+        if supersample > 1:
+            frame = frame.resize((size, size), resample=Image.Resampling.LANCZOS)
+        elif any(s == size for s, _ in outputs[i + 1:]):
+            # the scratch frame of this size is drawn again before the save below runs
+            frame = frame.copy()
+        if labels and layers:
+            LabelPanel(layers, size).composite(frame)
+        return frame
+
+    # drawing stays on this thread (and its scratch buffers); PNG encoding
+    # (zlib) runs outside the GIL and overlaps the next size's drawing
+    with ThreadPoolExecutor(max_workers=workers or min(len(outputs), os.cpu_count() or 1)) as pool:
+        saves = [pool.submit(draw_size_image(i).save, out_path) for i, (_, out_path) in enumerate(outputs)]
+        for f in saves:
+            f.result()
+    return [out_path for _, out_path in outputs]
+
+
+# ----------------------------
+# Progressive rendering (coarse preview first, then refinement passes)
+# ----------------------------
+
+# preview geometry: (slices, curve steps) of the smallest LOD level, drawn with 1px strokes
+PROGRESSIVE_PREVIEW = LOD_LEVELS[0][1:]
+
+
+def iter_progressive_images(
+    txtcsv: str,
+    size: int = 640,
+    background_hex: str = "111111",
+    grid_hex: str = "444444",
+    angles_deg: Tuple[float, float, float] = (0.0, -160.0, 0.0),
+    cull_backfaces: bool = False,
+    lod: bool = False,
+    supersample: int = 1,
+    labels: bool = False,
+    fill: bool = False,
+    errors: Optional[list] = None,  # per-layer report (sanitize_layers)
+) -> Iterator[Tuple[bool, Image.Image]]:
+    """
+    Yields (final, image) from a cheap preview up to the same image
+    render_image_from_txtcsv would give: a PROGRESSIVE_PREVIEW pass
+    (coarse slices, few curve steps, 1px strokes, no supersampling), then
+    full geometry and stroke width, then the supersampled pass when
+    supersample > 1. The txtCsv is parsed and the layer geometry built once
+    for all passes. Every image is a copy the caller may keep.
+    """
+    layers = _parse_render_layers(txtcsv, errors)
+    base = [_layer_geometry(lp) for lp in layers]
+    passes: List[Tuple[Optional[Tuple[int, int]], int]] = [(PROGRESSIVE_PREVIEW, 1), (None, 1)]
+    if supersample > 1:
+        passes.append((None, supersample))
+    for i, (coarse, ss) in enumerate(passes):
+        image = _render_layers_image(
+            layers, base, size, background_hex, grid_hex, angles_deg, cull_backfaces, lod, ss, labels, fill, coarse,
+        )
+        # supersampled passes already come back as a fresh (resized) image
+        yield i == len(passes) - 1, image.copy() if ss == 1 else image
+
+
+def render_progressive(
+    txtcsv: str,
+    callback: Optional[Callable[[Image.Image, bool], Optional[bool]]] = None,
+    **render_kwargs,
+) -> Tuple[Image.Image, Future]:
+    """
+    Renders the preview pass of iter_progressive_images and returns it at
+    once, together with a Future for the full-quality image. The remaining
+    passes run on a background thread, each handed to callback(image, final)
+    as it is done; a callback returning False stops refining (the Future
+    then holds the last image delivered).
+    """
+    passes = iter_progressive_images(txtcsv, **render_kwargs)
+    _, preview = next(passes)
+
+    def refine() -> Image.Image:
+        image = preview
+        for final, image in passes:
+            if callback is not None and callback(image, final) is False:
+                break
+        return image
+
+    pool = ThreadPoolExecutor(max_workers=1)
+    try:
+        return preview, pool.submit(refine)
+    finally:
+        pool.shutdown(wait=False)
+
+
+async def aiter_progressive_images(txtcsv: str, **render_kwargs) -> AsyncIterator[Tuple[bool, Image.Image]]:
+    # iter_progressive_images for asyncio code: every pass renders in the default executor
+    loop = asyncio.get_running_loop()
+    passes = iter_progressive_images(txtcsv, **render_kwargs)
+    while True:
+        item = await loop.run_in_executor(None, next, passes, None)
+        if item is None:
+            return
+        yield item
+
+
+# ----------------------------
+# Contact sheet (many shapes tiled with the fnGetLayoutXY grid)
+# ----------------------------
+
+def contact_sheet_size(count: int, cols: int, tile: int, gap: int) -> Tuple[int, int, int]:
+    # (width, height, rows) of a sheet whose get_layout_xy cells are exactly tile px
+    rows = max(1, -(-count // cols))
+    return 2 * gap + gap * (cols + 1) + tile * cols, 2 * gap + gap * (rows + 1) + tile * rows, rows
+
+
+def render_contact_sheet(
+    layers: List[LayerParams],
+    out_path: Optional[str] = None,
+    cols: Optional[int] = None,
+    tile: int = 128,
+    gap: Optional[int] = None,
+    background_hex: str = "111111",
+    grid_hex: str = "444444",
+    angles_deg: Tuple[float, float, float] = (0.0, -160.0, 0.0),
+    cull_backfaces: bool = False,
+    workers: Optional[int] = None,
+    chunk_size: int = 1024,
+    errors: Optional[list] = None,
+) -> Image.Image:
+    """
+    Tiles one view per layer into a single RGB sheet laid out with
+    Morph.get_layout_xy (margin = gap = tile/32 by default). All tiles share
+    one perspective, from the largest shape, so relative sizes are kept.
+    Geometry is built chunk_size layers at a time, once: the sizing pass
+    keeps it for drawing. Curve steps follow each shape's on-screen extent
+    (LOD_LEVELS, as LodGeometry). Tiles are drawn on a thread pool into
+    per-thread scratch frames and pasted into the sheet, so no per-tile
+    image outlives its paste. Layers dropped by get_path_checked keep an
+    empty tile and are reported to errors.
+    """
+    n = len(layers)
+    if n == 0:
+        raise ValueError("No layers to tile")
+    cols = cols or max(1, math.ceil(math.sqrt(n)))
+    gap = max(1, tile // 32) if gap is None else gap
+    width, height, rows = contact_sheet_size(n, cols, tile, gap)
+    stage_w = float(ShapeInkei.iStageWidth)
+    scale_a = tile * 0.9375
+    half = tile / 2.0
+    ax, ay, az = angles_deg
+    params = _layers_to_p_array(layers)
+    level_steps = np.array([lv[2] for lv in LOD_LEVELS])
+    level_max = np.array([lv[0] for lv in LOD_LEVELS[:-1]])
+
+    # pass 1: geometry, centers, per-tile curve steps and the shared
+    # perspective (get_perspective_size3d at tile width)
+    chunks = []
+    persp_size = 1.0
+    for start in range(0, n, chunk_size):
+        xs, ys, flags = get_path_checked(params[start:start + chunk_size])
+        if errors is not None:
+            errors.extend(param_errors(flags, start))
+        xyz = conv3d_batch(xs, ys)
+        keep = (flags & PARAM_DROP) == 0
+        mn = xyz.min(axis=1)
+        ext = xyz.max(axis=1) - mn
+        centers = (mn + 0.5 * ext).tolist()
+        # lod_level of each shape's extent_px (LodGeometry) at this tile scale
+        steps = level_steps[np.searchsorted(level_max, np.floor(ext.max(axis=1) * scale_a / stage_w))].tolist()
+        if keep.any():
+            persp_size = max(persp_size, float(np.floor(ext[keep] * tile / stage_w).max()))
+        chunks.append((start, xyz, centers, steps, keep.tolist()))
+    perspective_d = 2.0 * persp_size
+
+    sheet = Image.new("RGB", (width, height), _hex_to_rgba(background_hex, 1.0)[:3])
+    kernels = get_kernels()
+
+    def draw_tile(i: int, xyz: np.ndarray, center: Tuple[float, float, float], steps: int, keep: bool) -> None:
+        lp = layers[i]
+        frame, _ = _scratch_frame(tile, background_hex, grid_hex)
+        if keep:
+            pts = kernels.project(scale_a, xyz, stage_w, perspective_d, half, half, *center, ax, ay, az, 1.0, "c")
+            segs = _flatten_cubic_segments(pts, steps)
+            if cull_backfaces:
+                segs = segs[_backface_segment_mask(xyz, center, ax, ay, az, perspective_d, scale_a / stage_w)]
+            rgba = _hex_to_rgba(lp.lc, lp.lp / 100.0)
+            width_px = max(1, int(round(lp.lw * tile / 640.0)))
+            _stroke_layer(frame, segs, rgba, width_px, kernels)
+        box = Morph.get_layout_xy(0, 0, width, height, gap, gap, cols, rows, i % cols, i // cols, 1, 1)
+        sheet.paste(frame, (int(box.x), int(box.y)))
+
+    # pass 2: draw; tiles cover disjoint sheet areas
+    with ThreadPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+        for start, xyz, centers, steps, keep in chunks:
+            list(pool.map(
+                lambda k: draw_tile(start + k, xyz[k], tuple(centers[k]), steps[k], keep[k]), range(len(xyz))
+            ))
+
+    if out_path:
+        sheet.save(out_path)
+    return sheet
+
+
+# ----------------------------
+# Shared-memory geometry store (multi-process render workers)
+# ----------------------------
+
+@dataclass(frozen=True)
+class StoredGeometry:
+    p3d: np.ndarray  # (V, 3) conv3d path, read-only view into the store
+    open3d: np.ndarray  # (V, 3) mode="click" path
+    center: Tuple[float, float, float]
+
+
+_created_shm_names: set = set()
+
+
+def _attach_shared_memory(name: str) -> shared_memory.SharedMemory:
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:  # Python < 3.13
+        shm = shared_memory.SharedMemory(name=name)
+        # A process with its own resource tracker (not started by multiprocessing)
+        # would have the block unlinked when it exits; children share the creator's.
+        if multiprocessing.parent_process() is None and name not in _created_shm_names:
+            resource_tracker.unregister(shm._name, "shared_memory")
+        return shm
+
+
+class SharedGeometryStore:
+    """
+    Fixed-capacity table of precomputed conv3d paths in one shared-memory
+    block, keyed by the layer's p0..p9 and found through an open-addressing
+    hash table (linear probing) kept in the same block. Processes attached
+    with the store's lock may insert (put / populate, FIFO eviction when
+    full); the lock keeps them to one writer at a time. Lookups take no lock.
+
+    Slots carry a sequence counter that is odd while being rewritten. get()
+    skips such slots, and get(copy=True) re-checks it after copying; plain
+    views of a slot are only stable while no writer evicts it.
+    """
+
+    _MAGIC = 0x494E4B45  # "INKE"
+    _HEADER = 5  # int64: magic, capacity, vertices per path, inserted count, hash table size
+
+    def __init__(self, shm: shared_memory.SharedMemory, owner: bool, lock=None) -> None:
+        self._shm = shm
+        self.owner = owner
+        self._lock = lock
+        header = np.ndarray((self._HEADER,), dtype=np.int64, buffer=shm.buf)
+        if header[0] != self._MAGIC:
+            raise ValueError(f"Not a geometry store: {shm.name}")
+        self.capacity = int(header[1])
+        self.vertices = int(header[2])
+        self._header = header
+        off = self._HEADER * 8
+        self._seq = np.ndarray((self.capacity,), dtype=np.int64, buffer=shm.buf, offset=off)
+        off += self.capacity * 8
+        self._keys = np.ndarray((self.capacity, 10), dtype=np.float64, buffer=shm.buf, offset=off)
+        off += self.capacity * 10 * 8
+        self._table = np.ndarray((int(header[4]),), dtype=np.int64, buffer=shm.buf, offset=off)  # slot or -1
+        off += int(header[4]) * 8
+        self._data = np.ndarray((self.capacity, self._slot_floats(self.vertices)), dtype=np.float64, buffer=shm.buf, offset=off)
+
+    @staticmethod
+    def _slot_floats(vertices: int) -> int:
+        return 2 * vertices * 3 + 3
+
+    @staticmethod
+    def _table_size(capacity: int) -> int:
+        # power of two, at most half full
+        return 1 << max(1, 2 * capacity - 1).bit_length()
+
+    @classmethod
+    def create(cls, capacity: int = 4096, name: Optional[str] = None) -> "SharedGeometryStore":
+        slices, m, rings = ShapeInkei.conv3d_layout()
+        vertices = slices * m + len(rings) * slices * 4
+        table = cls._table_size(capacity)
+        size = (cls._HEADER + capacity + capacity * 10 + table + capacity * cls._slot_floats(vertices)) * 8
+        shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        _created_shm_names.add(shm.name)
+        header = np.ndarray((cls._HEADER,), dtype=np.int64, buffer=shm.buf)
+        header[:] = (cls._MAGIC, capacity, vertices, 0, table)
+        off = (cls._HEADER + capacity) * 8
+        np.ndarray((capacity, 10), dtype=np.float64, buffer=shm.buf, offset=off)[:] = np.nan
+        np.ndarray((table,), dtype=np.int64, buffer=shm.buf, offset=off + capacity * 10 * 8)[:] = -1
+        return cls(shm, owner=True, lock=multiprocessing.Lock())
+
+    @classmethod
+    def attach(cls, name: str, lock=None) -> "SharedGeometryStore":
+        """Opens a store by name; pass the creator's lock to insert misses."""
+        return cls(_attach_shared_memory(name), owner=False, lock=lock)
+
+    @property
+    def name(self) -> str:
+        return self._shm.name
+
+    @property
+    def lock(self):
+        return self._lock
+
+    @property
+    def writable(self) -> bool:
+        return self._lock is not None
+
+    def __len__(self) -> int:
+        return min(int(self._header[3]), self.capacity)
+
+    def _find(self, key: Tuple[float, ...]) -> int:
+        # probe from the key's bucket to the first empty one; lock-free readers
+        # may miss a key while a writer moves it, never return a wrong slot
+        mask = len(self._table) - 1
+        i = hash(key) & mask
+        want = list(key)
+        for _ in range(len(self._table)):
+            slot = int(self._table[i])
+            if slot < 0:
+                return -1
+            if self._keys[slot].tolist() == want:
+                return slot
+            i = (i + 1) & mask
+        return -1
+
+    def _index(self, key: Tuple[float, ...], slot: int) -> None:
+        mask = len(self._table) - 1
+        i = hash(key) & mask
+        while self._table[i] >= 0:
+            i = (i + 1) & mask
+        self._table[i] = slot
+
+    def _unindex(self, key: Tuple[float, ...], slot: int) -> None:
+        # linear-probing delete: shift later entries of the run back over the hole
+        mask = len(self._table) - 1
+        i = hash(key) & mask
+        while int(self._table[i]) != slot:
+            i = (i + 1) & mask
+        j = i
+        while True:
+            j = (j + 1) & mask
+            s = int(self._table[j])
+            if s < 0:
+                break
+            home = hash(tuple(self._keys[s].tolist())) & mask
+            if (j - home) & mask >= (j - i) & mask:
+                self._table[i] = s
+                i = j
+        self._table[i] = -1
+
+    def __contains__(self, item) -> bool:
+        return self._find(_geometry_key(item)) >= 0
+
+    def get(self, item, copy: bool = False) -> Optional[StoredGeometry]:
+        key = _geometry_key(item)
+        slot = self._find(key)
+        if slot < 0:
+            return None
+        seq = int(self._seq[slot])
+        if seq & 1:
+            return None
+        row = self._data[slot]
+        if copy:
+            row = row.copy()
+            if int(self._seq[slot]) != seq or tuple(self._keys[slot].tolist()) != key:
+                return None
+        else:
+            row = row.view()
+            row.setflags(write=False)
+        n = self.vertices * 3
+        return StoredGeometry(
+            row[:n].reshape(-1, 3),
+            row[n:2 * n].reshape(-1, 3),
+            (float(row[2 * n]), float(row[2 * n + 1]), float(row[2 * n + 2])),
+        )
+
+    def put(self, item) -> int:
+        """Builds and stores one parameter set (needs the lock); returns its slot."""
+        if self._lock is None:
+            raise ValueError("Attach the geometry store with its lock to write to it")
+        key = _geometry_key(item)
+        slot = self._find(key)
+        if slot >= 0:
+            return slot
+        # build outside the lock, so workers only serialize on the copy in
+        p3d = _frozen_path3d(key)
+        open3d = _frozen_path3d(key, None, "click")
+        if len(p3d) != self.vertices or len(open3d) != self.vertices:
+            raise ValueError("Path size does not match the store layout")
+
+        with self._lock:
+            slot = self._find(key)  # another writer may have added it meanwhile
+            if slot >= 0:
+                return slot
+            slot = int(self._header[3]) % self.capacity  # FIFO eviction
+            self._seq[slot] += 1
+            old = self._keys[slot]
+            if not math.isnan(old[0]):
+                self._unindex(tuple(old.tolist()), slot)
+            self._keys[slot] = np.nan
+            n = self.vertices * 3
+            row = self._data[slot]
+            row[:n] = p3d.ravel()
+            row[n:2 * n] = open3d.ravel()
+            row[2 * n:] = _center_array3d(p3d)
+            self._keys[slot] = key
+            self._index(key, slot)
+            self._seq[slot] += 1
+            self._header[3] += 1
+        return slot
+
+    def populate(self, items: Iterable) -> int:
+        # stores every missing item; returns how many were added
+        added = 0
+        for item in items:
+            if _geometry_key(item) not in self:
+                self.put(item)
+                added += 1
+        return added
+
+    def close(self) -> None:
+        # drop the numpy views first, the buffer cannot be released while exported
+        self._header = self._seq = self._keys = self._table = self._data = None
+        self._shm.close()
+
+    def unlink(self) -> None:
+        self._shm.unlink()
+
+
+def _geometry_key(item) -> Tuple[float, ...]:
+    # LayerParams or a p0..p9 sequence -> canonical float key
+    if isinstance(item, LayerParams):
+        item = _layer_key(item)
+    return tuple(float(v) for v in item)
+
+
+_geometry_store: Optional[SharedGeometryStore] = None
+
+
+def attach_geometry_store(name: Optional[str], lock=None) -> None:
+    """
+    Makes this process read base geometry from a store (e.g. a Pool
+    initializer); with the store's lock it also inserts the layers it misses.
+    """
+    global _geometry_store
+    if _geometry_store is not None and not _geometry_store.owner:
+        _geometry_store.close()
+    _geometry_store = SharedGeometryStore.attach(name, lock) if name else None
+
+
+def _layer_geometry(lp: LayerParams) -> Tuple[np.ndarray, Tuple[float, float, float]]:
+    # base conv3d path + center, from the attached store when it has them.
+    # Copied out: another worker's miss may evict the slot during the render.
+    if _geometry_store is not None:
+        g = _geometry_store.get(lp, copy=True)
+        if g is None and _geometry_store.writable:
+            _geometry_store.put(lp)
+            g = _geometry_store.get(lp, copy=True)
+        if g is not None:
+            return g.p3d, g.center
+    xyz = _frozen_path3d(_layer_key(lp))
+    return xyz, _center_array3d(xyz)
+
+
+def _render_png_job(job: Tuple[str, str, dict]) -> None:
+    render_png_from_txtcsv(job[0], job[1], **job[2])
+
+
+def render_png_processes(
+    jobs: Iterable[Tuple[str, str]],
+    processes: Optional[int] = None,
+    store_capacity: int = 4096,
+    errors: Optional[list] = None,
+    **render_kwargs,
+) -> int:
+    """
+    Renders (txtcsv, out_path) jobs on a process pool whose workers share one
+    SharedGeometryStore: a worker that misses a layer builds and inserts it
+    under the store's lock, so each distinct layer is built about once for
+    the whole pool. errors works as in render_png_batch.
+    """
+    jobs = list(jobs)
+    store = SharedGeometryStore.create(store_capacity)
+    try:
+        with multiprocessing.Pool(
+            processes, initializer=attach_geometry_store, initargs=(store.name, store.lock)
+        ) as pool:
+            count = 0
+            if errors is None:
+                for _ in pool.imap_unordered(_render_png_job, [(t, o, render_kwargs) for t, o in jobs], chunksize=4):
+                    count += 1
+                return count
+            results = pool.imap(_render_png_job_checked, [(t, o, render_kwargs) for t, o in jobs], chunksize=4)
+            for i, err in enumerate(results):
+                if err is None:
+                    count += 1
+                else:
+                    errors.append((i, err))
+        return count
+    finally:
+        store.close()
+        store.unlink()
+
+
+# ----------------------------
+# Memory-mapped shape corpus (fixed-stride float32 records)
+# ----------------------------
+#
+# File layout (little endian):
+#   header  CORPUS_HEADER_SIZE bytes: magic, version, record count, record
+#           stride, then a field table of (name, byte offset, float count)
+#   records count * stride bytes, one per shape:
+#           params   16 floats: p0..p9, lp, fp, lw, as_, lc, fc (colors as 24-bit ints)
+#           profile  25 x 2 floats: get_path x / y
+#           vertices V x 3 floats: the conv3d path (x, y, z)
+
+CORPUS_MAGIC = b"INKCORP1"
+CORPUS_VERSION = 1
+CORPUS_HEADER_SIZE = 256
+_CORPUS_HEAD = np.dtype([("magic", "S8"), ("version", "<u4"), ("stride", "<u4"), ("count", "<u8")])
+_CORPUS_FIELD = np.dtype([("name", "S16"), ("offset", "<u4"), ("floats", "<u4")])
+
+
+def _corpus_record_dtype() -> np.dtype:
+    slices, m, rings = ShapeInkei.conv3d_layout()
+    vertices = slices * m + len(rings) * slices * 4
+    return np.dtype([
+        ("params", "<f4", (16,)),
+        ("profile", "<f4", (ShapeInkei.iMainEd + 1, 2)),
+        ("vertices", "<f4", (vertices, 3)),
+    ])
+
+
+def _color_int(hex6: str) -> int:
+    try:
+        return int((hex6 or "").strip().lstrip("#")[:6], 16)
+    except ValueError:
+        return 0
+
+
+def _corpus_params(layers: List[LayerParams]) -> np.ndarray:
+    return np.array(
+        [
+            [lp.p0, lp.p1, lp.p2, lp.p3, lp.p4, lp.p5, lp.p6, lp.p7, lp.p8, lp.p9,
+             lp.lp, lp.fp, lp.lw, lp.as_, _color_int(lp.lc), _color_int(lp.fc)]
+            for lp in layers
+        ],
+        dtype=np.float64,
+    ).reshape(-1, 16)
+
+
+def _write_corpus_header(fh, dtype: np.dtype, count: int) -> None:
+    head = np.zeros(1, dtype=_CORPUS_HEAD)
+    head[0] = (CORPUS_MAGIC, CORPUS_VERSION, dtype.itemsize, count)
+    fields = np.zeros(len(dtype.names), dtype=_CORPUS_FIELD)
+    for i, name in enumerate(dtype.names):
+        sub, offset = dtype.fields[name][:2]
+        fields[i] = (name.encode("ascii"), offset, sub.itemsize // 4)
+    raw = head.tobytes() + np.uint32(len(fields)).tobytes() + fields.tobytes()
+    fh.seek(0)
+    fh.write(raw.ljust(CORPUS_HEADER_SIZE, b"\0"))
+
+
+def _read_corpus_header(path: str) -> Tuple[int, int]:
+    with open(path, "rb") as fh:
+        raw = fh.read(CORPUS_HEADER_SIZE)
+    if len(raw) < CORPUS_HEADER_SIZE:
+        raise ValueError(f"Truncated corpus header: {path}")
+    head = np.frombuffer(raw, dtype=_CORPUS_HEAD, count=1)[0]
+    if head["magic"] != CORPUS_MAGIC or head["version"] != CORPUS_VERSION:
+        raise ValueError(f"Not a shape corpus (or unsupported version): {path}")
+    n_fields = int(np.frombuffer(raw, dtype="<u4", count=1, offset=_CORPUS_HEAD.itemsize)[0])
+    fields = np.frombuffer(raw, dtype=_CORPUS_FIELD, count=n_fields, offset=_CORPUS_HEAD.itemsize + 4)
+    dtype = _corpus_record_dtype()
+    for name, offset, floats in fields.tolist():
+        sub, want = dtype.fields[name.decode("ascii")][:2]
+        if offset != want or floats != sub.itemsize // 4:
+            raise ValueError(f"Corpus field layout mismatch ({name!r}): {path}")
+    if int(head["stride"]) != dtype.itemsize:
+        raise ValueError(f"Corpus record stride mismatch: {path}")
+    return int(head["count"]), int(head["stride"])
+
+
+def _fill_corpus_chunk(rec: np.ndarray, params: np.ndarray) -> np.ndarray:
+    # pole rows are stored clamped; dropped rows keep their params, NaN geometry
+    p, flags = sanitize_params(params)
+    xs, ys = _checked_profiles(p, flags)
+    drop = (flags & PARAM_DROP) != 0
+    p[drop] = params[drop]
+    with np.errstate(over="ignore"):
+        rec["params"] = p
+    rec["profile"][..., 0] = xs
+    rec["profile"][..., 1] = ys
+    rec["vertices"] = conv3d_batch(xs, ys)
+    if drop.any():
+        rec["profile"][drop] = np.nan
+        rec["vertices"][drop] = np.nan
+    return flags
+
+
+def build_shape_corpus(
+    path: str,
+    layers: List[LayerParams],
+    workers: Optional[int] = None,
+    chunk_size: int = 4096,
+    errors: Optional[list] = None,
+) -> int:
+    """
+    Appends layers to the corpus at path (creates it if missing) and returns
+    the new record count. Chunks are computed on a thread pool straight into
+    the mapped file; the header count is only bumped once they are written.
+    Layers dropped by get_path_checked are stored with NaN profile / vertices
+    and reported (by layer index) to errors when given.
+    """
+    dtype = _corpus_record_dtype()
+    params = _corpus_params(layers)
+    if not os.path.exists(path):
+        with open(path, "wb") as fh:
+            _write_corpus_header(fh, dtype, 0)
+    count, _ = _read_corpus_header(path)
+
+    total = count + len(params)
+    with open(path, "r+b") as fh:
+        fh.truncate(CORPUS_HEADER_SIZE + total * dtype.itemsize)
+    if len(params):
+        rec = np.memmap(path, dtype=dtype, mode="r+", offset=CORPUS_HEADER_SIZE + count * dtype.itemsize,
+                        shape=(len(params),))
+        starts = range(0, len(params), chunk_size)
+        with ThreadPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+            flags = list(pool.map(lambda i: _fill_corpus_chunk(rec[i:i + chunk_size], params[i:i + chunk_size]), starts))
+        if errors is not None:
+            errors.extend(param_errors(np.concatenate(flags)))
+        rec.flush()
+        del rec
+    with open(path, "r+b") as fh:
+        _write_corpus_header(fh, dtype, total)
+    return total
+
+
+class ShapeCorpus:
+    """
+    Read-only memory map of a corpus file. params / profile / vertices are
+    NumPy views straight into the file, no parsing: (N, 16), (N, 25, 2) and
+    (N, V, 3) float32.
+    """
+
+    PARAM_FIELDS = ("p0", "p1", "p2", "p3", "p4", "p5", "p6", "p7", "p8", "p9", "lp", "fp", "lw", "as_")
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        count, stride = _read_corpus_header(path)
+        # records past the header count belong to an unfinished append
+        count = min(count, (os.path.getsize(path) - CORPUS_HEADER_SIZE) // stride)
+        self.records = np.memmap(path, dtype=_corpus_record_dtype(), mode="r", offset=CORPUS_HEADER_SIZE,
+                                 shape=(count,)) if count else np.zeros(0, dtype=_corpus_record_dtype())
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    @property
+    def params(self) -> np.ndarray:
+        return self.records["params"]
+
+    @property
+    def profile(self) -> np.ndarray:
+        return self.records["profile"]
+
+    @property
+    def vertices(self) -> np.ndarray:
+        return self.records["vertices"]
+
+    def layer(self, i: int) -> LayerParams:
+        row = self.params[i].tolist()
+        lp = LayerParams(**dict(zip(self.PARAM_FIELDS, row)))
+        lp.lc = f"{int(row[14]):06X}"
+        lp.fc = f"{int(row[15]):06X}"
+        return lp
+
+    def path2d(self, i: int) -> Path2D:
+        prof = self.profile[i].astype(np.float64)
+        return Path2D(prof[:, 0].tolist(), prof[:, 1].tolist())
+
+    def path3d(self, i: int) -> Path3D:
+        v = self.vertices[i].astype(np.float64)
+        return Path3D(v[:, 0].tolist(), v[:, 1].tolist(), v[:, 2].tolist())
+
+
+# ----------------------------
+# Interactive viewer (port of clsAnime.sbClick / sbClickDrawNingen)
+# ----------------------------
+
+class Viewer:
+    """
+    Keeps the geometry, perspective and a pre-drawn stage for one txtCsv and
+    renders single frames into a reused RGBA buffer. render_frame() is the
+    per-frame entry point; click() ports the 6x8 click grid of the site
+    (rotate by 45 degree steps, jump to auto views, toggle the piston).
+    """
+
+    CLICK_COLS = 6
+    CLICK_ROWS = 8
+    view_interval_ms = 50  # clsAnime.iViewInterval
+
+    def __init__(
+        self,
+        txtcsv: str,
+        size: int = 640,
+        background_hex: str = "111111",
+        grid_hex: str = "444444",
+        curve_steps: int = 24,
+        cull_backfaces: bool = False,
+        lod: bool = False,
+        fill: bool = False,
+        errors: Optional[list] = None,  # per-layer report (sanitize_layers)
+    ) -> None:
+        self.layers = _parse_render_layers(txtcsv, errors)
+        if not self.layers:
+            raise ValueError("No layers parsed from txtCsv")
+        self.size = size
+        self.cull_backfaces = cull_backfaces
+        self.fill = fill
+        self.stage_w = float(ShapeInkei.iStageWidth)
+        scale_a = size * 0.9375
+
+        self._paths: List[np.ndarray] = []
+        self._opens: List[np.ndarray] = []
+        self._centers: List[Tuple[float, float, float]] = []
+        # per layer (slices, flatten steps); lod=True picks them from LOD_LEVELS
+        self._lod_specs: List[Tuple[Optional[int], int]] = []
+        persp_size = 1.0
+        for lp in self.layers:
+            geo = LodGeometry(lp)
+            p3d = geo.path3d()
+            self._centers.append(Morph.center_path3d(p3d))
+            persp_size = max(persp_size, Morph.get_perspective_size3d(size, p3d, self.stage_w))
+            level = geo.level_for(scale_a, self.stage_w) if lod else None
+            slices, steps = (None, curve_steps) if level is None else LOD_LEVELS[level][1:]
+            p3d = geo.path3d(level)
+            open3d = geo.path3d(level, mode="click")
+            self._paths.append(np.stack([p3d.x, p3d.y, p3d.z], axis=1))
+            self._opens.append(np.stack([open3d.x, open3d.y, open3d.z], axis=1))
+            self._lod_specs.append((slices, steps))
+        self.perspective_d = 2.0 * persp_size
+        self._styles = [
+            (_hex_to_rgba(lp.lc, lp.lp / 100.0), max(1, int(round(lp.lw)))) for lp in self.layers
+        ]
+
+        self._stage = Image.new("RGBA", (size, size), (0, 0, 0, 0))
+        _draw_background_with_grid(self._stage, background_hex, grid_hex, stage_width=ShapeInkei.iStageWidth)
+        self._frame = self._stage.copy()
+
+        # clsAnime state
+        self.angle = (0.0, float(ShapeInkei.aiAutoY[0]), 0.0)
+        self.piston = 0.0
+        self._click_insert = False
+
+    def render_frame(self, angle_x: float, angle_y: float, angle_z: float, piston: float = 0.0) -> bytes:
+        """Draws one frame and returns it as raw RGBA bytes (size*size*4)."""
+        self._frame.paste(self._stage, (0, 0))
+        scale_a = self.size * 0.9375
+        half = self.size / 2.0
+        kernels = get_kernels()
+        for li in range(len(self.layers)):
+            xyz = self._paths[li]
+            if piston != 0:
+                # clsShapeInkei.fnMorphDemo3d: path -> open shape
+                xyz = xyz + (self._opens[li] - xyz) * piston
+            cx, cy, cz = self._centers[li]
+            pts = kernels.project(
+                scale_a, xyz, self.stage_w, self.perspective_d, half, half,
+                cx, cy, cz, angle_x, angle_y, angle_z, 1.0, mode="c",
+            )
+            slices, steps = self._lod_specs[li]
+            if self.fill:
+                lp = self.layers[li]
+                fill_silhouette(self._frame, pts, lp.fc, lp.fp / 100.0, slices)
+            segs = _flatten_cubic_segments(pts, steps)
+            if self.cull_backfaces:
+                segs = segs[_backface_segment_mask(
+                    xyz, (cx, cy, cz), angle_x, angle_y, angle_z, self.perspective_d, scale_a / self.stage_w,
+                    slices,
+                )]
+            rgba, width_px = self._styles[li]
+            _stroke_layer(self._frame, segs, rgba, width_px, kernels)
+        self.angle = (angle_x, angle_y, angle_z)
+        self.piston = piston
+        return self._frame.tobytes()
+
+    @property
+    def image(self) -> Image.Image:
+        # last rendered frame (shared buffer, copy it to keep)
+        return self._frame
+
+    def click(self, col: int, row: int) -> List[Tuple[float, float, float, float]]:
+        """
+        Port of clsAnime.sbClick: returns the eased (angle_x, angle_y, angle_z,
+        piston) pose for every frame of the transition; the viewer state ends
+        on the last pose once those frames are rendered.
+        """
+        old_x, old_y, old_z = ((a + 3600) % 360 for a in self.angle)
+        old_piston = self.piston
+        auto = 0
+        new_piston = -1.0
+        fx = 0
+        dy = 0
+        if col in (2, 3) and row in (3, 4):
+            new_piston = 0.0 if self._click_insert else 1.0
+            self._click_insert = not self._click_insert
+        elif len(self.layers) != 1 or row not in (0, 1):
+            fx = {0: -4, 1: -2, 2: -1, 5: 1, 6: 2, 7: 4}.get(row, 0)
+            dy = {0: -2, 1: -1, 4: 1, 5: 2}.get(col, 0)
+        else:
+            auto = {0: 1, 1: 1, 2: 2, 3: 2, 4: 3, 5: 3}.get(col, 0)
+
+        new_x = old_x + 45 * fx
+        new_y = old_y + 45 * dy
+        new_z = old_z
+        if 1 <= auto <= 3:
+            new_x = (ShapeInkei.aiAutoX[auto] + 3600) % 360
+            new_y = (ShapeInkei.aiAutoY[auto] + 3600) % 360
+            new_z = (ShapeInkei.aiAutoZ[auto] + 3600) % 360
+            # take the short way round (+-180)
+            if old_x - new_x > 180:
+                new_x += 360
+            if old_y - new_y > 180:
+                new_y += 360
+            if old_z - new_z > 180:
+                new_z += 360
+            if new_x - old_x > 180:
+                new_x -= 360
+            if new_y - old_y > 180:
+                new_y -= 360
+            if new_z - old_z > 180:
+                new_z -= 360
+        if new_piston < 0:
+            new_piston = old_piston
+
+        frame_cnt = max(1, int(math.floor(1000 * self.layers[0].as_ / self.view_interval_ms / 4)))
+        poses = []
+        for i in range(frame_cnt):
+            t = _ease_cos_01((i + 1) / frame_cnt)
+            poses.append((
+                old_x + (new_x - old_x) * t,
+                old_y + (new_y - old_y) * t,
+                old_z + (new_z - old_z) * t,
+                old_piston + (new_piston - old_piston) * t,
+            ))
+        return poses
+
+    def click_at(self, x: float, y: float) -> List[Tuple[float, float, float, float]]:
+        # pixel position -> click grid cell
+        col = min(self.CLICK_COLS - 1, max(0, int(x * self.CLICK_COLS / self.size)))
+        row = min(self.CLICK_ROWS - 1, max(0, int(y * self.CLICK_ROWS / self.size)))
+        return self.click(col, row)
+
+
+
+# ----------------------------
+# Render regression suite (stored baselines, tiled SSIM per frame)
+# ----------------------------
+
+_REGRESSION_TXTCSV = "~p0220~p1143~p216~p36~p41~p5119~p675~lcFF3737~q0THE GLITTER APACHE REVOLVER~q1A&#39;s Penis~q2Ability : 30%"
+_REGRESSION_LAYERS = _REGRESSION_TXTCSV + "!~p0150~p1100~p230~p320~p460~p5140~p690~lc30FFFF~lw3~fc30A0FF~fp35"
+_REGRESSION_GIF = {"size": 160, "fps": 4, "seconds_per_layer": 4, "supersample": 1}
+
+# (name, "png" | "gif", txtcsv, keyword arguments of render_png_from_txtcsv / render_gif_from_txtcsv)
+REGRESSION_CORPUS: List[Tuple[str, str, str, dict]] = [
+    ("default", "png", "", {}),
+    ("glitter", "png", _REGRESSION_TXTCSV, {}),
+    ("two_layers_side", "png", _REGRESSION_LAYERS, {"angles_deg": (40.0, -60.0, 10.0)}),
+    ("fill_labels", "png", _REGRESSION_LAYERS, {"fill": True, "labels": True}),
+    ("cull_lod", "png", _REGRESSION_LAYERS, {"cull_backfaces": True, "lod": True}),
+    ("supersample", "png", _REGRESSION_TXTCSV, {"supersample": 2, "size": 320}),
+    ("anim", "gif", _REGRESSION_LAYERS, dict(_REGRESSION_GIF)),
+    ("anim_all_fill", "gif", _REGRESSION_LAYERS, dict(_REGRESSION_GIF, show_all_layers=True, fill=True)),
+]
+
+
+@dataclass
+class RegressionResult:
+    name: str
+    frame: int  # -1: the frame counts differ
+    ssim: float  # mean SSIM over the frame
+    worst_tile: float  # lowest mean SSIM of any tile x tile block
+    max_abs_diff: int
+    passed: bool
+
+
+def _box_mean(a: np.ndarray, radius: int) -> np.ndarray:
+    # mean over (2r+1)^2 windows on the last two axes (valid region only), via integral images
+    w = 2 * radius + 1
+    c = np.cumsum(np.cumsum(a, axis=-1), axis=-2)
+    c = np.pad(c, [(0, 0)] * (a.ndim - 2) + [(1, 0), (1, 0)])
+    return (c[..., w:, w:] - c[..., :-w, w:] - c[..., w:, :-w] + c[..., :-w, :-w]) / (w * w)
+
+
+def ssim_map(a: np.ndarray, b: np.ndarray, radius: int = 3) -> np.ndarray:
+    """
+    SSIM (Wang et al. 2004, uniform (2r+1)^2 window) between two stacks of
+    0..255 images shaped (..., H, W); returns the (..., H-2r, W-2r) map.
+    """
+    a = np.asarray(a, dtype=np.float64)
+    b = np.asarray(b, dtype=np.float64)
+    c1 = (0.01 * 255.0) ** 2
+    c2 = (0.03 * 255.0) ** 2
+    mu_a = _box_mean(a, radius)
+    mu_b = _box_mean(b, radius)
+    var_a = _box_mean(a * a, radius) - mu_a * mu_a
+    var_b = _box_mean(b * b, radius) - mu_b * mu_b
+    cov = _box_mean(a * b, radius) - mu_a * mu_b
+    return ((2 * mu_a * mu_b + c1) * (2 * cov + c2)) / ((mu_a * mu_a + mu_b * mu_b + c1) * (var_a + var_b + c2))
+
+
+def frame_similarity(
+    a: np.ndarray,
+    b: np.ndarray,
+    tile: int = 32,
+    radius: int = 3,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Compares two (F, H, W, 3) uint8 frame stacks in one vectorized pass.
+    Returns per-frame (mean SSIM, worst tile SSIM, max abs channel diff).
+    SSIM is taken per RGB channel (so palette shifts count) and averaged;
+    the tile score catches a small local change a whole-frame mean hides.
+    """
+    a = np.asarray(a)
+    b = np.asarray(b)
+    smap = ssim_map(np.moveaxis(a, -1, 1), np.moveaxis(b, -1, 1), radius).mean(axis=1)
+    n, h, w = smap.shape
+    th, tw = max(1, h // tile), max(1, w // tile)
+    tiles = smap[:, : th * (h // th), : tw * (w // tw)].reshape(n, th, h // th, tw, w // tw).mean(axis=(2, 4))
+    max_abs = np.abs(a.astype(np.int16) - b.astype(np.int16)).reshape(n, -1).max(axis=1)
+    return smap.reshape(n, -1).mean(axis=1), tiles.reshape(n, -1).min(axis=1), max_abs
+
+
+def _read_frames(path: str) -> np.ndarray:
+    # every frame of a PNG / GIF as an (F, H, W, 3) uint8 stack
+    with Image.open(path) as im:
+        frames = []
+        for i in range(getattr(im, "n_frames", 1)):
+            im.seek(i)
+            frames.append(np.asarray(im.convert("RGB")))
+    return np.stack(frames)
+
+
+def _render_regression_case(kind: str, txtcsv: str, kwargs: dict, out_path: str) -> None:
+    if kind == "png":
+        render_png_from_txtcsv(txtcsv, out_path, **kwargs)
+    elif kind == "gif":
+        render_gif_from_txtcsv(txtcsv, out_path, **kwargs)
+    else:
+        raise ValueError(f"Unknown regression case kind {kind!r}")
+
+
+def _regression_baseline_job(job: Tuple[str, str, str, str, dict]) -> str:
+    out_dir, name, kind, txtcsv, kwargs = job
+    path = os.path.join(out_dir, f"{name}.{kind}")
+    _render_regression_case(kind, txtcsv, kwargs, path)
+    return path
+
+
+def _regression_check_job(job: Tuple[str, str, str, str, dict, float, int]) -> List[RegressionResult]:
+    baseline_dir, name, kind, txtcsv, kwargs, threshold, tile = job
+    expected = _read_frames(os.path.join(baseline_dir, f"{name}.{kind}"))
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, f"{name}.{kind}")
+        _render_regression_case(kind, txtcsv, kwargs, path)
+        actual = _read_frames(path)
+    if expected.shape != actual.shape:
+        return [RegressionResult(name, -1, math.nan, math.nan, 255, False)]
+    ssim, worst, max_abs = frame_similarity(expected, actual, tile)
+    return [
+        RegressionResult(name, i, float(ssim[i]), float(worst[i]), int(max_abs[i]), bool(worst[i] >= threshold))
+        for i in range(len(ssim))
+    ]
+
+
+def _map_jobs(fn: Callable, jobs: list, processes: Optional[int]) -> Iterator:
+    # in order; inline for one process
+    if processes == 1 or len(jobs) <= 1:
+        yield from map(fn, jobs)
+        return
+    with multiprocessing.Pool(processes) as pool:
+        yield from pool.imap(fn, jobs)
+
+
+def write_regression_baselines(
+    out_dir: str,
+    corpus: Optional[List[Tuple[str, str, str, dict]]] = None,
+    processes: Optional[int] = None,
+) -> List[str]:
+    """Renders every corpus case into out_dir/<name>.<kind> with today's renderer."""
+    os.makedirs(out_dir, exist_ok=True)
+    jobs = [(out_dir, *case) for case in (REGRESSION_CORPUS if corpus is None else corpus)]
+    return list(_map_jobs(_regression_baseline_job, jobs, processes))
+
+
+def run_regression_suite(
+    baseline_dir: str,
+    corpus: Optional[List[Tuple[str, str, str, dict]]] = None,
+    threshold: float = 0.97,
+    tile: int = 32,
+    processes: Optional[int] = None,
+) -> List[RegressionResult]:
+    """
+    Re-renders every corpus case and compares it frame by frame with the
+    baselines from write_regression_baselines. Returns one RegressionResult
+    per frame; a frame fails when any tile's SSIM drops below threshold.
+    Cases render in parallel on a process pool.
+    """
+    jobs = [(baseline_dir, *case, threshold, tile) for case in (REGRESSION_CORPUS if corpus is None else corpus)]
+    return [r for results in _map_jobs(_regression_check_job, jobs, processes) for r in results]
+
 if __name__ == "__main__":
     txtcsv = "~p0220~p1143~p216~p36~p41~p5119~p675~lcFF3737~q0THE GLITTER APACHE REVOLVER~q1A&#39;s Penis~q2Ability : 30%"
 
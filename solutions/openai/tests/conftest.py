@@ -0,0 +1,24 @@
+import importlib.util
+import os
+import sys
+
+import pytest
+
+SOLUTION_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "gpt5.2.py")
+
+
+def _load_solution():
+    # gpt5.2.py isn't an importable module name; register it once so pickling
+    # (process pools) finds its functions
+    name = "gpt5_2"
+    if name not in sys.modules:
+        spec = importlib.util.spec_from_file_location(name, SOLUTION_PATH)
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[name] = module
+        spec.loader.exec_module(module)
+    return sys.modules[name]
+
+
+@pytest.fixture(scope="session")
+def g():
+    return _load_solution()
@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+
+STRAIGHT = "~p0140~p1140~p20~p30~p40"
+CURVED = "~p0200~p1100~p240~p330~p410"
+# views across the shaft axis (z): the eye looks at the side of the surface
+VIEWS = [(ax, ay) for ax in (0, 35, 120) for ay in (90, -90)]
+
+
+def _setup(g, txtcsv):
+    xyz = g._frozen_path3d(g._layer_key(g.parse_txtcsv_layers(txtcsv)[0]))
+    slices, m, _ = g.ShapeInkei.conv3d_layout()
+    grid = xyz[: slices * m].reshape(slices, m, 3)
+    radial = grid - grid.mean(axis=0, keepdims=True)
+    return xyz, g._center_array3d(xyz), slices, m, radial
+
+
+def _slice_facing(g, radial, slices, m, ax, ay):
+    # cosine between each slice-curve segment's outward radius and the view direction (eye far away)
+    _, _, u = g.Morph.rotate_xyz_array(radial.reshape(-1, 3), ax, ay, 0)
+    toward = (-u).reshape(slices, m) / np.maximum(np.linalg.norm(radial, axis=2), 1e-9)
+    k = np.arange(m // 4)
+    return 0.5 * (toward[:, 4 * k + 1] + toward[:, 4 * k + 2])
+
+
+@pytest.mark.parametrize("txtcsv", [STRAIGHT, CURVED])
+@pytest.mark.parametrize("ax, ay", VIEWS)
+def test_mask_keeps_near_side(g, txtcsv, ax, ay):
+    xyz, center, slices, m, radial = _setup(g, txtcsv)
+    keep = g._backface_segment_mask(xyz, center, ax, ay, 0, 1e6, 1.0)
+    assert keep.shape == (len(xyz) // 4,)
+    facing = _slice_facing(g, radial, slices, m, ax, ay)
+    slice_keep = keep[: slices * (m // 4)].reshape(slices, m // 4)
+    assert slice_keep[facing > 0.5].all()
+    if txtcsv == STRAIGHT:
+        assert not slice_keep[facing < -0.5].any()
+    # seen from the opposite side, the near and far slices swap
+    back = g._backface_segment_mask(xyz, center, ax, ay + 180, 0, 1e6, 1.0)
+    assert back[: slices * (m // 4)].reshape(slices, m // 4)[facing < -0.5].all()
+
+
+def test_mask_follows_lod_slices(g):
+    lp = g.parse_txtcsv_layers(STRAIGHT)[0]
+    for slices in (6, 24):
+        xyz = g._frozen_path3d(g._layer_key(lp), slices)
+        keep = g._backface_segment_mask(xyz, g._center_array3d(xyz), 0, 90, 0, 1e6, 1.0, slices)
+        assert keep.shape == (len(xyz) // 4,)
+        assert 0.3 < keep.mean() < 0.8
@@ -0,0 +1,26 @@
+import pytest
+
+
+def test_encrypted_link_without_separators_is_undecodable(g):
+    lossy = g.encode_shared_link("p0150~p1120~lcFF3737")  # '~' stripped: "p0150p1120lcFF3737"
+    single = g.encode_shared_link("p0180!p0160")  # one key per layer survives encryption
+    assert g.is_lossy_link_text(g.decode_shared_link(lossy))
+    assert not g.is_lossy_link_text(g.decode_shared_link(single))
+
+    errors = []
+    stats = g.CorpusStats().update([lossy, single, lossy + "\n"], decode_links=True, errors=errors)
+    assert errors == [(0, "undecodable_link"), (2, "undecodable_link")]
+    assert (stats.lines, stats.undecodable, stats.layers) == (3, 2, 2)
+    s = stats.summary()
+    assert s["undecodable"] == 2
+    assert s["params"]["p0"]["count"] == 2
+    assert s["params"]["p0"]["mean"] == pytest.approx(170.0)
+    assert s["params"]["p1"]["mean"] == pytest.approx(g.ShapeInkei.iDefP1)
+
+    merged = g.CorpusStats().update([lossy], decode_links=True).merge(stats)
+    assert merged.undecodable == 3 and merged.lines == 4
+
+
+def test_plain_txtcsv_lines_are_never_undecodable(g):
+    stats = g.CorpusStats().update(["~p0150~p1120", "p0150p1120"])
+    assert stats.undecodable == 0 and stats.layers == 2
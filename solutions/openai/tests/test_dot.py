@@ -0,0 +1,30 @@
+import numpy as np
+import pytest
+
+N_X, N_Y = 13, 11  # 143 bits: not a multiple of 6, so the last character is padded
+
+
+def _bits(n, seed=44):
+    return np.random.default_rng(seed).integers(0, 2, (n, N_X * N_Y)).astype(np.uint8)
+
+
+def test_bit2code_round_trip(g):
+    bits = _bits(64)
+    codes = g.dot_bits_to_codes(bits)
+    assert codes == [g.Dot.bit2code("".join(map(str, row))) for row in bits.tolist()]
+    np.testing.assert_array_equal(g.dot_codes_to_bits(codes, N_X * N_Y), bits)
+    for code, row in zip(codes, bits.tolist()):
+        assert g.Dot.code2bit(code)[: N_X * N_Y] == "".join(map(str, row))
+
+
+@pytest.mark.parametrize("chunk_size", [7, 8192])
+def test_decode_matches_bit2xy_and_encodes_back(g, chunk_size):
+    codes = g.dot_bits_to_codes(_bits(40)) + ["", "zz", "!?"]  # short and out-of-alphabet codes
+    offsets, xs, ys = g.decode_dot_codes(codes, N_X, N_Y, chunk_size=chunk_size)
+    for i, code in enumerate(codes):
+        ref_x, ref_y = g.Dot.bit2xy(g.Dot.code2bit(code), N_X, N_Y)
+        assert xs[offsets[i]:offsets[i + 1]].tolist() == ref_x
+        assert ys[offsets[i]:offsets[i + 1]].tolist() == ref_y
+    again = g.encode_dot_codes(offsets, xs, ys, N_X, N_Y, chunk_size=chunk_size)
+    assert again[:40] == codes[:40]
+    assert g.decode_dot_codes(again, N_X, N_Y)[0].tolist() == offsets.tolist()
@@ -0,0 +1,109 @@
+import multiprocessing
+
+import numpy as np
+import pytest
+from conftest import _load_solution
+
+
+def _keys(n, seed=37):
+    rng = np.random.default_rng(seed)
+    p = np.column_stack([
+        rng.integers(80, 220, n), rng.integers(80, 180, n), rng.integers(-30, 30, n),
+        rng.integers(-20, 20, n), rng.integers(-15, 15, n), rng.integers(85, 140, n),
+        rng.integers(80, 130, n), np.zeros((n, 3)),
+    ]).astype(float)
+    return [tuple(row) for row in np.unique(p, axis=0).tolist()]
+
+
+def _assert_geometry(g, geom, key):
+    ref = g._frozen_path3d(key)
+    np.testing.assert_array_equal(geom.p3d, ref)
+    np.testing.assert_array_equal(geom.open3d, g._frozen_path3d(key, None, "click"))
+    assert geom.center == g._center_array3d(ref)
+
+
+@pytest.fixture
+def store(g):
+    stores = []
+
+    def make(capacity):
+        s = g.SharedGeometryStore.create(capacity)
+        stores.append(s)
+        return s
+
+    yield make
+    for s in stores:
+        s.close()
+        s.unlink()
+
+
+def test_put_get_evict(g, store):
+    keys = _keys(5)
+    s = store(3)
+    slots = [s.put(k) for k in keys]
+    assert slots == [0, 1, 2, 0, 1]  # FIFO
+    assert s.put(keys[4]) == 1  # already stored
+    assert len(s) == 3
+    assert keys[0] not in s and keys[1] not in s and s.get(keys[0]) is None
+    for k in keys[2:]:
+        _assert_geometry(g, s.get(k), k)
+        _assert_geometry(g, s.get(k, copy=True), k)
+
+
+def test_hash_table_survives_many_evictions(g, store):
+    keys = _keys(300)
+    s = store(16)
+    for k in keys:
+        s.put(k)
+        assert k in s
+    assert [s._find(k) >= 0 for k in keys] == [False] * (len(keys) - 16) + [True] * 16
+    assert (s._table >= 0).sum() == 16
+
+
+def test_attach_reads_and_needs_lock_to_write(g, store):
+    keys = _keys(3)
+    s = store(4)
+    s.put(keys[0])
+    reader = g.SharedGeometryStore.attach(s.name)
+    try:
+        _assert_geometry(g, reader.get(keys[0]), keys[0])
+        with pytest.raises(ValueError):
+            reader.put(keys[1])
+    finally:
+        reader.close()
+    writer = g.SharedGeometryStore.attach(s.name, s.lock)
+    try:
+        writer.put(keys[1])
+    finally:
+        writer.close()
+    _assert_geometry(g, s.get(keys[1]), keys[1])
+
+
+def _worker_geometry(keys):
+    # runs in a pool worker attached with the store lock
+    g = _load_solution()
+    out = []
+    for k in keys:
+        xyz, center = g._layer_geometry(g.LayerParams(*k))
+        out.append(bool(np.array_equal(xyz, g._frozen_path3d(k))) and center == g._center_array3d(xyz))
+    return out
+
+
+@pytest.mark.parametrize("capacity, distinct", [(64, 24), (6, 24)])
+def test_workers_populate_misses(g, store, capacity, distinct):
+    keys = _keys(distinct)
+    s = store(capacity)
+    # every worker asks for every key, in different orders
+    rng = np.random.default_rng(distinct)
+    work = [[keys[i] for i in rng.permutation(len(keys))] for _ in range(8)]
+    ctx = multiprocessing.get_context("fork")
+    with ctx.Pool(4, initializer=g.attach_geometry_store, initargs=(s.name, s.lock)) as pool:
+        results = pool.map(_worker_geometry, work, chunksize=1)
+    assert all(all(r) for r in results)
+    inserted = int(s._header[3])
+    if capacity >= distinct:
+        assert inserted == len(keys)  # each miss inserted once, later workers hit
+        assert all(k in s for k in keys)
+    else:
+        assert inserted > capacity and len(s) == capacity  # evicted under contention
+    assert (s._table >= 0).sum() == len(s)
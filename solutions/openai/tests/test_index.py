@@ -0,0 +1,35 @@
+import numpy as np
+import pytest
+
+RECALL = 0.9
+
+
+def _params(n, seed=30):
+    rng = np.random.default_rng(seed)
+    lo = np.array([60, 60, -30, -20, -15, 85, 80])
+    hi = np.array([280, 200, 45, 40, 15, 140, 130])
+    return lo + (hi - lo) * rng.random((n, 7))
+
+
+def _recall(index, queries, k=20):
+    ids, _ = index.search(queries, k=k)
+    ref, _ = index.brute_force(queries, k=k)
+    return np.mean([len(set(a) & set(b)) / float(k) for a, b in zip(ids.tolist(), ref.tolist())])
+
+
+@pytest.mark.parametrize("first", [1, 5])
+def test_recall_after_small_first_insert(g, first):
+    p = _params(3000)
+    index = g.ShapeIndex()
+    index.add(p[:first])
+    index.add(p[first:])
+    assert _recall(index, p[:100]) >= RECALL
+
+
+def test_recall_one_row_at_a_time(g):
+    p = _params(1500)
+    index = g.ShapeIndex(fit_sample=1000)
+    ids = [int(index.add(row)[0]) for row in p]
+    assert ids == list(range(len(p)))
+    assert index._fit_size >= 1000
+    assert _recall(index, _params(100, seed=31)) >= RECALL
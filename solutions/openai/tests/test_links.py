@@ -0,0 +1,39 @@
+import pytest
+
+# (form text, token, decodeURI(fnDecryptionURI(token)) with '_' -> ' ', sbParam2Form text)
+# captured with node from common_0.js: token = fnEncryptionURI(encodeURI(text with ' ' -> '_'))
+JS_VECTORS = [
+    ("p0140~p1140", "q1251q2251", "p0140p1140", "p0140p1140"),
+    ("q0a b", "r1b_c", "q0a b", "q0a b"),
+    ("q0a\nb", "r1b~1Bc", "q0a\nb", "q0a\nb"),
+    ("50%~off", "61~36paa", "50%off", "50%off"),
+    ("Aa Zz_09", "Bb_Gg_10", "Aa Zz 09", "Aa Zz 09"),
+    ("lcFF3737~q0THE GLITTER", "mdAA4848r1UIF_HMJUUFS", "lcFF3737q0THE GLITTER", "lcFF3737q0THE GLITTER"),
+    ("p0-12.5~p2~~p3", "q1-23.6q3q4", "p0-12.5p2p3", "p0-12.5p2p3"),
+    ("日本語 テスト", "~F7~08~B6~F7~0D~BD~F9~BB~0F_~F4~94~97~F4~93~C0~F4~94~99", "日本語 テスト", "日本語 テスト"),
+    ("q1A&#39;s Penis~q2Ability : 30%", "r2B&#40;t_Qfojtr3Bcjmjuz_:_41~36", "q1A&#39;s Penisq2Ability : 30%", "q1A&"),
+]
+
+
+@pytest.mark.parametrize("text, token, raw, form", JS_VECTORS)
+def test_shared_link_matches_js(g, text, token, raw, form):
+    assert g.encode_shared_link(text) == token
+    assert g.decode_shared_link(token) == form
+    assert g.decode_shared_link("https://inkei.net/u3d/" + token) == form
+
+
+def test_transcode_lines_match_js(g):
+    texts = [v[0] for v in JS_VECTORS]
+    tokens = [v[1] for v in JS_VECTORS]
+    assert list(g.transcode_link_lines(texts, decode=False)) == tokens
+    assert list(g.transcode_link_lines(tokens, block_lines=4)) == [v[2] for v in JS_VECTORS]
+
+
+def test_transcode_keeps_line_alignment(g, tmp_path):
+    # an encoded newline decodes inside its own line, never into an extra one
+    assert list(g.transcode_link_lines(["r1b~1Bc", "zz"])) == ["q0a\nb", "yy"]
+    src = tmp_path / "links.txt"
+    out = tmp_path / "decoded.txt"
+    src.write_text("r1b~1Bc\nzz\nq1251q2251\n", encoding="utf-8")
+    assert g.transcode_link_file(str(src), str(out)) == 3
+    assert out.read_text(encoding="utf-8").splitlines() == ["q0a%0Ab", "yy", "p0140p1140"]
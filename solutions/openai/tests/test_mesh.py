@@ -0,0 +1,40 @@
+import io
+
+import numpy as np
+import pytest
+
+
+@pytest.fixture(scope="module")
+def mesh(g):
+    d = g.ShapeInkei
+    return g.revolve_mesh(d.get_path(150, 130, 20, 10, 5, 110, 95, 0, 0, 0), rings_per_segment=3, slices=10)
+
+
+def _write(g, writer, mesh):
+    fh = io.BytesIO()
+    writer(fh, mesh.vertices, mesh.indices)
+    return fh.getvalue()
+
+
+@pytest.mark.parametrize("fmt", ["obj", "stl"])
+def test_chunked_writes_match_single_chunk(g, mesh, monkeypatch, fmt):
+    writer = g._MESH_WRITERS[fmt]
+    whole = _write(g, writer, mesh)
+    monkeypatch.setattr(g, "MESH_WRITE_ROWS", 7)  # several chunks, ragged last one
+    assert _write(g, writer, mesh) == whole
+
+
+def test_obj_round_trip(g, mesh):
+    lines = _write(g, g._write_obj, mesh).decode("ascii").splitlines()
+    v = np.array([ln.split()[1:] for ln in lines if ln.startswith("v ")], dtype=np.float64)
+    f = np.array([ln.split()[1:] for ln in lines if ln.startswith("f ")], dtype=np.int64) - 1
+    np.testing.assert_allclose(v, mesh.vertices, atol=1e-6)
+    np.testing.assert_array_equal(f, mesh.indices)
+
+
+def test_stl_triangles(g, mesh):
+    data = _write(g, g._write_stl, mesh)
+    count = int(np.frombuffer(data[80:84], dtype="<u4")[0])
+    rec = np.frombuffer(data[84:], dtype=g._STL_DTYPE)
+    assert count == len(rec) == len(mesh.indices)
+    np.testing.assert_allclose(rec["v"], mesh.vertices[mesh.indices], rtol=1e-6, atol=1e-4)
@@ -0,0 +1,96 @@
+import numpy as np
+import pytest
+
+# closed-form / Gauss-Legendre metrics against a dense triangulation of the same
+# revolved surface P(u, a) = (M + sin(a) V, cos(a) |V|)
+DENSE_U = 256  # samples per cubic segment
+DENSE_A = 512  # samples around the axis
+RTOL = 1e-3
+
+
+def _cubic(ctrl, u):
+    mu = 1.0 - u
+    b = np.stack([mu ** 3, 3 * u * mu ** 2, 3 * u ** 2 * mu, u ** 3], axis=1)
+    return b @ ctrl
+
+
+def dense_reference(x, y):
+    # the paired cubics run base -> tip on both profile sides (indices 0..12 / 24..12)
+    u = np.linspace(0.0, 1.0, DENSE_U + 1)
+    mids, halves = [], []
+    for k in range(4):
+        li = [3 * k + j for j in range(4)]
+        ri = [24 - i for i in li]
+        left = _cubic(np.stack([x[li], y[li]], axis=1), u)
+        right = _cubic(np.stack([x[ri], y[ri]], axis=1), u)
+        sl = slice(0 if k == 0 else 1, None)
+        mids.append(0.5 * (left + right)[sl])
+        halves.append(0.5 * (right - left)[sl])
+    m = np.concatenate(mids)
+    v = np.concatenate(halves)
+    r = np.hypot(v[:, 0], v[:, 1])
+
+    a = np.arange(DENSE_A) * (2.0 * np.pi / DENSE_A)
+    s, c = np.sin(a)[None, :], np.cos(a)[None, :]
+    p = np.stack([m[:, :1] + s * v[:, :1], m[:, 1:] + s * v[:, 1:], c * r[:, None]], axis=-1)  # (U, A, 3)
+
+    q = np.roll(p, -1, axis=1)
+    tris = np.concatenate([
+        np.stack([p[:-1], p[1:], q[:-1]], axis=-2).reshape(-1, 3, 3),
+        np.stack([q[:-1], p[1:], q[1:]], axis=-2).reshape(-1, 3, 3),
+    ])
+    e1 = tris[:, 1] - tris[:, 0]
+    e2 = tris[:, 2] - tris[:, 0]
+    area = 0.5 * np.linalg.norm(np.cross(e1, e2), axis=1).sum()
+    # cones from the base center: the base disc lies in a plane through it, the tip ring collapses
+    apex = np.array([m[0, 0], m[0, 1], 0.0])
+    volume = abs(np.einsum("ij,ij->i", tris[:, 0] - apex, np.cross(tris[:, 1] - apex, tris[:, 2] - apex)).sum()) / 6.0
+    spine = np.hypot(*np.diff(m, axis=0).T).sum()
+    flat = p.reshape(-1, 3)
+    return {
+        "volume": volume,
+        "surface_area": area,
+        "base_area": np.pi * r[0] ** 2,
+        "spine_length": spine,
+        "bbox_min": flat.min(axis=0),
+        "bbox_max": flat.max(axis=0),
+    }
+
+
+def _params():
+    rng = np.random.default_rng(28)
+    n = 12
+    rows = np.column_stack([
+        rng.uniform(80, 220, n),   # p0 length
+        rng.uniform(80, 180, n),   # p1 circumference
+        rng.uniform(-40, 40, n),   # p2 shaft curve
+        rng.uniform(-40, 40, n),   # p3 shaft angle
+        rng.uniform(-40, 40, n),   # p4 glans angle
+        rng.uniform(70, 140, n),   # p5 shaft expansion
+        rng.uniform(70, 140, n),   # p6 glans expansion
+    ])
+    return np.vstack([[140, 140, 10, 10, 0, 100, 100], rows])
+
+
+@pytest.mark.parametrize("row", range(len(_params())))
+def test_profile_metrics_match_dense_reference(g, row):
+    p = _params()
+    xs, ys = g.ShapeInkei.get_path_batch(*p.T)
+    metrics = g.profile_metrics_batch(xs, ys, chunk_size=5)  # several chunks
+    ref = dense_reference(xs[row], ys[row])
+    for name in ("volume", "surface_area", "base_area", "spine_length"):
+        assert getattr(metrics, name)[row] == pytest.approx(ref[name], rel=RTOL), name
+    scale = np.abs(ref["bbox_max"] - ref["bbox_min"]).max()
+    np.testing.assert_allclose(metrics.bbox_min[row], ref["bbox_min"], atol=RTOL * scale)
+    np.testing.assert_allclose(metrics.bbox_max[row], ref["bbox_max"], atol=RTOL * scale)
+
+
+def test_layer_metrics_batch_masks_dropped_rows(g):
+    layers = g.parse_txtcsv_layers("~p0140~p1140!~p0150~p1120~p290")
+    layers.append(g.LayerParams(float("nan"), 140, 0, 0, 0, 100, 100, 0, 0, 0))
+    errors = []
+    m = g.layer_metrics_batch(layers, errors=errors)
+    ref = g.profile_metrics_batch(*g.ShapeInkei.get_path_batch(*g._layers_to_p_array(layers[:1]).T))
+    assert m.volume[0] == pytest.approx(ref.volume[0], rel=1e-12)
+    assert np.isfinite(m.volume[1]) and np.isnan(m.volume[2])
+    assert errors == [(1, "curve_clamped"), (2, "nonfinite")]
@@ -0,0 +1,46 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+TXTCSV = "~p0140~p1140~lw2!~p0170~p1120~p260~lp60~lcFFAA00"
+
+
+@pytest.mark.parametrize("kwargs", [{}, {"supersample": 2, "fill": True}, {"lod": True, "cull_backfaces": True}])
+def test_final_pass_matches_direct_render(g, kwargs):
+    passes = list(g.iter_progressive_images(TXTCSV, size=160, **kwargs))
+    assert [final for final, _ in passes] == [False] * (len(passes) - 1) + [True]
+    assert len(passes) == (3 if kwargs.get("supersample", 1) > 1 else 2)
+    ref = np.asarray(g.render_image_from_txtcsv(TXTCSV, size=160, **kwargs))
+    np.testing.assert_array_equal(np.asarray(passes[-1][1]), ref)
+    # passes are copies: the preview survives the later passes
+    assert not np.array_equal(np.asarray(passes[0][1]), ref)
+
+
+def test_render_progressive_callbacks(g):
+    seen = []
+    preview, future = g.render_progressive(TXTCSV, lambda image, final: seen.append(final), size=160, supersample=2)
+    final = future.result(timeout=30)
+    assert seen == [False, True]
+    ref = np.asarray(g.render_image_from_txtcsv(TXTCSV, size=160, supersample=2))
+    np.testing.assert_array_equal(np.asarray(final), ref)
+    assert preview.size == final.size
+
+
+def test_render_progressive_stops_when_callback_declines(g):
+    seen = []
+
+    def first_only(image, final):
+        seen.append(final)
+        return False
+
+    _, future = g.render_progressive(TXTCSV, first_only, size=160, supersample=2)
+    future.result(timeout=30)
+    assert seen == [False]
+
+
+def test_async_passes(g):
+    async def collect():
+        return [final async for final, _ in g.aiter_progressive_images(TXTCSV, size=96)]
+
+    assert asyncio.run(collect()) == [False, True]
@@ -0,0 +1,23 @@
+import numpy as np
+import pytest
+from PIL import Image
+
+TXTCSV = "~p0140~p1140~lw2!~p0170~p1120~p260~lp60~lcFFAA00"
+SIZES = [320, 160, 97, 160]  # odd size and a repeated one
+THRESHOLD = 0.97  # tiled SSIM, as the regression gate
+
+
+@pytest.mark.parametrize("kwargs", [{}, {"fill": True, "cull_backfaces": True}, {"supersample": 2}, {"lod": True}])
+def test_pyramid_matches_single_size_renders(g, tmp_path, kwargs):
+    outputs = [(size, str(tmp_path / f"{i}_{size}.png")) for i, size in enumerate(SIZES)]
+    # stroke_ref=None keeps lw in px at every size, like the single-size renders
+    assert g.render_png_pyramid(TXTCSV, outputs, stroke_ref=None, **kwargs) == [p for _, p in outputs]
+    for size, path in outputs:
+        got = np.asarray(Image.open(path).convert("RGB"))
+        ref = np.asarray(g.render_image_from_txtcsv(TXTCSV, size=size, **kwargs).convert("RGB"))
+        assert got.shape == (size, size, 3)
+        if size == max(SIZES):
+            np.testing.assert_array_equal(got, ref)  # same perspective as the direct render
+        else:
+            _, worst_tile, _ = g.frame_similarity(got[None], ref[None])
+            assert worst_tile[0] >= THRESHOLD, size
@@ -0,0 +1,42 @@
+"""
+Render regression gate: re-renders REGRESSION_CORPUS and compares every frame
+with the stored baselines in tests/regression/ (tiled SSIM, see
+run_regression_suite). After an intended rendering change, regenerate them
+with `python tests/test_regression.py` and commit the new images.
+"""
+import os
+
+import pytest
+from conftest import _load_solution
+
+BASELINE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "regression")
+THRESHOLD = 0.97
+
+
+def _case_results(g):
+    results = g.run_regression_suite(BASELINE_DIR, threshold=THRESHOLD, processes=1)
+    by_case = {}
+    for r in results:
+        by_case.setdefault(r.name, []).append(r)
+    return by_case
+
+
+@pytest.fixture(scope="module")
+def case_results(g):
+    return _case_results(g)
+
+
+def test_baselines_present(g):
+    for name, kind, _, _ in g.REGRESSION_CORPUS:
+        assert os.path.exists(os.path.join(BASELINE_DIR, f"{name}.{kind}")), name
+
+
+@pytest.mark.parametrize("case", [name for name, _, _, _ in _load_solution().REGRESSION_CORPUS])
+def test_render_matches_baseline(case_results, case):
+    failed = [r for r in case_results[case] if not r.passed]
+    assert not failed, [(r.frame, round(r.worst_tile, 4), r.max_abs_diff) for r in failed]
+
+
+if __name__ == "__main__":
+    for path in _load_solution().write_regression_baselines(BASELINE_DIR, processes=1):
+        print(path)
@@ -0,0 +1,76 @@
+import os
+import time
+
+import numpy as np
+import pytest
+
+TXTCSV = "~p0140~p1140~lw2!~p0170~p1120~p260~lp60~lcFFAA00"
+
+
+@pytest.mark.parametrize("width", [1, 2, 3, 5])
+def test_stroke_numpy_matches_loop(g, width):
+    rng = np.random.default_rng(36)
+    segs = rng.uniform(-20.0, 280.0, (40, 25, 2))
+    segs[3, 4] = np.nan  # pieces touching a bad point are skipped
+    a = np.zeros((260, 250), dtype=np.uint8)
+    b = np.zeros_like(a)
+    g._stroke_numpy(segs, g._stroke_offsets(width), a, 200)
+    g._stroke_loop(segs, g._stroke_offsets(width), b, 200)
+    assert (a == 200).any()
+    np.testing.assert_array_equal(a, b)
+
+
+@pytest.mark.skipif((os.cpu_count() or 1) < 2, reason="needs more than one core")
+def test_render_png_batch_scales_with_workers(g, tmp_path):
+    workers = min(4, os.cpu_count())
+    jobs = [(TXTCSV, str(tmp_path / f"{i}.png")) for i in range(8 * workers)]
+    g.render_png_batch(jobs[:workers], workers=workers)  # warm caches and kernels
+
+    def timed(n):
+        t0 = time.perf_counter()
+        assert g.render_png_batch(jobs, workers=n) == len(jobs)
+        return time.perf_counter() - t0
+
+    assert timed(workers) < 0.8 * timed(1)
+
+
+@pytest.mark.parametrize("morph_per", [-0.4, 1.0])
+def test_kernel_project_matches_scalar_animation_path(g, morph_per):
+    # animation frames project through kernels.project; segment 0 uses a negative morph_per
+    p3d = g.LodGeometry(g.parse_txtcsv_layers(TXTCSV)[1]).path3d()
+    xyz = np.stack([p3d.x, p3d.y, p3d.z], axis=1)
+    center = g.Morph.center_path3d(p3d)
+    args = (900.0, 320.0, 1200.0, 480.0, 480.0)
+    ref = g.Morph.project_xy3d_only(*args[:1], p3d, *args[1:], *center, 0.3, -0.7, 0.2, morph_per, "c")
+    for name in g.available_kernel_backends():
+        pts = g.set_kernel_backend(name).project(
+            args[0], xyz, *args[1:], *center, 0.3, -0.7, 0.2, morph_per, "c"
+        )
+        np.testing.assert_allclose(pts, np.stack([ref.x, ref.y], axis=1), atol=1e-9)
+    g.set_kernel_backend()
+
+
+def test_kernel_backend_switch_reuses_jit(g):
+    if "numba" not in g.available_kernel_backends():
+        pytest.skip("numba not installed")
+    a = g.set_kernel_backend("numba")
+    g.set_kernel_backend("numpy")
+    assert g.set_kernel_backend("numba") is a
+    g.set_kernel_backend()
+
+
+def test_animation_frames_match_across_backends(g):
+    frames = {}
+    for name in g.available_kernel_backends():
+        g.set_kernel_backend(name)
+        frames[name] = [np.asarray(f) for f in g.iter_animation_frames(
+            TXTCSV, size=96, fps=4, seconds_per_layer=1.0, supersample=1, cull_backfaces=True, fill=True
+        )]
+    g.set_kernel_backend()
+    ref = frames.pop(next(iter(frames)))
+    assert len(ref) > 4 and ref[1].any()
+    for out in frames.values():
+        assert len(out) == len(ref)
+        for a, b in zip(out, ref):
+            # last-bit projection differences may move a few pixels across a boundary
+            assert (np.abs(a.astype(int) - b).max(axis=-1) > 1).mean() < 0.005
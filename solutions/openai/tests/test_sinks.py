@@ -0,0 +1,51 @@
+import io
+import os
+
+import numpy as np
+import pytest
+from PIL import Image, features
+
+TXTCSV = "~p0140~p1140~lw2!~p0170~p1120~p260~lp60~lcFFAA00"
+FRAMES = dict(size=64, fps=4, seconds_per_layer=1.0, supersample=1)
+
+
+@pytest.fixture(scope="module")
+def frames(g):
+    return [np.asarray(f) for f in g.iter_animation_frames(TXTCSV, **FRAMES)]
+
+
+def test_raw_sink_streams_rgba(g, frames):
+    buf = io.BytesIO()
+    assert g.render_animation_from_txtcsv(TXTCSV, buf, **FRAMES) == len(frames)
+    got = np.frombuffer(buf.getvalue(), dtype=np.uint8).reshape(len(frames), 64, 64, 4)
+    np.testing.assert_array_equal(got, np.stack(frames))
+
+
+def test_raw_sink_on_file_descriptor(g, frames, tmp_path):
+    path = tmp_path / "frames.rgba"
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT)
+    try:
+        g.render_animation_from_txtcsv(TXTCSV, fd, fmt="raw", **FRAMES)
+    finally:
+        os.close(fd)  # the sink leaves the descriptor open
+    assert path.stat().st_size == len(frames) * 64 * 64 * 4
+
+
+@pytest.mark.parametrize("ext", ["gif", "png", "webp"])
+def test_file_sinks_keep_every_frame(g, frames, tmp_path, ext):
+    if ext == "webp" and not features.check("webp"):
+        pytest.skip("Pillow built without WebP")
+    out = str(tmp_path / f"anim.{ext}")
+    assert g.render_animation_from_txtcsv(TXTCSV, out, **FRAMES) == len(frames)
+    with Image.open(out) as im:
+        assert im.n_frames == len(frames)
+        assert im.size == (64, 64)
+        if ext != "gif":  # truecolour sinks are not quantized
+            im.seek(1)
+            err = np.abs(np.asarray(im.convert("RGBA")).astype(int) - frames[1]).mean()
+            assert err == 0 if ext == "png" else err < 4  # APNG lossless, WebP at quality 90
+
+
+def test_unknown_format(g, tmp_path):
+    with pytest.raises(ValueError):
+        g.render_animation_from_txtcsv(TXTCSV, str(tmp_path / "anim.bmp"), **FRAMES)
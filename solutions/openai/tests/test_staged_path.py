@@ -0,0 +1,40 @@
+import numpy as np
+import pytest
+
+BASE = dict(iAl=140, iRf=140, iSv=10, iSa=10, iHa=0, iSe=100, iHe=100)
+# slider -> (new value, stages get_path runs from that slider on)
+EDITS = {"iRf": (160, 7), "iHe": (120, 6), "iSe": (90, 5), "iAl": (200, 4), "iSv": (-25, 3), "iSa": (30, 2), "iHa": (12, 1)}
+
+
+def _full(g, p):
+    return g.ShapeInkei.get_path(p["iAl"], p["iRf"], p["iSv"], p["iSa"], p["iHa"], p["iSe"], p["iHe"], 0, 0, 0)
+
+
+@pytest.mark.parametrize("slider", list(EDITS))
+def test_single_slider_edit_matches_get_path(g, slider):
+    staged = g.StagedPath()
+    staged.evaluate(**BASE)
+    assert staged.stages_run == 7
+    value, stages = EDITS[slider]
+    p = dict(BASE, **{slider: value})
+    path = staged.evaluate(**p)
+    assert staged.stages_run == stages
+    ref = _full(g, p)
+    assert path.x == ref.x and path.y == ref.y
+    ref3d = g.ShapeInkei.conv3d(ref)
+    got3d = staged.evaluate3d(**p)
+    np.testing.assert_array_equal(np.stack([got3d.x, got3d.y, got3d.z]), np.stack([ref3d.x, ref3d.y, ref3d.z]))
+    staged.evaluate(**p)
+    assert staged.stages_run == 0
+
+
+def test_slider_drag_sequence(g):
+    staged = g.StagedPath()
+    rng = np.random.default_rng(31)
+    p = dict(BASE)
+    for _ in range(40):
+        slider = list(EDITS)[rng.integers(len(EDITS))]
+        p[slider] = EDITS[slider][0] + int(rng.integers(-20, 20))
+        path = staged.evaluate(**p)
+        ref = _full(g, p)
+        assert path.x == ref.x and path.y == ref.y
@@ -0,0 +1,41 @@
+import io
+import re
+import xml.etree.ElementTree as ET
+
+import pytest
+
+SVG = "{http://www.w3.org/2000/svg}"
+TXTCSV = "~p0140~p1140~lw2!~p0170~p1120~p260~lp60~lcFFAA00"
+
+
+def _layer_paths(root):
+    return [p for p in root.iter(SVG + "path") if p.get("fill") == "none"]
+
+
+@pytest.mark.parametrize("cull", [False, True])
+def test_still_svg_parses(g, tmp_path, cull):
+    out = tmp_path / "still.svg"
+    g.write_svg_from_txtcsv(TXTCSV, str(out), size=200, cull_backfaces=cull)
+    root = ET.parse(out).getroot()
+    assert root.tag == SVG + "svg" and root.get("viewBox") == "0 0 200 200"
+    paths = _layer_paths(root)
+    assert len(paths) == 2
+    assert paths[1].get("stroke") == "#ffaa00"
+    num = r"-?\d+\.\d\d"
+    assert re.fullmatch(rf"(M{num} {num}C{num}( {num}){{5}})+", paths[0].get("d"))
+
+
+@pytest.mark.parametrize("show_all", [False, True])
+def test_animated_svg_parses(g, show_all):
+    buf = io.StringIO()
+    g.write_svg_animation_from_txtcsv(TXTCSV, buf, size=120, fps=4, seconds_per_layer=1.0, show_all_layers=show_all)
+    root = ET.fromstring(buf.getvalue())
+    paths = _layer_paths(root)
+    assert len(paths) == 2
+    for p in paths:
+        anims = {a.get("attributeName"): a for a in p.iter(SVG + "animate")}
+        assert ("visibility" in anims) == (not show_all)
+        times = [float(t) for t in anims["d"].get("keyTimes").split(";")]
+        assert times[0] == 0.0 and times[-1] == 1.0 and times == sorted(times)
+        assert len(anims["d"].get("values").split(";")) == len(times)
+        assert len(anims["stroke"].get("values").split(";")) == len(times)
@@ -0,0 +1,39 @@
+import numpy as np
+import pytest
+
+TXTCSV = "~p0140~p1140~lw2!~p0170~p1120~p260~lp60~lcFFAA00"
+SIZE = 160
+
+
+@pytest.mark.parametrize("kwargs", [{}, {"fill": True, "cull_backfaces": True}])
+def test_render_frame_matches_still(g, kwargs):
+    viewer = g.Viewer(TXTCSV, size=SIZE, **kwargs)
+    raw = viewer.render_frame(0.0, -160.0, 0.0)
+    assert len(raw) == SIZE * SIZE * 4
+    ref = np.asarray(g.render_image_from_txtcsv(TXTCSV, size=SIZE, **kwargs))
+    np.testing.assert_array_equal(np.frombuffer(raw, dtype=np.uint8).reshape(SIZE, SIZE, 4), ref)
+    # the reused buffer is redrawn from the stage, not drawn over
+    viewer.render_frame(30.0, 45.0, 0.0)
+    assert viewer.render_frame(0.0, -160.0, 0.0) == raw
+
+
+def test_piston_moves_toward_open_shape(g):
+    viewer = g.Viewer(TXTCSV, size=SIZE)
+    closed = viewer.render_frame(0.0, -160.0, 0.0)
+    assert viewer.render_frame(0.0, -160.0, 0.0, piston=1.0) != closed
+    assert viewer.piston == 1.0
+
+
+def test_click_rotates_and_toggles_piston(g):
+    viewer = g.Viewer(TXTCSV, size=SIZE)
+    poses = viewer.click(0, 3)  # left column: rotate y by -90
+    assert len(poses) > 1
+    x, y, z, piston = poses[-1]
+    assert (x, y, z, piston) == (0.0, 200.0 - 90.0, 0.0, 0.0)
+    for pose in poses:
+        viewer.render_frame(*pose)
+    assert viewer.angle == (x, y, z)
+    # centre cells toggle the piston in and out
+    assert viewer.click_at(SIZE / 2, SIZE / 2)[-1][3] == 1.0
+    viewer.render_frame(*poses[-1][:3], piston=1.0)
+    assert viewer.click(2, 3)[-1][3] == 0.0